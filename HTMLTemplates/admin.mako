@@ -13,6 +13,8 @@ ${self.logo()}<br/>
 <A HREF="users"><button style="margin-right: 1cm">Manage Users</button></a>
 <A HREF="/reports"><button>Reports</button></a>
 <A HREF="teams"><button style="margin-right: 1cm">Manage Teams</button></a>
+<A HREF="database"><button style="margin-right: 1cm">Database</button></a>
+<A HREF="sqlStats"><button>SQL Statistics</button></a>
 </P>
 
 <form action="bulkAddMembers" method="post" enctype="multipart/form-data">
@@ -43,8 +45,8 @@ ${self.logo()}<br/>
 %if len(forgotDates):
   <FORM action="fixData">
   <SELECT id="date-select" name="date">
-%for date in forgotDates:
-    <OPTION value="${date}">${date}</OPTION>
+%for day in forgotDates:
+    <OPTION value="${day.date}">${day.date} (${day.count})</OPTION>
 %endfor
   </SELECT>
   <input type="submit" value="Fix Data"/>
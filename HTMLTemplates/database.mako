@@ -0,0 +1,34 @@
+<%def name="scripts()">
+</%def>
+<%def name="head()">
+</%def>
+
+<%def name="title()">CheckMeIn Database</%def>
+<%inherit file="base.mako"/>
+${self.logo()}<br/>
+<H1>Database Settings</H1>
+<P>Settings are configured as <em>database.&lt;setting&gt;</em> in the config file.  A blank configured value uses the SQLite default.</P>
+<TABLE class="side">
+  <TR><TH>Setting</TH><TH>Configured</TH><TH>In effect</TH></TR>
+% for (name, configured, value) in settings:
+  <TR><TD>${name}</TD><TD>${configured}</TD><TD>${value}</TD></TR>
+% endfor
+</TABLE>
+
+<H2>Connection pool</H2>
+<P>${numConnections} of ${poolSize} pooled connections open</P>
+
+<H2>Occupancy cache</H2>
+% if occupancy.enabled:
+<P>Enabled, ${occupancy.count()} people in the building.
+%   if occupancy.lastVerified is None:
+Not checked against the database yet.
+%   elif occupancy.lastVerified:
+Matched the database at the last check.
+%   else:
+Didn't match the database at the last check and was reloaded.
+%   endif
+</P>
+% else:
+<P>Disabled (database.occupancy_cache), occupancy is read from the database.</P>
+% endif
@@ -1,3 +1,18 @@
 # HELP checked_in_people Current number of checked in members and guests
 # TYPE checked_in_people gauge
 checked_in_people ${number_people_checked_in}
+# HELP update_subscribers Clients streaming station updates
+# TYPE update_subscribers gauge
+update_subscribers ${updates.subscribers}
+# HELP updates_published_total Station updates published
+# TYPE updates_published_total counter
+updates_published_total ${updates.published}
+# HELP updates_dropped_total Station updates dropped for clients too far behind
+# TYPE updates_dropped_total counter
+updates_dropped_total ${updates.dropped}
+# HELP updates_queued Station updates waiting to be sent
+# TYPE updates_queued gauge
+updates_queued ${updates.queued}
+# HELP updates_lag_seconds Longest any waiting station update has waited
+# TYPE updates_lag_seconds gauge
+updates_lag_seconds ${'%.3f' % updates.lag}
@@ -1,4 +1,85 @@
 <%def name="scripts()">
+<script>
+var usage = null;
+var zoom = null;
+
+function drawUsage(){
+	var svg = document.getElementById("usageChart");
+	var width = 800, height = 400, left = 40, bottom = 30;
+	var times = usage.usage.time.map(function(time){ return new Date(time).getTime(); });
+	var first = zoom ? zoom[0] : times[0];
+	var last = zoom ? zoom[1] : times[times.length - 1];
+	var shown = [];
+	for (var num = 0; num < times.length; num++) {
+		if (times[num] >= first && times[num] <= last) {
+			shown.push(num);
+		}
+	}
+	var most = Math.max(1, Math.max.apply(null, shown.map(function(num){ return usage.usage.visitors[num]; })));
+	var span = Math.max(1, last - first);
+	var xOf = function(time){ return left + (time - first) * (width - left - 10) / span; };
+	var yOf = function(count){ return height - bottom - count * (height - bottom - 10) / most; };
+	var points = shown.map(function(num){
+		return xOf(times[num]).toFixed(1) + "," + yOf(usage.usage.visitors[num]).toFixed(1);
+	});
+	var parts = ['<polyline fill="none" stroke="red" points="' + points.join(" ") + '"/>'];
+	if (usage.usage.average) {
+		var averages = shown.map(function(num){
+			return xOf(times[num]).toFixed(1) + "," + yOf(usage.usage.average[num]).toFixed(1);
+		});
+		parts.push('<polyline fill="none" stroke="blue" points="' + averages.join(" ") + '"/>');
+	}
+	parts = parts.concat([
+	             '<line x1="' + left + '" y1="' + (height - bottom) + '" x2="' + width + '" y2="' + (height - bottom) + '" stroke="black"/>',
+	             '<line x1="' + left + '" y1="0" x2="' + left + '" y2="' + (height - bottom) + '" stroke="black"/>',
+	             '<text x="' + (left - 5) + '" y="15" text-anchor="end">' + most + '</text>',
+	             '<text x="' + (left - 5) + '" y="' + (height - bottom) + '" text-anchor="end">0</text>',
+	             '<text x="' + left + '" y="' + (height - 10) + '">' + escapeHTML(new Date(first).toLocaleString()) + '</text>',
+	             '<text x="' + width + '" y="' + (height - 10) + '" text-anchor="end">' + escapeHTML(new Date(last).toLocaleString()) + '</text>']);
+	svg.innerHTML = parts.join("");
+	svg.onmousedown = function(down){
+		var box = svg.getBoundingClientRect();
+		var timeAt = function(event){ return first + (event.clientX - box.left - left) * span / (box.width * (width - left - 10) / width); };
+		var from = timeAt(down);
+		svg.onmouseup = function(up){
+			var to = timeAt(up);
+			svg.onmouseup = null;
+			if (Math.abs(to - from) > span / 100) {
+				zoom = [Math.min(from, to), Math.max(from, to)];
+				drawUsage();
+			}
+		};
+	};
+	svg.ondblclick = function(){ zoom = null; drawUsage(); };
+}
+
+function loadUsage(bucket){
+	var url = "usage.json";
+	var params = {startDate: "${stats.beginDate}", endDate: "${stats.endDate}", bucket: bucket};
+	// numbers are minutes, drawn to the minute between the hours chosen
+	if ($.isNumeric(bucket)) {
+		url = "occupancy.json";
+		params = {startDate: "${stats.beginDate}", endDate: "${stats.endDate}", minutes: bucket,
+		          firstHour: $("#usageFirstHour").val(), lastHour: $("#usageLastHour").val()};
+	}
+	$("#usageHours").toggle($.isNumeric(bucket));
+	$.getJSON(url, params, function(data){
+		usage = data;
+		zoom = null;
+		$("#usageCharts").show();
+		drawUsage();
+	}).fail(function(){
+		$("#usageCharts").hide();
+		$("#usageGraph").attr("src", "graph?startDate=${stats.beginDate}&endDate=${stats.endDate}").show();
+	});
+}
+
+$(document).ready(function(){
+	loadUsage($("#usageBucket").val());
+	$("#usageBucket").change(function(){ loadUsage($(this).val()); });
+	$("#usageFirstHour, #usageLastHour").change(function(){ loadUsage($("#usageBucket").val()); });
+});
+</script>
 </%def>
 <%def name="head()">
 </%def>
@@ -30,8 +111,28 @@ ${self.logo()}<br/></CENTER>
 
 <H2>Graph building usage</H2>
 <CENTER>
+<DIV id="usageCharts" style="display:none">
+<SELECT id="usageBucket">
+  <OPTION value="hour">Visitors each hour</OPTION>
+  <OPTION value="day">Busiest hour each day</OPTION>
+  <OPTION value="60">Each hour, to the minute</OPTION>
+  <OPTION value="30">Each 30 minutes</OPTION>
+  <OPTION value="15">Each 15 minutes</OPTION>
+  <OPTION value="5">Each 5 minutes</OPTION>
+</SELECT>
+<SPAN id="usageHours" style="display:none">
+  from <INPUT id="usageFirstHour" type="number" min="0" max="23" value="8"/>:00
+  to <INPUT id="usageLastHour" type="number" min="1" max="24" value="22"/>:00
+  (blue is the average in the building)
+</SPAN>
+Drag across the graph to zoom in, double click to zoom out.<BR/>
+<svg id="usageChart" width="800" height="400" viewBox="0 0 800 400"></svg>
+</DIV>
+<noscript>
 <IMG WIDTH="800px" HEIGHT="600px" TITLE="Building Usage graph" SRC="g
 raph?startDate=${stats.beginDate}&endDate=${stats.endDate}" ALT="Building usage graph"/>
+</noscript>
+<IMG id="usageGraph" style="display:none" WIDTH="800px" HEIGHT="600px" TITLE="Building Usage graph" ALT="Building usage graph"/>
 </CENTER>
 
 <H2>Full List</H2>
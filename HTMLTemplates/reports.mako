@@ -24,6 +24,25 @@ ${self.logo()}<br/>
    </div>
 
    <input type="submit" value="Generate Statistics"/>
+   <input type="submit" value="Download Visits CSV" formaction="visits.csv"/>
+   <input type="submit" value="Download Transactions CSV" formaction="transactions.csv"/>
+   </fieldset>
+</form>
+<br/>
+<form action="trends" width="50%">
+   <fieldset>
+       <legend>Monthly Trends</legend>
+   <div>
+      <label for="start_month">First Month:</label>
+      <input id="start_month" type="month" name="startMonth" value="${firstDate[:7]}"
+       min="${firstDate[:7]}" max="${todayDate[:7]}"/>
+   </div>
+   <div>
+      <label for="end_month">Last Month:</label>
+      <input id="end_month" type="month" name="endMonth" value="${todayDate[:7]}"
+       min="${firstDate[:7]}" max="${todayDate[:7]}"/>
+   </div>
+   <input type="submit" value="Show Trends"/>
    </fieldset>
 </form>
 <br/>
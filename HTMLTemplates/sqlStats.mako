@@ -0,0 +1,32 @@
+<%def name="scripts()">
+</%def>
+<%def name="head()">
+</%def>
+
+<%def name="title()">CheckMeIn SQL Statistics</%def>
+<%inherit file="base.mako"/>
+${self.logo()}<br/>
+<H1>SQL Statistics</H1>
+% if not instrumented:
+<P>Instrumentation is off, set <em>database.instrument</em> and <em>tools.sqlstats.on</em> in the config file to collect statistics.</P>
+% endif
+<P>Totals since the server started or was reset, slowest pages first.  Parameters are shown by type only.</P>
+<A HREF="sqlStats?reset=1"><button>Reset</button></a>
+<TABLE class="side">
+  <TR><TH>Page</TH><TH>Requests</TH><TH>Queries / request</TH><TH>Most queries</TH><TH>SQL ms / request</TH></TR>
+% for page in pages:
+  <TR><TD>${page.path}</TD><TD>${page.numRequests}</TD><TD>${"%.1f" % page.avgQueries()}</TD><TD>${page.maxQueries}</TD><TD>${"%.2f" % (page.avgTime() * 1000)}</TD></TR>
+% endfor
+</TABLE>
+
+% for page in pages:
+%   if page.slowest:
+<H2>${page.path}</H2>
+<TABLE class="side">
+  <TR><TH>ms</TH><TH>Parameters</TH><TH>Statement</TH></TR>
+%     for statement in page.slowest:
+  <TR><TD>${"%.2f" % (statement.elapsed * 1000)}</TD><TD>${statement.shape}</TD><TD>${statement.sql}</TD></TR>
+%     endfor
+</TABLE>
+%   endif
+% endfor
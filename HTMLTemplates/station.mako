@@ -1,16 +1,56 @@
 <%def name="scripts()">
 <script>
-window.onload = setTimeout(function(){location.href="/station"},1000*60);  // every minute
+// Changes are pushed over /updateSSE and patched in, starting after the
+// last one in the page.  After reconnecting the ones missed are sent, so
+// the page is only reloaded when told to or when the day changes
+function reloadStation(){
+  location.href="/station";
+}
 
-/*
-document.addEventListener('DOMContentLoaded', function () {
-		var source = new EventSource('/updateSSE');
-    source.addEventListener('update', function (event) {
-        location.href="/station";
+function updateStation(data){
+  var update;
+  try {
+    update = JSON.parse(data);
+  } catch (e) {
+    update = {reload: true};
+  }
+  if (update.reload) {
+    reloadStation();
+    return;
+  }
+  $.each(update.transactions, function(i, trans){
+    // already in the page if it was rendered just after the change
+    var shown = $('#activity tr').filter(function(){
+      return this.getAttribute('data-key') == trans.key;
     });
-}, false);
-*/
+    if (shown.length) return;
+    $('<tr>').addClass(trans.description).attr('data-key', trans.key)
+      .append($('<td>').text(trans.time), $('<td>').text(trans.name),
+              $('<td>').text(trans.description))
+      .insertAfter('#activity tr:first');
+  });
+  $('#numberPresent').text(update.numberPresent);
+  $('#uniqueVisitorsToday').text(update.uniqueVisitorsToday);
+  $('#keyholder').text(update.keyholder);
+  $('#stewards').empty().append($.map(update.stewards, function(name){
+    return $('<p>').text(name);
+  }));
+}
 
+if (window.EventSource) {
+  $(function(){
+    var source = new EventSource('/updateSSE?lastEventId=${lastEventId}');
+    var today = new Date().getDate();
+    source.addEventListener('update', function(event){
+      updateStation(event.data);
+    });
+    setInterval(function(){
+      if (new Date().getDate() != today) reloadStation();
+    }, 1000*60);
+  });
+} else {
+  setTimeout(reloadStation, 1000*60);  // every minute
+}
 </script>
 </%def>
 <%def name="head()">
@@ -36,19 +76,19 @@ ${self.logo()}<br/>
 <table class="side">
   <TR>
     <TH># people in building</TH>
-    <TD>${numberPresent}</TD>
+    <TD id="numberPresent">${numberPresent}</TD>
   </TR>
   <TR>
     <TH>Total people today</TH>
-    <TD>${uniqueVisitorsToday}</TD>
+    <TD id="uniqueVisitorsToday">${uniqueVisitorsToday}</TD>
   </TR>
   <TR>
     <TH>Keyholder</TH>
-    <TD>${keyholder_name}</TD>
+    <TD id="keyholder">${keyholder_name}</TD>
   </TR>
   <TR>
     <TH>Shop Stewards</TH>
-    <TD>
+    <TD id="stewards">
   % for steward in stewards:
      <P>${steward[0]}</P>
   % endfor    
@@ -60,10 +100,10 @@ ${self.logo()}<br/>
 </TR></TABLE>
 
   <H2>Recent Activity (today)</H2>
-  <TABLE style="width:80%">
+  <TABLE id="activity" style="width:80%">
     <TR><TH>Time</TH><TH>Name</TH><TH>Description</TH></TR>
   % for trans in todaysTransactions:
-    <TR class="${trans.description}"><TD>${trans.time.strftime("%I:%M %p")}</TD><TD>${trans.name}</TD><TD>${trans.description}</TD></TR>
+    <TR class="${trans.description}" data-key="${trans.key}"><TD>${trans.time.strftime("%I:%M %p")}</TD><TD>${trans.name}</TD><TD>${trans.description}</TD></TR>
   % endfor
   </TABLE>
 
@@ -0,0 +1,34 @@
+<%def name="scripts()">
+</%def>
+<%def name="head()">
+</%def>
+
+<%def name="title()">CheckMeIn Trends</%def>
+<%inherit file="base.mako"/>
+<CENTER>
+${self.logo()}<br/>
+</CENTER>
+% if months:
+<H1>Trends for ${months[0].month.strftime('%B %Y')} to ${months[-1].month.strftime('%B %Y')}</H1>
+% endif
+
+<H2>By Year</H2>
+<TABLE>
+   <TR><TH>Year</TH><TH>Visits</TH><TH>Member hours</TH><TH>Guest hours</TH><TH>Most at once</TH></TR>
+% for (year, (visits, memberHours, guestHours, peak)) in years.items():
+   <TR><TD>${year}</TD><TD>${visits}</TD><TD>${'% 6.1f' % memberHours}</TD>
+       <TD>${'% 6.1f' % guestHours}</TD><TD>${peak}</TD></TR>
+% endfor
+</TABLE>
+
+<H2>By Month</H2>
+<TABLE>
+   <TR><TH>Month</TH><TH>Visits</TH><TH>Visitors</TH><TH>Members</TH><TH>Guests</TH>
+       <TH>Member hours</TH><TH>Guest hours</TH><TH>Most at once</TH></TR>
+% for month in months:
+   <TR><TD>${month.month.strftime('%b %Y')}</TD><TD>${month.visits}</TD><TD>${month.visitors}</TD>
+       <TD>${month.members}</TD><TD>${month.guests}</TD>
+       <TD>${'% 6.1f' % month.memberHours}</TD><TD>${'% 6.1f' % month.guestHours}</TD>
+       <TD>${month.peak}</TD></TR>
+% endfor
+</TABLE>
@@ -105,12 +105,20 @@ class Accounts(object):
                          datum["barcode"], Role(datum["role"]))
 
     def addUser(self, dbConnection, user, password, barcode, role):
-        hashedPassword = pwd_context.hash(password)
+        self.insertUser(dbConnection, user, self.hashPassword(password),
+                        barcode, role)
+        self.emailNewUser(user, self.getEmail(dbConnection, user), role)
+
+    def hashPassword(self, password):
+        # slow on purpose, so best done outside of a write
+        return pwd_context.hash(password)
+
+    def insertUser(self, dbConnection, user, hashedPassword, barcode, role):
         dbConnection.execute(
             '''INSERT INTO accounts(user, password, barcode, role) VALUES(?,?,?,?)''',
             (user, hashedPassword, barcode, role.getValue()))
-        emailAddress = self.getEmail(dbConnection, user)
 
+    def emailNewUser(self, user, emailAddress, role):
         utils.sendEmail('TFI Ops', 'tfi-ops@googlegroups.com', 'New User',
                         f'User {user} <{emailAddress}> added with roles : {role}')
 
@@ -141,8 +149,8 @@ class Accounts(object):
                 '''SELECT displayName, accounts.barcode
             FROM accounts
             INNER JOIN v_current_members ON (v_current_members.barcode = accounts.barcode)
-            INNER JOIN visits ON (visits.barcode = accounts.barcode)
-            WHERE visits.status = "In" AND (role & ? != 0)
+            INNER JOIN presence ON (presence.barcode = accounts.barcode)
+            WHERE (role & ? != 0)
             ORDER BY displayName''', (role, )):
             listUsers.append([row[0], row[1]])
         return listUsers
@@ -167,9 +175,7 @@ class Accounts(object):
             return data[0]
         return None
 
-    def emailToken(self, dbConnection, username, token):
-        emailAddress = self.getEmail(dbConnection, username)
-
+    def emailToken(self, username, emailAddress, token):
         safe_username = urllib.parse.quote_plus(username)
         print(safe_username, token)
 
@@ -182,31 +188,38 @@ class Accounts(object):
 
         utils.sendEmail(username, emailAddress, 'Forgotten Password', msg)
 
-        return emailAddress
+    def findUser(self, dbConnection, username):
+        """The account named username, or with that e-mail, None if neither"""
+        data = dbConnection.execute(
+            '''SELECT user from accounts WHERE user = ?''',
+            (username, )).fetchone()
+        if data:
+            return data[0]
+        return self.getUser(dbConnection, username)
 
-    def forgotPassword(self, dbConnection, username):
+    def newForgotToken(self):
+        """A token to reset a password with and its hash"""
+        chars = 'ABCDEFGHJKMNPQRSTUVWXYZ23456789'
+        forgotID = ''.join(random.SystemRandom().choice(chars)
+                           for _ in range(8))
+        return (forgotID, self.hashPassword(forgotID))
+
+    def setForgotToken(self, dbConnection, username, hashedToken):
+        """Stores the hashed token for username, returning the address to
+           e-mail it to or, with no token stored, why not as the error"""
         data = dbConnection.execute(
             '''SELECT forgotTime from accounts WHERE user = ?''',
             (username, )).fetchone()
         if data == None:
-            username = self.getUser(dbConnection, username)
-            data = dbConnection.execute(
-                '''SELECT forgotTime from accounts WHERE user = ?''',
-                (username, )).fetchone()
-        if data == None:
-            return f'No email sent due to not finding user: {username}'
+            return ('', f'No email sent due to not finding user: {username}')
         if data[0] != None:
             longAgo = datetime.datetime.now() - data[0]
             if longAgo.total_seconds() < 60:  # to keep people from spamming others...
-                return 'No email sent due to one sent in last minute'
-        chars = 'ABCDEFGHJKMNPQRSTUVWXYZ23456789'
-        forgotID = ''.join(random.SystemRandom().choice(chars)
-                           for _ in range(8))
-
+                return ('', 'No email sent due to one sent in last minute')
         dbConnection.execute(
             '''UPDATE accounts SET forgot = ?, forgotTime = ? WHERE user = ?''',
-            (pwd_context.hash(forgotID), datetime.datetime.now(), username))
-        return self.emailToken(dbConnection, username, forgotID)
+            (hashedToken, datetime.datetime.now(), username))
+        return (self.getEmail(dbConnection, username), '')
 
     def verify_forgot(self, dbConnection, username, forgot, newPassword):
         data = dbConnection.execute(
@@ -0,0 +1,325 @@
+"""
+Times the Engine and Reports hot paths against generated databases.
+
+    python benchmarks/benchmark.py --size medium --output medium.json
+    python benchmarks/benchmark.py --size medium --baseline medium.json
+
+Databases are built once with tests/syntheticData.py into benchmarks/data and
+copied for each run, as some of the benchmarks change data.  They are rebuilt
+each day so that "today" has visits in it.  Results are written as JSON and,
+given a baseline from an earlier run, anything slower by more than
+--threshold is reported and makes the exit status 1.
+"""
+import argparse
+import datetime
+import io
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARK_DIR, '..'))
+sys.path.insert(0, os.path.join(BENCHMARK_DIR, '..', 'tests'))
+
+from engine import Engine  # noqa: E402
+from reports import Statistics  # noqa: E402
+from tracing import Tracing  # noqa: E402
+from webAdminStation import WebAdminStation  # noqa: E402
+import syntheticData  # noqa: E402
+
+SIZES = {
+    'small': {'members': 200, 'guests': 500, 'teams': 10,
+              'certifications': 500, 'visits': 10000, 'years': 1},
+    'medium': {'members': 1000, 'guests': 3000, 'teams': 40,
+               'certifications': 3000, 'visits': 200000, 'years': 3},
+    'large': {'members': 3000, 'guests': 10000, 'teams': 100,
+              'certifications': 10000, 'visits': 1000000, 'years': 5},
+}
+
+# Not a real key, getKeyholderJSON just needs one to encrypt with
+KEY = b"MTIzNDU2Nzg5MDEyMzQ1Njc4OTAxMjM0NTY3ODkwMTI="
+
+BENCHMARKS = {}
+
+
+def benchmark(func):
+    """Registers func(context) as a benchmark under its name.  Ones that
+       time themselves return the seconds taken."""
+    BENCHMARKS[func.__name__] = func
+    return func
+
+
+# Run in a fresh interpreter, as only the first import is slow
+STARTUP = {
+    'import': """
+import time
+began = time.perf_counter()
+import checkMeIn
+print(time.perf_counter() - began)
+""",
+    'construct': """
+import sys, time
+import cherrypy
+import checkMeIn
+cherrypy.config.update({'database.path': sys.argv[1] + '/',
+                        'database.name': 'benchmark.db'})
+began = time.perf_counter()
+checkMeIn.CheckMeIn()
+print(time.perf_counter() - began)
+""",
+}
+
+
+def timeStartup(context, part):
+    output = subprocess.run([sys.executable, '-c', STARTUP[part], context.workDir],
+                            cwd=os.path.join(BENCHMARK_DIR, '..'), check=True,
+                            capture_output=True, text=True).stdout
+    return float(output.split()[-1])
+
+
+@benchmark
+def importCheckMeIn(context):
+    return timeStartup(context, 'import')
+
+
+@benchmark
+def constructCheckMeIn(context):
+    return timeStartup(context, 'construct')
+
+
+@benchmark
+def scannedMember(context):
+    with context.engine.dbConnect() as dbConnection:
+        context.engine.visits.scannedMember(dbConnection, context.regular)
+
+
+@benchmark
+def whoIsHere(context):
+    with context.engine.dbConnect() as dbConnection:
+        context.engine.reports.whoIsHere(dbConnection)
+
+
+@benchmark
+def transactionsToday(context):
+    with context.engine.dbConnect() as dbConnection:
+        context.engine.reports.transactionsToday(dbConnection)
+
+
+@benchmark
+def statisticsConstruction(context):
+    (startDate, endDate) = context.engine.reports.getDateRange(
+        context.beginDate, context.endDate)
+    Statistics(context.dbConnection, startDate, endDate, context.engine.rollups)
+
+
+@benchmark
+def cachedStatistics(context):
+    context.engine.reports.getStats(context.dbConnection, context.beginDate,
+                                    context.endDate)
+
+
+@benchmark
+def getBuildingUsage(context):
+    context.stats.getBuildingUsage()
+
+
+@benchmark
+def getOccupancy(context):
+    for minutes in (60, 15, 5):
+        context.stats.getOccupancy(minutes)
+
+
+@benchmark
+def getBuildingUsageGraph(context):
+    context.stats.getBuildingUsageGraph()
+
+
+@benchmark
+def cachedBuildingUsageGraph(context):
+    context.engine.reports.getBuildingUsageGraph(
+        context.dbConnection, context.beginDate, context.endDate)
+
+
+@benchmark
+def getTrends(context):
+    context.engine.reports.getTrends(context.dbConnection, context.firstDate,
+                                     context.endDate)
+
+
+@benchmark
+def getForgottenDates(context):
+    context.engine.reports.getForgottenDates(context.dbConnection)
+
+
+@benchmark
+def getAllUserList(context):
+    context.engine.certifications.getAllUserList(context.dbConnection)
+
+
+@benchmark
+def getTeamMembers(context):
+    context.engine.teams.getTeamMembers(context.dbConnection, 1)
+
+
+@benchmark
+def getDictVisits(context):
+    Tracing().getDictVisits(context.dbConnection, context.regular, context.days)
+
+
+@benchmark
+def bulkAdd(context):
+    with context.engine.dbConnect() as dbConnection:
+        context.engine.members.bulkAdd(
+            dbConnection, SimpleNamespace(file=io.BytesIO(context.membersCSV),
+                                          filename='members.csv'))
+
+
+@benchmark
+def getKeyholderJSON(context):
+    context.admin.getKeyholderJSON()
+
+
+def membersCSV(engine, numNew=100):
+    """A membership export updating every member and adding numNew"""
+    with engine.dbConnect() as dbConnection:
+        members = dbConnection.execute(
+            'SELECT barcode, firstName, lastName, email FROM members').fetchall()
+    members += [(str(900000 + num), 'New', f'Member{num}', '')
+                for num in range(numNew)]
+    lines = ['TFI Display Name for Button,TFI Barcode for Button,'
+             'TFI Barcode AUTONUM,First Name,Last Name,Email,Membership End Date']
+    for (barcode, first, last, email) in members:
+        lines.append(f',{barcode},,{first},{last},{email},12/31/2099')
+    return '\n'.join(lines).encode('utf-8')
+
+
+def buildDatabase(size, seed):
+    """Path of the generated database for size, building it if needed"""
+    dataDir = os.path.join(BENCHMARK_DIR, 'data')
+    path = os.path.join(
+        dataDir, f'{size}-{seed}-{datetime.date.today().isoformat()}.db')
+    if not os.path.exists(path):
+        os.makedirs(dataDir, exist_ok=True)
+        for old in os.listdir(dataDir):
+            if old.startswith(f'{size}-{seed}-'):
+                os.remove(os.path.join(dataDir, old))
+        print(f'Building {size} database...', file=sys.stderr)
+        building = path + '.building'
+        if os.path.exists(building):
+            os.remove(building)
+        syntheticData.buildDatabase(building, seed=seed, **SIZES[size])
+        os.rename(building, path)
+    return path
+
+
+def makeContext(workDir, days):
+    engine = Engine(workDir + '/', 'benchmark.db', None)
+    with open(os.path.join(workDir, 'checkmein.key'), 'wb') as keyFile:
+        keyFile.write(KEY)
+    dbConnection = engine.dbConnect()
+    (regular, ) = dbConnection.execute(
+        '''SELECT barcode FROM visits GROUP BY barcode
+           ORDER BY count(*) DESC LIMIT 1''').fetchone()
+    endDate = datetime.date.today()
+    beginDate = endDate - datetime.timedelta(days=days - 1)
+    context = SimpleNamespace(engine=engine, dbConnection=dbConnection,
+                              workDir=workDir,
+                              admin=WebAdminStation(None, engine),
+                              regular=regular, days=days,
+                              beginDate=beginDate.isoformat(),
+                              endDate=endDate.isoformat(),
+                              membersCSV=membersCSV(engine))
+    context.firstDate = engine.reports.getEarliestDate(dbConnection).isoformat()
+    context.stats = engine.reports.getStats(dbConnection, context.beginDate,
+                                            context.endDate)
+    return context
+
+
+def timeBenchmark(func, context, repeat):
+    times = []
+    for _ in range(repeat):
+        began = time.perf_counter()
+        taken = func(context)
+        times.append(time.perf_counter() - began if taken is None else taken)
+    return {'min': min(times), 'median': statistics.median(times),
+            'mean': statistics.mean(times), 'repeat': repeat}
+
+
+def run(size, seed, repeat, days, names):
+    source = buildDatabase(size, seed)
+    with tempfile.TemporaryDirectory() as workDir:
+        shutil.copy(source, os.path.join(workDir, 'benchmark.db'))
+        context = makeContext(workDir, days)
+        (numVisits, ) = context.dbConnection.execute(
+            'SELECT count(*) FROM visits').fetchone()
+        results = {}
+        for name in names:
+            results[name] = timeBenchmark(BENCHMARKS[name], context, repeat)
+            print(f'{name:24} {results[name]["median"] * 1000:10.2f}ms',
+                  file=sys.stderr)
+        context.engine.close()
+    return {'size': size, 'seed': seed, 'days': days, 'visits': numVisits,
+            'date': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'results': results}
+
+
+def compare(report, baseline, threshold):
+    """Prints each benchmark against the baseline, returns the regressions"""
+    if (report['size'], report['seed']) != (baseline['size'], baseline['seed']):
+        print(f"Warning: baseline is for {baseline['size']} seed {baseline['seed']}",
+              file=sys.stderr)
+    regressions = []
+    print(f'{"benchmark":24} {"baseline":>12} {"now":>12} {"ratio":>7}')
+    for (name, result) in report['results'].items():
+        if name not in baseline['results']:
+            print(f'{name:24} {"-":>12} {result["median"] * 1000:10.2f}ms')
+            continue
+        before = baseline['results'][name]['median']
+        ratio = result['median'] / before if before else float('inf')
+        flag = ''
+        if ratio > threshold:
+            flag = ' REGRESSION'
+            regressions.append(name)
+        print(f'{name:24} {before * 1000:10.2f}ms {result["median"] * 1000:10.2f}ms '
+              f'{ratio:7.2f}{flag}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--size', choices=SIZES, default='small')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--days', type=int, default=30,
+                        help='days covered by the statistics benchmarks')
+    parser.add_argument('--only', nargs='+', choices=BENCHMARKS,
+                        default=list(BENCHMARKS))
+    parser.add_argument('--output', help='JSON file to write results to')
+    parser.add_argument('--baseline', help='JSON results to compare against')
+    parser.add_argument('--threshold', type=float, default=1.25,
+                        help='slowdown ratio counted as a regression')
+    args = parser.parse_args()
+
+    report = run(args.size, args.seed, args.repeat, args.days, args.only)
+    if args.output:
+        with open(args.output, 'w') as outputFile:
+            json.dump(report, outputFile, indent=2)
+    if args.baseline:
+        with open(args.baseline) as baselineFile:
+            baseline = json.load(baselineFile)
+        if compare(report, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -132,12 +132,16 @@ class Certifications(object):
                                         WHERE tool_id=10'''):
                 self.addCertification(dbConnection, row[0], 19, row[3], row[2],
                                       row[4])
+        if db_schema_version < 17:
+            dbConnection.execute(
+                'CREATE INDEX certifications_user_id ON certifications(user_id, tool_id)')
 
     def injectData(self, dbConnection, data):
-        for datum in data:
-            self.addCertification(dbConnection, datum["barcode"],
-                                  datum["tool_id"], datum["level"],
-                                  datum["date"], datum["certifier"])
+        dbConnection.executemany(
+            '''INSERT INTO certifications(user_id, tool_id, certifier_id, date, level)
+                                VALUES (?, ?, ?, ?, ?)''',
+            ((datum["barcode"], datum["tool_id"], datum["certifier"],
+              datum["date"], datum["level"]) for datum in data))
 
     def addNewCertification(self, dbConnection, member_id, tool_id, level,
                             certifier):
@@ -171,8 +175,7 @@ class Certifications(object):
         for row in dbConnection.execute(
                 '''SELECT user_id, tool_id, date, level, members.displayName FROM certifications
                                         INNER JOIN members ON members.barcode=user_id
-                                        INNER JOIN visits ON visits.barcode=user_id
-                                        WHERE visits.status="In"
+                                        INNER JOIN presence ON presence.barcode=user_id
                                         ORDER BY members.displayName'''):
             try:
                 users[row[0]].addTool(row[1], row[2], row[3])
@@ -1,10 +1,14 @@
 import argparse
 import datetime
+import json
+import sys
 from mako.lookup import TemplateLookup
 import cherrypy
 import cherrypy.process.plugins
 
 import engine
+from connectionPool import PRAGMAS
+import sqlStats  # noqa: F401 registers tools.sqlstats
 from webBase import WebBase, Cookie
 from webMainStation import WebMainStation
 from webGuestStation import WebGuestStation
@@ -15,23 +19,51 @@ from webReports import WebReports
 from webProfile import WebProfile
 from docs import getDocumentation
 from accounts import Role
-from cherrypy_SSE import Portier
+from cherrypy_SSE import Broadcaster
 
 
 class CheckMeIn(WebBase):
     def update(self, msg):
-        fullMessage = f"event: update\ndata: {msg}\n\n"
-        cherrypy.engine.publish(self.updateChannel, fullMessage)
+        cherrypy.engine.publish(self.updateChannel, msg)
 
     def __init__(self):
         self.lookup = TemplateLookup(
             directories=['HTMLTemplates'], default_filters=['h'])
         self.updateChannel = 'updates'
+        self.broadcaster = Broadcaster(
+            self.updateChannel, event='update',
+            queueSize=cherrypy.config.get("sse.queue_size", 100),
+            overflowData=json.dumps({'reload': True}),
+            heartbeat=cherrypy.config.get("sse.heartbeat", 30),
+            replaySize=cherrypy.config.get("sse.replay_size", 100))
+        cherrypy.engine.subscribe('stop', self.broadcaster.close)
+        poolSize = cherrypy.config.get(
+            "database.pool_size", cherrypy.config.get("server.thread_pool", 10))
+        pragmas = {name: cherrypy.config[f"database.{name}"] for name in PRAGMAS
+                   if f"database.{name}" in cherrypy.config}
         self.engine = engine.Engine(
-            cherrypy.config["database.path"], cherrypy.config["database.name"], self.update)
+            cherrypy.config["database.path"], cherrypy.config["database.name"], self.update,
+            poolSize=poolSize, pragmas=pragmas,
+            occupancyCache=cherrypy.config.get("database.occupancy_cache", True),
+            writeQueue=cherrypy.config.get("database.write_queue", False),
+            instrument=cherrypy.config.get("database.instrument", False),
+            graphCache=cherrypy.config.get("database.graph_cache", 32),
+            graphCacheOnDisk=cherrypy.config.get("database.graph_cache_disk", False),
+            graphProcesses=cherrypy.config.get("database.graph_processes", 1),
+            statsCache=cherrypy.config.get("database.stats_cache", 8),
+            statsCacheTTL=cherrypy.config.get("database.stats_cache_ttl", 60),
+            statsCacheMB=cherrypy.config.get("database.stats_cache_mb", 64),
+            hasListeners=self.broadcaster.hasSubscribers)
+        cherrypy.engine.subscribe('stop', self.engine.close)
+        if self.engine.occupancy.enabled:
+            cherrypy.process.plugins.Monitor(
+                cherrypy.engine, self.checkOccupancy,
+                frequency=cherrypy.config.get(
+                    "database.occupancy_check", 5 * 60),
+                name='Occupancy check').subscribe()
 
         super().__init__(self.lookup, self.engine)
-        self.station = WebMainStation(self.lookup, self.engine)
+        self.station = WebMainStation(self.lookup, self.engine, self.broadcaster)
         self.guests = WebGuestStation(self.lookup, self.engine)
         self.certifications = WebCertifications(self.lookup, self.engine)
         self.teams = WebTeams(self.lookup, self.engine)
@@ -39,6 +71,10 @@ class CheckMeIn(WebBase):
         self.reports = WebReports(self.lookup, self.engine)
         self.profile = WebProfile(self.lookup, self.engine)
 
+    def checkOccupancy(self):
+        if not self.engine.checkOccupancy():
+            cherrypy.log("Occupancy cache didn't match the database, reloaded")
+
     @cherrypy.expose
     def index(self):
         return self.links()
@@ -53,7 +89,8 @@ class CheckMeIn(WebBase):
         with self.dbConnect() as dbConnection:
             numberPresent = self.engine.reports.numberPresent(
                 dbConnection)
-            return self.template('metrics.mako', number_people_checked_in=numberPresent)
+            return self.template('metrics.mako', number_people_checked_in=numberPresent,
+                                 updates=self.broadcaster.stats())
 
     @cherrypy.expose
     def whoishere(self):
@@ -76,8 +113,8 @@ class CheckMeIn(WebBase):
             with self.dbConnect() as dbConnection:
                 (current_keyholder_bc, _) = self.engine.accounts.getActiveKeyholder(
                     dbConnection)
-                self.engine.checkout(
-                    dbConnection, current_keyholder_bc, check_outs)
+            self.engine.write(self.engine.checkout,
+                              current_keyholder_bc, check_outs)
         return self.whoishere()
 
     @cherrypy.expose
@@ -87,8 +124,7 @@ class CheckMeIn(WebBase):
     @cherrypy.expose
     def unlock(self, location, barcode):
         # For now there is only one location
-        with self.dbConnect() as dbConnection:
-            self.engine.unlocks.addEntry(dbConnection, location, barcode)
+        self.engine.write(self.engine.unlocks.addEntry, location, barcode)
         self.station.checkin(barcode)
 
     @cherrypy.expose
@@ -120,26 +156,17 @@ class CheckMeIn(WebBase):
                              displayName=displayName, activeMembers=activeMembers)
 
     @cherrypy.expose
-    def updateSSE(self):
+    def updateSSE(self, lastEventId=None):
         """
-        publishes data from the subscribed channel..
+        Streams the station updates as server-sent events, starting with
+        any published after lastEventId.  A reconnecting EventSource sends
+        that as the Last-Event-ID header.
         """
-        print("Entering SSE")
-        doorman = Portier(self.updateChannel)
-
+        subscriber = self.broadcaster.subscribe(
+            cherrypy.request.headers.get("Last-Event-ID", lastEventId))
         cherrypy.response.headers["Content-Type"] = "text/event-stream"
-
-        def pub():
-            for message in doorman.messages():
-                try:
-                    print(f"Sending Message: {message}")
-                    yield message
-                except GeneratorExit:
-                    # cherrypy shuts down the generator when the client
-                    # disconnects. Catch disconnect and unsubscribe to clean up
-                    doorman.unsubscribe()
-                    return
-        return pub()
+        cherrypy.response.headers["Cache-Control"] = "no-cache"
+        return self.broadcaster.messages(subscriber)
     updateSSE._cp_config = {'response.stream': True}
 
 
@@ -147,10 +174,20 @@ if __name__ == '__main__':  # pragma: no cover
     parser = argparse.ArgumentParser(
         description="CheckMeIn - building check in and out system")
     parser.add_argument('conf')
+    parser.add_argument('--backfill-rollups', action='store_true',
+                        help='rebuild the report rollups from every visit and exit')
     args = parser.parse_args()
 
     cherrypy.config.update(args.conf)  # So I can access in __init__
 
+    if args.backfill_rollups:
+        theEngine = engine.Engine(cherrypy.config["database.path"],
+                                  cherrypy.config["database.name"], None)
+        with theEngine.dbConnect() as dbConnection:
+            theEngine.rollups.backfill(dbConnection)
+        theEngine.close()
+        sys.exit(0)
+
     # wd = cherrypy.process.plugins.BackgroundTask(15, func)
     # wd.start()
 
@@ -1,51 +1,179 @@
 import threading
+import time
+from collections import deque, namedtuple
+
 import cherrypy
-from cherrypy.process import plugins
 
-class Portier(threading.Thread):
+# A comment line, sent when there is nothing else so that the connections
+# of clients that have gone away are noticed and closed
+HEARTBEAT = ': heartbeat\n\n'
+
+BroadcastStats = namedtuple(
+    'BroadcastStats', ['subscribers', 'published', 'dropped', 'queued', 'lag'])
+
+
+def formatEvent(event, data, eventId=None):
+    """The server-sent event frame for data, which may be several lines"""
+    lines = ''.join(f'data: {line}\n' for line in str(data).split('\n'))
+    if eventId is None:
+        return f'event: {event}\n{lines}\n'
+    return f'id: {eventId}\nevent: {event}\n{lines}\n'
+
+
+class Subscriber(object):
+    """One client's frames waiting to be sent, with when they were published"""
+
+    def __init__(self, size):
+        self.size = size
+        self.frames = deque()
+        self.ready = threading.Condition()
+        self.dropped = 0
+        self.closed = False
+
+    def put(self, frame, now, overflowFrame):
+        with self.ready:
+            if len(self.frames) >= self.size:
+                if overflowFrame is None:
+                    self.frames.popleft()
+                    self.dropped += 1
+                else:
+                    # too far behind to catch up frame by frame, so
+                    # replace the lot with the one telling it to start over
+                    self.dropped += len(self.frames) + 1
+                    self.frames.clear()
+                    frame = overflowFrame
+            self.frames.append((now, frame))
+            self.ready.notify()
+
+    def get(self, timeout):
+        """The next frame, None if there wasn't one within timeout"""
+        with self.ready:
+            if not self.frames and not self.closed:
+                self.ready.wait(timeout)
+            if not self.frames:
+                return None
+            return self.frames.popleft()[1]
+
+    def close(self):
+        with self.ready:
+            self.closed = True
+            self.ready.notify()
+
+    def lag(self, now):
+        """Seconds the oldest waiting frame has waited"""
+        with self.ready:
+            return now - self.frames[0][0] if self.frames else 0.0
+
+
+class Broadcaster(object):
     """
-    The Doorman (Portier) detects changes of message by listening to the
-    subscribed channel, opens 'the door' as a message appears, yield it
-    and closes the door once trough.
+    Sends what is published on a cherrypy bus channel to every client
+    streaming from it.
+
+    Publishing only appends to each client's queue, so a slow client never
+    holds up the publisher or the others.  A client whose queue fills up has
+    it replaced by overflowData, such as a message telling it to reload, so
+    it knows it missed something.  Without overflowData the oldest frames
+    are dropped instead.
 
-    channel: the cherrypy bus channel to listen to.
+    Every event gets an id one more than the last, starting from the time
+    in microseconds so they keep going up across restarts.  The last
+    replaySize events are kept so a client reconnecting with the id of the
+    last one it saw is sent just the ones it missed.  One that has missed
+    more than that, or the ones before a restart, gets overflowData.
     """
-    def __init__(self, channel):
-        super().__init__()
-        #self.daemon = True
+
+    def __init__(self, channel, event='message', queueSize=100,
+                 overflowData=None, heartbeat=30, replaySize=100):
         self.channel = channel
-        self.e = threading.Event()
-        self.name = 'Portier-'+self.name
-        cherrypy.engine.subscribe(channel, self._msgs)
-                
-    @property
-    def message(self):
-        """contains the last message published to the bus channel"""
-        return self._message
-
-    @message.setter
-    def message(self, msg):
-        """Sets the latest message and triggers the 'door' to open"""        
-        self.e.set()
-        self._message = msg
-
-    def messages(self):
+        self.event = event
+        self.queueSize = queueSize
+        self.overflowFrame = None if overflowData is None else \
+            formatEvent(event, overflowData)
+        self.heartbeat = heartbeat
+        self.lock = threading.Lock()
+        self.subscribers = set()
+        self.lastId = time.time_ns() // 1000
+        self.replay = deque(maxlen=replaySize)  # (id, frame)
+        self.published = 0
+        self.dropped = 0  # by clients that have since gone
+        cherrypy.engine.subscribe(channel, self.publish)
+
+    def publish(self, data):
+        now = time.monotonic()
+        # queued while locked so every client gets them in id order
+        with self.lock:
+            self.published += 1
+            self.lastId += 1
+            frame = formatEvent(self.event, data, self.lastId)
+            self.replay.append((self.lastId, frame))
+            for subscriber in self.subscribers:
+                subscriber.put(frame, now, self.overflowFrame)
+
+    def subscribe(self, lastEventId=None):
+        """A new subscriber, which given the id of the last event a client
+           saw starts with the ones published since"""
+        subscriber = Subscriber(self.queueSize)
+        now = time.monotonic()
+        with self.lock:
+            if lastEventId:
+                for frame in self.missedSince(lastEventId):
+                    subscriber.put(frame, now, self.overflowFrame)
+            self.subscribers.add(subscriber)
+        return subscriber
+
+    def missedSince(self, lastEventId):
+        try:
+            lastEventId = int(lastEventId)
+        except ValueError:
+            lastEventId = None
+        oldest = self.replay[0][0] if self.replay else self.lastId + 1
+        if lastEventId is None or not oldest - 1 <= lastEventId <= self.lastId:
+            return [] if self.overflowFrame is None else [self.overflowFrame]
+        return [frame for (eventId, frame) in self.replay if eventId > lastEventId]
+
+    def hasSubscribers(self):
+        return bool(self.subscribers)
+
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            if subscriber in self.subscribers:
+                self.subscribers.remove(subscriber)
+                self.dropped += subscriber.dropped
+
+    def messages(self, subscriber):
         """
-        The Doorman's door, yields the messages as they appear on
-        the bus channel.
-        """        
-        while True:
-            self.e.wait()
-            yield self._message
-            self.e.clear()
-
-    def _msgs(self, message):
-        """Receives the messages from the bus"""
-        self.message = message
-
-    def unsubscribe(self):
+        Yields the frames for subscriber as they are published, or a
+        heartbeat when there are none.  Closing the generator, as cherrypy
+        does when the client disconnects, unsubscribes it.
         """
-        Unsubscribe from the message stream, signals to remove the thread
-        from the heartbet stream
-        """     
-        cherrypy.engine.unsubscribe(self.channel, self._msgs)
+        try:
+            while True:
+                frame = subscriber.get(self.heartbeat)
+                if frame is None:
+                    if subscriber.closed:
+                        return
+                    frame = HEARTBEAT
+                yield frame
+        finally:
+            self.unsubscribe(subscriber)
+
+    def close(self):
+        """Stops every stream, for when the server is stopping"""
+        cherrypy.engine.unsubscribe(self.channel, self.publish)
+        with self.lock:
+            subscribers = list(self.subscribers)
+        for subscriber in subscribers:
+            subscriber.close()
+
+    def stats(self):
+        now = time.monotonic()
+        with self.lock:
+            subscribers = list(self.subscribers)
+            published = self.published
+            dropped = self.dropped
+        return BroadcastStats(
+            subscribers=len(subscribers), published=published,
+            dropped=dropped + sum(subscriber.dropped for subscriber in subscribers),
+            queued=sum(len(subscriber.frames) for subscriber in subscribers),
+            lag=max((subscriber.lag(now) for subscriber in subscribers), default=0.0))
@@ -0,0 +1,180 @@
+import re
+import sqlite3
+import threading
+import time
+
+# How long a connection can sit unused before it is checked with a query
+HEALTH_CHECK_INTERVAL = 60
+
+# PRAGMAs that can be tuned from the config file as database.<pragma>
+PRAGMAS = ('journal_mode', 'synchronous', 'mmap_size', 'cache_size',
+           'busy_timeout', 'temp_store')
+# These change the database file so can't be set from a read only connection
+FILE_PRAGMAS = ('journal_mode', )
+
+
+def applyPragmas(connection, pragmas, readOnly=False):
+    for (name, value) in pragmas.items():
+        if name not in PRAGMAS:
+            raise ValueError(f"Unknown database setting: {name}")
+        if readOnly and name in FILE_PRAGMAS:
+            continue
+        # PRAGMA values can't be bound as parameters, so only allow words
+        if not re.fullmatch(r'-?\w+', str(value)):
+            raise ValueError(f"Bad value for database.{name}: {value}")
+        connection.execute(f'PRAGMA {name} = {value}').fetchall()
+
+
+def getPragmas(connection):
+    """Returns the value of each tunable PRAGMA in effect on connection"""
+    return {name: connection.execute(f'PRAGMA {name}').fetchone()[0]
+            for name in PRAGMAS}
+
+
+class PooledConnection(sqlite3.Connection):
+    """
+    A connection whose with blocks can nest, as they do when a function
+    holding one calls another that asks the pool for its own.  Only the
+    outermost block commits, or rolls back on an exception.  Inner ones
+    are savepoints, so an exception only undoes what that block did.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.depth = 0
+        self.retired = False
+
+    def __enter__(self):
+        if self.depth:
+            if not self.in_transaction:
+                self.execute('BEGIN')
+            self.execute(f'SAVEPOINT nested_{self.depth}')
+        self.depth += 1
+        return self
+
+    def __exit__(self, excType, exc, tb):
+        self.depth -= 1
+        if self.depth:
+            name = f'nested_{self.depth}'
+            if excType is not None:
+                self.execute(f'ROLLBACK TO {name}')
+            self.execute(f'RELEASE {name}')
+            return False
+        try:
+            return super().__exit__(excType, exc, tb)
+        finally:
+            if self.retired:
+                # the pool was closed while this was in use
+                self.close()
+
+
+class ConnectionPool(object):
+    """
+    Hands out one long-lived sqlite3 connection per thread so that requests
+    don't pay for opening the database and parsing the schema every time.
+
+    As a thread gets the same connection each time, with blocks using it
+    can nest, so the connections are PooledConnections which only commit
+    when the outermost block is left.  If more threads than `size` ask for
+    a connection, the extra ones get a private connection that is not kept.
+    Every connection opened gets `pragmas` applied and is made by
+    `factory`, a PooledConnection subclass.
+    """
+
+    def __init__(self, database, size=10, pragmas=None,
+                 healthCheckInterval=HEALTH_CHECK_INTERVAL,
+                 factory=PooledConnection):
+        self.database = database
+        self.size = size
+        self.pragmas = pragmas or {}
+        self.factory = factory
+        self.healthCheckInterval = healthCheckInterval
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.connections = {}  # thread -> connection
+        self.generation = 0
+
+    def open(self):
+        # check_same_thread is off so close() can be called from the thread
+        # stopping the server, each connection is still only used by its owner
+        connection = sqlite3.connect(self.database,
+                                     detect_types=sqlite3.PARSE_DECLTYPES,
+                                     check_same_thread=False,
+                                     factory=self.factory)
+        applyPragmas(connection, self.pragmas)
+        return connection
+
+    def connect(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is not None:
+            if connection.depth:
+                # inside a with block, so closing it would lose that block's
+                # work, it is retired when the outermost block is left instead
+                if self.local.generation != self.generation:
+                    connection.retired = True
+                return connection
+            if self.local.generation == self.generation and self.isHealthy():
+                return connection
+            self.discard()
+        return self.checkout()
+
+    def isHealthy(self):
+        now = time.monotonic()
+        if now - self.local.lastChecked < self.healthCheckInterval:
+            return True
+        try:
+            self.local.connection.execute('SELECT 1').fetchone()
+        except sqlite3.Error:
+            return False
+        self.local.lastChecked = now
+        return True
+
+    def checkout(self):
+        thread = threading.current_thread()
+        connection = self.open()
+        with self.lock:
+            if len(self.connections) >= self.size:
+                self.prune()
+            if len(self.connections) >= self.size:
+                return connection   # overflow, not kept for this thread
+            self.connections[thread] = connection
+            self.local.generation = self.generation
+        self.local.connection = connection
+        self.local.lastChecked = time.monotonic()
+        return connection
+
+    def discard(self):
+        connection = self.local.connection
+        with self.lock:
+            if self.connections.get(threading.current_thread()) is connection:
+                del self.connections[threading.current_thread()]
+        self.local.connection = None
+        self.closeConnection(connection)
+
+    def prune(self):
+        """Close connections of threads that have gone away (lock held)"""
+        for thread in [t for t in self.connections if not t.is_alive()]:
+            self.closeConnection(self.connections.pop(thread))
+
+    def closeConnection(self, connection):
+        try:
+            connection.close()
+        except sqlite3.Error:  # pragma: no cover
+            pass
+
+    def numConnections(self):
+        with self.lock:
+            return len(self.connections)
+
+    def close(self):
+        """Close every pooled connection, threads will reopen on next use.
+           One in a with block is closed when its thread leaves the block."""
+        with self.lock:
+            self.generation += 1
+            connections = list(self.connections.values())
+            self.connections.clear()
+        for connection in connections:
+            if getattr(connection, 'depth', 0):
+                connection.retired = True
+            else:
+                self.closeConnection(connection)
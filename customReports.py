@@ -1,10 +1,13 @@
 import sqlite3
 import os
 
+from connectionPool import applyPragmas
+
 
 class CustomReports:
-    def __init__(self, database):
+    def __init__(self, database, pragmas=None):
         self.database = database
+        self.pragmas = pragmas or {}
 
     def migrate(self, dbConnection, db_schema_version):
         if db_schema_version < 7:
@@ -22,7 +25,10 @@ class CustomReports:
                 (datum["report_id"], datum["name"], datum["sql_text"]))
 
     def readOnlyConnect(self):
-        return sqlite3.connect('file:' + self.database + '?mode=ro', uri=True)
+        connection = sqlite3.connect(
+            'file:' + self.database + '?mode=ro', uri=True)
+        applyPragmas(connection, self.pragmas, readOnly=True)
+        return connection
 
     def customSQL(self, sql):
         # open as read only
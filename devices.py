@@ -15,6 +15,9 @@ class Devices(object):
                                  (mac TEXT PRIMARY KEY,
                                   barcode TEXT,
                                   name TEXT)''')
+        if db_schema_version < 17:
+            dbConnection.execute(
+                'CREATE INDEX devices_barcode ON devices(barcode)')
 
     def injectData(self, dbConnection, data):
         for datum in data:
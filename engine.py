@@ -1,9 +1,12 @@
+import json
 import os
-import sqlite3
+import threading
+from collections import namedtuple
 
+from connectionPool import ConnectionPool, PooledConnection, getPragmas
 from members import Members
 from guests import Guests
-from reports import Reports
+from reports import Change, Reports
 from teams import Teams
 from customReports import CustomReports
 from certifications import Certifications
@@ -13,18 +16,63 @@ from devices import Devices
 from unlocks import Unlocks
 from logEvents import LogEvents
 from config import Config
+from graphCache import GraphCache
+from graphRenderer import GraphRenderer
+from occupancy import Occupancy
+from rollups import Rollups
+from sqlStats import InstrumentedConnection
+from statsCache import StatsCache
+from writeQueue import WriteQueue
+
+SCHEMA_VERSION = 24
+
+BulkUpdate = namedtuple(
+    'BulkUpdate', ['checkedIn', 'checkedOut', 'leavingKeyholder'])
+
+
+class Pending(object):
+    """What a write changed, acted on once it has been committed"""
+
+    def __init__(self):
+        self.changes = []  # for the kiosks
+        self.present = set()  # barcodes to refresh in the occupancy cache
+        self.everyone = False  # reload the whole occupancy cache
+
+    def add(self, other):
+        self.changes.extend(other.changes)
+        self.present.update(other.present)
+        self.everyone = self.everyone or other.everyone
 
-SCHEMA_VERSION = 16
 
 # This is the engine for all of the backend
 
 
 class Engine(object):
-    def __init__(self, dbPath, dbName, update):
+    def __init__(self, dbPath, dbName, update, poolSize=10, pragmas=None,
+                 occupancyCache=True, writeQueue=False, instrument=False,
+                 graphCache=32, graphCacheOnDisk=False, graphProcesses=1,
+                 statsCache=8, statsCacheTTL=60, statsCacheMB=64,
+                 hasListeners=None):
         self.database = dbPath + dbName
         self.dataPath = dbPath
         self.update = update
-        self.visits = Visits()
+        self.hasListeners = hasListeners
+        self.local = threading.local()
+        self.occupancyLock = threading.Lock()
+        self.pragmas = pragmas or {}
+        self.instrumented = instrument
+        self.pool = ConnectionPool(
+            self.database, poolSize, self.pragmas,
+            factory=InstrumentedConnection if instrument else PooledConnection)
+        self.writeQueue = WriteQueue(self.pool.open) if writeQueue else None
+        self.occupancy = Occupancy(occupancyCache)
+        self.graphCache = GraphCache(
+            graphCache, dbPath + 'graphs' if graphCacheOnDisk else None)
+        self.graphRenderer = GraphRenderer(graphProcesses)
+        self.statsCache = StatsCache(statsCache, statsCacheTTL,
+                                     statsCacheMB * 1024 * 1024)
+        self.visits = Visits(self)
+        self.rollups = Rollups(self)
         self.guests = Guests()
         self.reports = Reports(self)
         self.teams = Teams()
@@ -33,7 +81,7 @@ class Engine(object):
         self.unlocks = Unlocks()
         self.config = Config()
         # needs path since it will open read only
-        self.customReports = CustomReports(self.database)
+        self.customReports = CustomReports(self.database, self.pragmas)
         self.certifications = Certifications()
         self.members = Members()
         self.logEvents = LogEvents()
@@ -48,10 +96,105 @@ class Engine(object):
                 data = c.execute('PRAGMA schema_version').fetchone()
                 if data[0] != SCHEMA_VERSION:
                     self.migrate(c, data[0])
+        with self.dbConnect() as c:
+            self.occupancy.load(c)
 
     def dbConnect(self):
-        return sqlite3.connect(self.database,
-                               detect_types=sqlite3.PARSE_DECLTYPES)
+        return self.pool.connect()
+
+    def write(self, func, *args):
+        """Makes the changes done by func(dbConnection, *args) and returns
+           its result.  With the write queue on, this runs on the writer
+           thread, so the caller must not have uncommitted changes of its own.
+           The occupancy cache is updated and anything func noted with
+           changed() announced once committed, so not after a rollback."""
+        if self.writeQueue:
+            (result, pending) = self.writeQueue.write(
+                self.recordChanges, func, *args)
+        else:
+            with self.dbConnect() as dbConnection:
+                (result, pending) = self.recordChanges(
+                    dbConnection, func, *args)
+        if pending is not None:
+            self.updateOccupancy(pending)
+            self.announce(pending.changes)
+        return result
+
+    def recordChanges(self, dbConnection, func, *args):
+        outer = getattr(self.local, 'pending', None)
+        self.local.pending = Pending()
+        try:
+            result = func(dbConnection, *args)
+            pending = self.local.pending
+        finally:
+            self.local.pending = outer
+        if outer is not None:
+            # a write made inside another is committed along with it
+            outer.add(pending)
+            pending = None
+        return (result, pending)
+
+    def changed(self, barcode=None, time=None, description=None):
+        """Notes a change for the kiosks.  Outside of write() there is
+           nothing to announce it after, so it is ignored."""
+        pending = getattr(self.local, 'pending', None)
+        if pending is not None:
+            pending.changes.append(Change(barcode, time, description))
+
+    def presenceChanged(self, dbConnection, barcodes=None):
+        """Notes that barcodes, or with None everyone, may have come or gone.
+           Outside of write() the occupancy cache is updated straight away."""
+        pending = getattr(self.local, 'pending', None)
+        now = pending is None
+        if now:
+            pending = Pending()
+        if barcodes is None:
+            pending.everyone = True
+        else:
+            pending.present.update(barcodes)
+        if now:
+            self.updateOccupancy(pending, dbConnection)
+
+    def updateOccupancy(self, pending, dbConnection=None):
+        if not self.occupancy.enabled or not (pending.everyone or pending.present):
+            return
+        # read and applied together, so an older read can't land after a newer one
+        with self.occupancyLock:
+            if dbConnection is None:
+                with self.dbConnect() as dbConnection:
+                    self.readOccupancy(pending, dbConnection)
+            else:
+                self.readOccupancy(pending, dbConnection)
+
+    def readOccupancy(self, pending, dbConnection):
+        if pending.everyone:
+            self.occupancy.load(dbConnection)
+        else:
+            self.occupancy.refresh(dbConnection, pending.present)
+
+    def announce(self, changes):
+        if not changes or not self.update:
+            return
+        if self.hasListeners and not self.hasListeners():
+            # not worth reading the details for nobody, but a kiosk
+            # reconnecting should still find out it missed something
+            self.update(json.dumps({'reload': True}))
+            return
+        with self.dbConnect() as dbConnection:
+            update = self.reports.stationUpdate(dbConnection, changes)
+        self.update(json.dumps(update))
+
+    def close(self):
+        if self.writeQueue:
+            self.writeQueue.stop()
+        self.graphRenderer.close()
+        self.pool.close()
+
+    def getDatabaseSettings(self, dbConnection):
+        """Returns (name, configured value, value in effect) for each PRAGMA"""
+        inEffect = getPragmas(dbConnection)
+        return [(name, self.pragmas.get(name, ''), value)
+                for (name, value) in inEffect.items()]
 
     def migrate(self, dbConnection, db_schema_version):
         if db_schema_version < SCHEMA_VERSION:
@@ -66,6 +209,7 @@ class Engine(object):
             self.devices.migrate(dbConnection, db_schema_version)
             self.unlocks.migrate(dbConnection, db_schema_version)
             self.logEvents.migrate(dbConnection, db_schema_version)
+            self.rollups.migrate(dbConnection, db_schema_version)
             dbConnection.execute('PRAGMA schema_version = ' +
                                  str(SCHEMA_VERSION))
         elif db_schema_version != SCHEMA_VERSION:  # pragma: no cover
@@ -91,6 +235,102 @@ class Engine(object):
             if key in dictValues:
                 with self.dbConnect() as dbConnection:
                     member.injectData(dbConnection, dictValues[key])
+        with self.dbConnect() as dbConnection:
+            self.occupancy.load(dbConnection)
+            self.rollups.update(dbConnection)
+
+    def checkOccupancy(self):
+        """Returns whether the occupancy cache matched the database"""
+        with self.dbConnect() as dbConnection:
+            return self.occupancy.verify(dbConnection)
+
+    def addGuest(self, dbConnection, displayName, first, last, email,
+                 whereFound, newsletter):
+        guest_id = self.guests.add(dbConnection, displayName, first, last,
+                                   email, whereFound, newsletter)
+        self.visits.enterGuest(dbConnection, guest_id)
+        return guest_id
+
+    def setKeyholder(self, dbConnection, barcode):
+        """Makes barcode the active keyholder, returning whether it changed"""
+        if self.accounts.setActiveKeyholder(dbConnection, barcode):
+            self.changed()
+            return True
+        return False
+
+    def closeBuilding(self, dbConnection, keyholder_barcode):
+        self.visits.emptyBuilding(dbConnection, keyholder_barcode)
+        self.accounts.removeKeyholder(dbConnection)
+
+    def scanMember(self, dbConnection, barcode):
+        """Checks barcode in or out, making them the keyholder if there
+           isn't one, returning any error"""
+        error = self.visits.scannedMember(dbConnection, barcode)
+        (current_keyholder_bc, _) = self.accounts.getActiveKeyholder(
+            dbConnection)
+        if not current_keyholder_bc:
+            self.setKeyholder(dbConnection, barcode)
+        return error
+
+    def makeKeyholder(self, dbConnection, barcode):
+        """Checks barcode in if needed and makes them the keyholder,
+           returning whether they became it"""
+        self.visits.checkInMember(dbConnection, barcode)
+        return self.setKeyholder(dbConnection, barcode)
+
+    def checkOutKeyholder(self, dbConnection, keyholder_barcode):
+        """The keyholder leaving while others stay"""
+        self.accounts.removeKeyholder(dbConnection)
+        return self.visits.checkOutMember(dbConnection, keyholder_barcode)
+
+    def setGracePeriod(self, dbConnection, grace, barcode):
+        self.config.update(dbConnection, "grace_period", grace)
+        self.logEvents.addEvent(dbConnection, "Grace changed", barcode)
+
+    def bulkAddMembers(self, dbConnection, csvfile, barcode):
+        error = self.members.bulkAdd(dbConnection, csvfile)
+        self.logEvents.addEvent(dbConnection, "Bulk Add", barcode)
+        return error
+
+    def forgotPassword(self, username):
+        """E-mails username a token to reset their password with, returning
+           the address or why not.  Only storing it goes through write(),
+           the hashing and e-mail would hold up every other write."""
+        with self.dbConnect() as dbConnection:
+            user = self.accounts.findUser(dbConnection, username)
+        (token, hashedToken) = self.accounts.newForgotToken() if user else ('', '')
+        (emailAddress, error) = self.write(
+            self.recordForgotPassword, username, user, hashedToken)
+        if error:
+            return error
+        self.accounts.emailToken(user, emailAddress, token)
+        return emailAddress
+
+    def recordForgotPassword(self, dbConnection, username, user, hashedToken):
+        if user:
+            (emailAddress, error) = self.accounts.setForgotToken(
+                dbConnection, user, hashedToken)
+        else:
+            (emailAddress, error) = ('', f'No email sent due to not finding user: {username}')
+        self.logEvents.addEvent(dbConnection, "Forgot password request",
+                                f"{emailAddress or error} for {username}")
+        return (emailAddress, error)
+
+    def addUser(self, user, password, barcode, role):
+        """Adds an account and e-mails the user a way to set their password,
+           with the slow parts kept out of write() as for forgotPassword"""
+        hashedPassword = self.accounts.hashPassword(password)
+        (token, hashedToken) = self.accounts.newForgotToken()
+        (emailAddress, error) = self.write(
+            self.recordNewUser, user, hashedPassword, barcode, role, hashedToken)
+        self.accounts.emailNewUser(user, emailAddress, role)
+        if not error:
+            self.accounts.emailToken(user, emailAddress, token)
+
+    def recordNewUser(self, dbConnection, user, hashedPassword, barcode, role,
+                      hashedToken):
+        self.accounts.insertUser(dbConnection, user, hashedPassword, barcode, role)
+        return self.recordForgotPassword(dbConnection, user, user, hashedToken)
 
     def getGuestLists(self, dbConnection):
         all_guests = self.guests.getList(dbConnection)
@@ -106,26 +346,38 @@ class Engine(object):
     def checkin(self, dbConnection, check_ins):
         (current_keyholder_bc, _) = self.accounts.getActiveKeyholder(
             dbConnection)
-        for barcode in check_ins:
-            error = self.visits.checkInMember(dbConnection, barcode)
-            if not current_keyholder_bc:
-                if self.accounts.setActiveKeyholder(dbConnection, barcode):
+        self.visits.checkInMembers(dbConnection, check_ins)
+        if not current_keyholder_bc:
+            keyholders = self.accounts.getKeyholderBarcodes(dbConnection)
+            for barcode in check_ins:
+                if barcode in keyholders and \
+                        self.setKeyholder(dbConnection, barcode):
                     current_keyholder_bc = barcode
+                    break
         return current_keyholder_bc
 
     def checkout(self, dbConnection, current_keyholder_bc, check_outs):
-        currentKeyholderLeaving = False
-        for barcode in check_outs:
-            if barcode == current_keyholder_bc:
-                currentKeyholderLeaving = True
-            else:
-                error = self.visits.checkOutMember(
-                    dbConnection, barcode)
-        if currentKeyholderLeaving:
+        self.visits.checkOutMembers(
+            dbConnection, [barcode for barcode in check_outs
+                           if barcode != current_keyholder_bc])
+        if current_keyholder_bc and current_keyholder_bc in check_outs:
             return current_keyholder_bc
         return False
     # This returns whether the current keyholder would be leaving
 
     def bulkUpdate(self, dbConnection, check_ins, check_outs):
+        """Applies a whole roster change in the caller's transaction and
+           returns a BulkUpdate of who actually changed.  A leaving keyholder
+           is left checked in for the caller to deal with."""
+        barcodes = list(check_ins) + list(check_outs)
+        before = self.visits.presentAmong(dbConnection, barcodes)
         current_keyholder_bc = self.checkin(dbConnection, check_ins)
-        return self.checkout(dbConnection, current_keyholder_bc, check_outs)
+        leavingKeyholder = self.checkout(
+            dbConnection, current_keyholder_bc, check_outs)
+        after = self.visits.presentAmong(dbConnection, barcodes)
+        return BulkUpdate(
+            checkedIn=list(dict.fromkeys(
+                bc for bc in check_ins if bc not in before and bc in after)),
+            checkedOut=list(dict.fromkeys(
+                bc for bc in check_outs if bc in before and bc not in after)),
+            leavingKeyholder=leavingKeyholder)
@@ -0,0 +1,88 @@
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+
+class GraphCache(object):
+    """
+    The most recently used rendered graphs, keyed by anything repr() tells
+    apart.  Callers put the version of the data in the key, so nothing is
+    ever invalidated, old entries just fall off the end.
+
+    Given a directory the graphs are written there too, so they survive a
+    restart, and the least recently used files beyond size are removed.
+    A size of 0 turns the cache off.
+    """
+
+    def __init__(self, size=32, directory=None):
+        self.size = size
+        self.directory = directory if size else None
+        self.lock = threading.Lock()
+        self.graphs = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+
+    def fileName(self, key):
+        return os.path.join(self.directory,
+                            hashlib.sha1(repr(key).encode('utf-8')).hexdigest() + '.png')
+
+    def get(self, key):
+        """The graph for key, None if it isn't cached"""
+        with self.lock:
+            graph = self.graphs.get(key)
+            if graph is not None:
+                self.graphs.move_to_end(key)
+                self.hits += 1
+                return graph
+        if self.directory:
+            try:
+                with open(self.fileName(key), 'rb') as graphFile:
+                    graph = graphFile.read()
+                os.utime(self.fileName(key))
+            except OSError:
+                graph = None
+        with self.lock:
+            if graph is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.remember(key, graph)
+        return graph
+
+    def put(self, key, graph):
+        if not self.size:
+            return
+        with self.lock:
+            self.remember(key, graph)
+        if self.directory:
+            (handle, tempName) = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(handle, 'wb') as graphFile:
+                graphFile.write(graph)
+            os.replace(tempName, self.fileName(key))
+            self.prune()
+
+    def remember(self, key, graph):
+        self.graphs[key] = graph
+        self.graphs.move_to_end(key)
+        while len(self.graphs) > self.size:
+            self.graphs.popitem(last=False)
+
+    def prune(self):
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.png'):
+                try:
+                    files.append((entry.stat().st_mtime, entry.path))
+                except OSError:
+                    pass
+        files.sort(reverse=True)
+        for (_, path) in files[self.size:]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
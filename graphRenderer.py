@@ -0,0 +1,51 @@
+import concurrent.futures
+import multiprocessing
+import threading
+
+
+def draw(name, *args):
+    import plotting  # only when needed, it loads matplotlib
+    return getattr(plotting, name)(*args)
+
+
+class GraphRenderer(object):
+    """
+    Draws graphs with the plotting module in other processes, so the
+    CPU time rendering takes doesn't hold up the request threads.
+
+    The pool is started on the first graph.  With processes=0, or if the
+    pool has died, graphs are drawn in this process one at a time instead.
+    """
+
+    def __init__(self, processes=1, timeout=60):
+        self.processes = processes
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.executor = None
+
+    def getExecutor(self):
+        with self.lock:
+            if self.executor is None and self.processes:
+                # not forked, as that would copy the other threads' locks
+                self.executor = concurrent.futures.ProcessPoolExecutor(
+                    self.processes, mp_context=multiprocessing.get_context('spawn'))
+            return self.executor
+
+    def render(self, name, *args):
+        """PNG bytes from plotting.name(*args)"""
+        executor = self.getExecutor()
+        if executor:
+            try:
+                return executor.submit(draw, name, *args).result(self.timeout)
+            except concurrent.futures.process.BrokenProcessPool:
+                with self.lock:
+                    if self.executor is executor:
+                        self.executor = None
+        with self.lock:
+            return draw(name, *args)
+
+    def close(self):
+        with self.lock:
+            if self.executor:
+                self.executor.shutdown()
+                self.executor = None
@@ -33,12 +33,11 @@ class Guests(object):
                 "ALTER TABLE guests ADD COLUMN newsletter INTEGER default 0")
 
     def injectData(self, dbConnection, data):
-        for datum in data:
-            dbConnection.execute(
-                "INSERT INTO guests VALUES (?,?,?,?,?,?,?,?)",
-                (datum["guest_id"], datum["displayName"], datum["email"],
-                 datum["firstName"], datum["lastName"], datum["whereFound"],
-                 datum["status"], datum["newsletter"]))
+        dbConnection.executemany(
+            "INSERT INTO guests VALUES (?,?,?,?,?,?,?,?)",
+            ((datum["guest_id"], datum["displayName"], datum["email"],
+              datum["firstName"], datum["lastName"], datum["whereFound"],
+              datum["status"], datum["newsletter"]) for datum in data))
 
     def add(self, dbConnection, displayName, first, last, email, whereFound,
             newsletter):
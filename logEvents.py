@@ -12,11 +12,14 @@ class LogEvents(object):
                                         date TIMESTAMP,
                                         barcode TEXT)
             ''')
+        if db_schema_version < 17:
+            dbConnection.execute(
+                'CREATE INDEX logEvents_what_date ON logEvents(what, date)')
 
     def injectData(self, dbConnection, data):
-        for datum in data:
-            self.addEvent(
-                dbConnection, datum["what"], datum["barcode"], datum["date"])
+        dbConnection.executemany("INSERT INTO logEvents VALUES (?,?,?)",
+                                 ((datum["what"], datum["date"], datum["barcode"])
+                                  for datum in data))
 
     def addEvent(self, dbConnection, what, barcode, date=None):
         if not date:
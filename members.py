@@ -61,11 +61,11 @@ class Members(object):
             ''')
 
     def injectData(self, dbConnection, data):
-        for datum in data:
-            dbConnection.execute("INSERT INTO members VALUES (?,?,?,?,?,?)",
-                                 (datum["barcode"], datum["displayName"],
-                                  datum["firstName"], datum["lastName"],
-                                  datum["email"], datum["membershipExpires"]))
+        dbConnection.executemany("INSERT INTO members VALUES (?,?,?,?,?,?)",
+                                 ((datum["barcode"], datum["displayName"],
+                                   datum["firstName"], datum["lastName"],
+                                   datum["email"], datum["membershipExpires"])
+                                  for datum in data))
 
     def bulkAdd(self, dbConnection, csvFile):
         numMembers = 0
@@ -0,0 +1,91 @@
+import threading
+from collections import namedtuple
+
+Occupant = namedtuple(
+    'Occupant', ['visit_id', 'barcode', 'start', 'displayName', 'isGuest'])
+
+
+class Occupancy(object):
+    """
+    In memory copy of the presence table so the pages that poll who is in
+    the building can answer without SQL.
+
+    Engine.write() brings it up to date once a write changing who is here
+    has committed, so a rolled back write leaves it as it was.  verify()
+    catches anything changed some other way.
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.occupants = {}  # visit_id -> Occupant
+        self.lastVerified = None
+
+    def readOccupants(self, dbConnection, barcodes=None):
+        sql = '''SELECT visit_id, presence.barcode, start,
+                        members.displayName, guests.displayName
+                 FROM presence
+                 LEFT JOIN members ON members.barcode = presence.barcode
+                 LEFT JOIN guests ON guests.guest_id = presence.barcode'''
+        params = ()
+        if barcodes is not None:
+            sql += f''' WHERE presence.barcode IN ({','.join('?' * len(barcodes))})'''
+            params = tuple(barcodes)
+        occupants = {}
+        for row in dbConnection.execute(sql, params):
+            occupants[row[0]] = Occupant(visit_id=row[0], barcode=row[1],
+                                         start=row[2],
+                                         displayName=row[3] or row[4],
+                                         isGuest=row[3] is None and row[4] is not None)
+        return occupants
+
+    def load(self, dbConnection):
+        if not self.enabled:
+            return
+        occupants = self.readOccupants(dbConnection)
+        with self.lock:
+            self.occupants = occupants
+
+    def refresh(self, dbConnection, barcodes):
+        """Re-reads just these barcodes after they changed"""
+        if not self.enabled or not barcodes:
+            return
+        barcodes = set(barcodes)
+        occupants = self.readOccupants(dbConnection, barcodes)
+        with self.lock:
+            for visit_id in [visit_id for (visit_id, occupant) in self.occupants.items()
+                             if occupant.barcode in barcodes]:
+                del self.occupants[visit_id]
+            self.occupants.update(occupants)
+
+    def clear(self):
+        with self.lock:
+            self.occupants = {}
+
+    def verify(self, dbConnection):
+        """Compares against the database, reloading if they differ.
+           Returns whether they matched."""
+        if not self.enabled:
+            return True
+        inDatabase = self.readOccupants(dbConnection)
+        with self.lock:
+            consistent = inDatabase == self.occupants
+            if not consistent:
+                self.occupants = inDatabase
+        self.lastVerified = consistent
+        return consistent
+
+    def count(self):
+        return len(self.occupants)
+
+    def isPresent(self, barcode):
+        with self.lock:
+            return any(occupant.barcode == barcode
+                       for occupant in self.occupants.values())
+
+    def getOccupants(self):
+        """Known people in the building, ordered by displayName"""
+        with self.lock:
+            occupants = [occupant for occupant in self.occupants.values()
+                         if occupant.displayName is not None]
+        return sorted(occupants, key=lambda x: (x.displayName, x.start))
@@ -0,0 +1,41 @@
+"""
+Drawing the report graphs.  matplotlib takes longer to import than the rest
+of the program put together, so this is only imported the first time a
+graph is drawn, normally in a GraphRenderer process.
+
+Figures are made directly rather than through pyplot, whose current figure
+is shared by every thread and kept until closed.
+"""
+from io import BytesIO
+
+import matplotlib
+# The pylint disable is because it doesn't like the use before other imports
+matplotlib.use('Agg')   # pylint: disable=C0413
+import matplotlib.dates  # noqa: E402
+from matplotlib.figure import Figure  # noqa: E402
+
+
+def buildingUsageGraph(points, beginDate, endDate):
+    """PNG of the (startTime, numVisitors) points from beginDate to endDate"""
+    dates = []
+    values = []
+    for (startTime, numVisitors) in points:
+        dates.append(matplotlib.dates.date2num(startTime))
+        values.append(numVisitors)
+
+    fig = Figure(figsize=(8, 6))
+    ax = fig.subplots()
+    ax.plot(dates, values, "r-")
+    ax.xaxis_date()
+    title_text = "Building usage\n" + \
+        beginDate.strftime("%b %e, %G")
+    if beginDate != endDate:
+        title_text += " - " + endDate.strftime("%b %e, %G")
+
+    ax.set_title(title_text, fontsize=14)
+    ax.set_ylabel("Number of visitors")
+    ax.grid(True)
+    ax.xaxis.set_tick_params(rotation=30, labelsize=5)
+    figData = BytesIO()
+    fig.savefig(figData, format='png', dpi=100)
+    return figData.getvalue()
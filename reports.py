@@ -1,23 +1,102 @@
+from accounts import Role
 from guests import Guest
-import matplotlib.pyplot as plt
 import sqlite3
+import sys
 import datetime
-from io import BytesIO
+import threading
 from collections import defaultdict
 from collections import namedtuple
-import matplotlib
-# The pylint disable is because it doesn't like the use before other imports
-matplotlib.use('Agg')   # pylint: disable=C0413
+import numpy as np
+
+
+class Transaction(namedtuple('Transaction', ['name', 'time', 'description'])):
+    __slots__ = ()
+
+    @property
+    def key(self):
+        """Tells the rows on the station page apart, so one sent again
+           after reconnecting isn't shown twice"""
+        return f'{self.time.isoformat()} {self.description} {self.name}'
 
 
-Transaction = namedtuple('Transaction', ['name', 'time', 'description'])
 Datum = namedtuple('Datum', ['rowid', 'start', 'leave', 'name', 'status'])
 
 VisitorsAtTime = namedtuple('VisitorsAtTime', ['startTime', 'numVisitors'])
+ForgottenDay = namedtuple('ForgottenDay', ['date', 'count'])
+OccupancyAt = namedtuple('OccupancyAt', ['startTime', 'numVisitors', 'average'])
+# A check in or out for the kiosks, or with description RELOAD something
+# they can't patch in
+Change = namedtuple('Change', ['barcode', 'time', 'description'])
+RELOAD = 'reload'
 
 PersonInBuilding = namedtuple(
     'PersonInBuilding', ['displayName', 'barcode', 'start'])
 
+USAGE_BUCKETS = ('hour', 'day')
+OCCUPANCY_MINUTES = (5, 15, 30, 60)
+MINUTES_PER_DAY = 24 * 60
+# Bytes for each of these, with the list or dict slot holding it, for
+# approximateSize()
+DATETIME_SIZE = sys.getsizeof(datetime.datetime.min) + 8
+DATE_SIZE = sys.getsizeof(datetime.date.min) + 16
+FLOAT_SIZE = sys.getsizeof(0.0)
+VISIT_SIZE = 2 * DATETIME_SIZE + 200
+
+
+def visitSeconds(starts, leaves):
+    """Seconds for each visit in datetime64[us] arrays, the same as
+       timedelta.seconds so whole days are dropped"""
+    return ((leaves - starts).astype(np.int64) // 1000000) % (24 * 60 * 60)
+
+
+def visitMinutes(starts, leaves):
+    """Minutes, counted from 1970, each visit in datetime64[us] arrays was in
+       the building from and to.  A visit that leaves before it starts is
+       only counted in the minute it started."""
+    startMinutes = starts.astype('datetime64[m]').astype(np.int64)
+    leaveMinutes = leaves.astype('datetime64[m]').astype(np.int64)
+    return (startMinutes, np.maximum(leaveMinutes, startMinutes))
+
+
+def packMinuteCounts(offsets, counts):
+    """Minutes from the start of a day and the number of visits in each as
+       bytes for the rollups"""
+    return np.array([offsets, counts], dtype='<i4').tobytes()
+
+
+def unpackMinuteCounts(packed):
+    (offsets, counts) = np.frombuffer(packed, dtype='<i4').reshape(2, -1)
+    return (offsets.astype(np.int64), counts.astype(np.int64))
+
+
+def countsByMinute(minutes, counts):
+    """The minutes with any of counts and their total, as int32 arrays"""
+    (minutes, minute) = np.unique(minutes, return_inverse=True)
+    return (minutes.astype(np.int32),
+            np.bincount(minute.ravel(), weights=counts, minlength=len(minutes)).astype(np.int32))
+
+
+def periodsClause(periods):
+    """SQL and parameters for visits starting in any of (begin, end)"""
+    return (' OR '.join(['(start BETWEEN ? AND ?)'] * len(periods)),
+            [time for period in periods for time in period])
+
+
+def knownVisits(inPeriods):
+    """SQL for the visits of members and guests starting in inPeriods, as
+       (start, leave, displayName, barcode) without duplicates.  The times
+       come back as text for numpy to parse in one go, and the parameters
+       for inPeriods are needed twice."""
+    return f'''SELECT start || '', leave || '', displayName, visits.barcode
+   FROM visits
+   INNER JOIN members ON members.barcode = visits.barcode
+   WHERE {inPeriods}
+   UNION
+   SELECT start || '', leave || '', displayName, visits.barcode
+   FROM visits
+   INNER JOIN guests ON guests.guest_id = visits.barcode
+   WHERE {inPeriods}'''
+
 
 def daterange(start_date, end_date):
     for n in range(int((end_date - start_date).days)):
@@ -25,11 +104,17 @@ def daterange(start_date, end_date):
 
 
 class Person(object):
-    def __init__(self, name, start, leave):
+    def __init__(self, name, start=None, leave=None):
         self.name = name
         self.hours = 0.0
         self.date = defaultdict(float)
-        self.addVisit(start, leave)
+        if start is not None:
+            self.addVisit(start, leave)
+
+    def approximateSize(self):
+        return sys.getsizeof(self) + sys.getsizeof(self.__dict__) + \
+            sys.getsizeof(self.name) + sys.getsizeof(self.date) + \
+            len(self.date) * (DATE_SIZE + FLOAT_SIZE)
 
     def addVisit(self, start, leave):
         dTime = leave - start
@@ -59,48 +144,235 @@ class Visit(object):
 
 
 class BuildingUsage(object):
+    """
+    Counts the visitors during periods of time, a visit counting if it
+    overlaps the period, ends included.
+
+    With the starts and leaves each sorted, that is the number that started
+    by the end of the period less the number that left before it began, so
+    a run of periods is counted in one sweep.  Visits that leave before they
+    start don't follow that and are checked one at a time.
+
+    Once all the visits are added it can be counted from several threads.
+    """
+
     def __init__(self):
-        self.visits = []
+        self.starts = []
+        self.leaves = []
+        self.oddVisits = []
+        self.hourlyCounts = {}
+        self.isSorted = True
+        self.lock = threading.Lock()
 
     def addVisit(self, start, leave):
-        self.visits.append(Visit(start, leave))
+        if leave < start:
+            self.oddVisits.append(Visit(start, leave))
+        else:
+            self.starts.append(start)
+            self.leaves.append(leave)
+            self.isSorted = False
+
+    def addVisits(self, starts, leaves):
+        """Adds numpy datetime64 arrays of visits"""
+        odd = leaves < starts
+        self.oddVisits += [Visit(start, leave) for (start, leave)
+                           in zip(starts[odd].tolist(), leaves[odd].tolist())]
+        self.starts += starts[~odd].tolist()
+        self.leaves += leaves[~odd].tolist()
+        self.isSorted = False
+
+    def addHourlyCounts(self, counts):
+        """Adds (hour, number of visitors) already counted for the hour
+           long period starting then"""
+        for (hour, count) in counts:
+            self.hourlyCounts[hour] = self.hourlyCounts.get(hour, 0) + count
+
+    def build(self):
+        """Sorts the visits added, which the first count does if not done"""
+        with self.lock:
+            if not self.isSorted:
+                # new lists, so ones being counted from don't change
+                self.starts = sorted(self.starts)
+                self.leaves = sorted(self.leaves)
+                self.isSorted = True
+
+    def approximateSize(self):
+        return sys.getsizeof(self.starts) + sys.getsizeof(self.leaves) + \
+            (len(self.starts) + len(self.leaves)) * DATETIME_SIZE + \
+            len(self.oddVisits) * VISIT_SIZE + \
+            sys.getsizeof(self.hourlyCounts) + len(self.hourlyCounts) * DATETIME_SIZE
 
     def inRange(self, start, leave):
-        numVisitors = 0
-        for visit in self.visits:
-            if visit.inRange(start, leave):
-                numVisitors += 1
-        return numVisitors
+        return self.numVisitorsDuring([(start, leave)])[0]
+
+    def numVisitorsDuring(self, periods):
+        """Number of visitors in each (start, end) of periods, which must be
+           in time order"""
+        if not self.isSorted:
+            self.build()
+        (starts, leaves) = (self.starts, self.leaves)
+        counts = []
+        numStarted = 0
+        numLeft = 0
+        for (start, end) in periods:
+            while numStarted < len(starts) and starts[numStarted] <= end:
+                numStarted += 1
+            while numLeft < len(leaves) and leaves[numLeft] < start:
+                numLeft += 1
+            count = numStarted - numLeft
+            if end - start == datetime.timedelta(hours=1):
+                count += self.hourlyCounts.get(start, 0)
+            for visit in self.oddVisits:
+                if visit.inRange(start, end):
+                    count += 1
+            counts.append(count)
+        return counts
+
+
+class MinuteOccupancy(object):
+    """
+    The visitors in the building each minute from beginDate through endDate,
+    a visit counting from the minute it started through the one it left in.
+
+    Starts and leaves are added as counts for each minute.  Compacting
+    merges them into one count for each minute that has any, which is all
+    that is kept.  A histogram turns those into running totals of visits
+    started and left by each minute, and of visitor minutes, so any bucket
+    size or hours then cost the same: a couple of lookups per bucket.  The
+    running totals take a few bytes for every minute of the range, so they
+    aren't kept.  It can be read from several threads.
+    """
+
+    def __init__(self, beginDate, endDate):
+        self.beginDate = beginDate
+        self.firstMinute = (beginDate - datetime.date(1970, 1, 1)).days * MINUTES_PER_DAY
+        self.numMinutes = ((endDate - beginDate).days + 1) * MINUTES_PER_DAY
+        self.counts = []  # (start minutes, counts, leave minutes, counts)
+        self.rollups = []
+        self.isCompact = True
+        self.lock = threading.Lock()
+
+    def addCounts(self, startMinutes, startCounts, leaveMinutes, leaveCounts):
+        """Adds the number of visits starting and leaving in minutes counted
+           from 1970"""
+        with self.lock:
+            self.counts.append((startMinutes, startCounts, leaveMinutes, leaveCounts))
+            self.isCompact = False
+
+    def addRollups(self, rows):
+        """Adds (day, starts, leaves) rows of packMinuteCounts(), left
+           packed until needed"""
+        with self.lock:
+            self.rollups += rows
+            self.isCompact = False
+
+    def addVisits(self, starts, leaves):
+        """Adds numpy datetime64 arrays of visits"""
+        (startMinutes, leaveMinutes) = visitMinutes(starts, leaves)
+        ones = np.ones(len(startMinutes), dtype=np.int64)
+        self.addCounts(startMinutes, ones, leaveMinutes, ones)
+
+    def compact(self):
+        """Merges everything added into one count for each minute with any,
+           which the first histogram does if not done, and returns them"""
+        with self.lock:
+            if self.isCompact and self.counts:
+                return self.counts[0]
+            counts = list(self.counts)
+            for (day, starts, leaves) in self.rollups:
+                firstMinute = (datetime.date.fromisoformat(day) -
+                               datetime.date(1970, 1, 1)).days * MINUTES_PER_DAY
+                (startOffsets, startCounts) = unpackMinuteCounts(starts)
+                (leaveOffsets, leaveCounts) = unpackMinuteCounts(leaves)
+                counts.append((firstMinute + startOffsets, startCounts,
+                               firstMinute + leaveOffsets, leaveCounts))
+            # all together, so it takes one pass however many days or
+            # batches of visits there are
+            if counts:
+                columns = [np.concatenate(column) for column in zip(*counts)]
+            else:
+                columns = [np.zeros(0, dtype=np.int64)] * 4
+            (startMinutes, startCounts, leaveMinutes, leaveCounts) = columns
+            # visits are read by when they started, so only leaves can be
+            # out of range, after the end
+            leaveMinutes = np.minimum(leaveMinutes, self.firstMinute + self.numMinutes - 1)
+            self.counts = [countsByMinute(startMinutes, startCounts) +
+                           countsByMinute(leaveMinutes, leaveCounts)]
+            self.rollups = []
+            self.isCompact = True
+            return self.counts[0]
+
+    def totals(self):
+        """Running totals of the visits started and left by the end of each
+           minute, and of the visitor minutes before each one"""
+        (startMinutes, startCounts, leaveMinutes, leaveCounts) = self.compact()
+        started = np.bincount(startMinutes - self.firstMinute, weights=startCounts,
+                              minlength=self.numMinutes)
+        left = np.bincount(leaveMinutes - self.firstMinute, weights=leaveCounts,
+                           minlength=self.numMinutes)
+        started = np.cumsum(started).astype(np.int32)
+        left = np.cumsum(left).astype(np.int32)
+        # in the building during a minute: started by its end less left before it
+        occupancy = started - np.concatenate(([0], left[:-1]))
+        visitorMinutes = np.concatenate(([0], np.cumsum(occupancy, dtype=np.int64)))
+        return (started, left, visitorMinutes)
+
+    def approximateSize(self):
+        """Roughly the bytes the counts take up"""
+        with self.lock:
+            return sum(column.nbytes for counts in self.counts for column in counts) + \
+                sum(len(starts) + len(leaves) for (_, starts, leaves) in self.rollups)
+
+    def mostAtOnce(self):
+        """The most visitors in the building in any one minute"""
+        (_, _, visitorMinutes) = self.totals()
+        return int(np.diff(visitorMinutes).max())
+
+    def histogram(self, minutes=60, firstHour=8, lastHour=22):
+        """OccupancyAt for each bucket of minutes from firstHour until
+           lastHour each day, with the visitors in the building at any time
+           during it and the average number in it"""
+        (started, left, visitorMinutes) = self.totals()
+        dayStarts = np.arange(0, self.numMinutes, MINUTES_PER_DAY)
+        bucketStarts = np.arange(firstHour * 60, lastHour * 60, minutes)
+        begins = (dayStarts[:, None] + bucketStarts[None, :]).ravel()
+        # the last bucket stops at lastHour if minutes doesn't fit evenly
+        ends = np.minimum(begins + minutes,
+                          np.repeat(dayStarts + lastHour * 60, len(bucketStarts))) - 1
+        leftBefore = np.where(begins > 0, left[np.maximum(begins - 1, 0)], 0)
+        visitors = started[ends] - leftBefore
+        average = (visitorMinutes[ends + 1] - visitorMinutes[begins]) / \
+            (ends - begins + 1)
+        beginDay = datetime.datetime.combine(self.beginDate, datetime.time())
+        return [OccupancyAt(beginDay + datetime.timedelta(minutes=begin), count, mean)
+                for (begin, count, mean) in zip(begins.tolist(), visitors.tolist(),
+                                                average.tolist())]
 
 
 class Statistics(object):
-    def __init__(self, dbConnection, beginDate, endDate):
+    def __init__(self, dbConnection, beginDate, endDate, rollups=None):
         self.beginDate = beginDate.date()
         self.endDate = endDate.date()
         self.visitors = {}
         self.buildingUsage = BuildingUsage()
+        self.minuteOccupancy = MinuteOccupancy(self.beginDate, self.endDate)
 
-        for row in dbConnection.execute(
-                '''SELECT start, leave, displayName, visits.barcode
-   FROM visits
-   INNER JOIN members ON members.barcode = visits.barcode
-   WHERE (start BETWEEN ? AND ?)
-   UNION
-   SELECT start, leave, displayName, visits.barcode
-   FROM visits
-   INNER JOIN guests ON guests.guest_id = visits.barcode
-   WHERE (start BETWEEN ? AND ?)''', (beginDate, endDate, beginDate, endDate)):
-            try:
-                self.visitors[row[3]].addVisit(row[0], row[1])
-            except KeyError:
-                self.visitors[row[3]] = Person(row[2], row[0], row[1])
-            self.buildingUsage.addVisit(row[0], row[1])
-        self.totalHours = 0.0
+        periods = [(beginDate, endDate)]
+        if rollups:
+            (rolledThrough, periods) = rollups.splitRange(dbConnection,
+                                                          beginDate, endDate)
+            if rolledThrough:
+                self.addRollups(rollups.read(dbConnection, self.beginDate,
+                                             rolledThrough))
 
-        for _, person in self.visitors.items():
-            self.totalHours += person.hours
+        (inPeriods, params) = periodsClause(periods)
+        rows = dbConnection.execute(knownVisits(inPeriods), params * 2).fetchall()
+        if rows:
+            self.addVisits(*zip(*rows))
 
         self.uniqueVisitors = len(self.visitors)
+        hours = np.array([person.hours for person in self.visitors.values()])
+        self.totalHours = sum(hours.tolist(), 0.0)
         if self.uniqueVisitors == 0:
             self.avgTime = 0
             self.medianTime = 0
@@ -111,15 +383,79 @@ class Statistics(object):
             self.sortedList = sorted(
                 list(self.visitors.values()), key=lambda x: x.hours, reverse=True)
 
-            half = len(self.sortedList) // 2
-            if len(self.sortedList) % 2:
-                self.medianTime = self.sortedList[half].hours
+            half = self.uniqueVisitors // 2
+            if self.uniqueVisitors % 2:
+                self.medianTime = float(np.partition(hours, half)[half])
             else:
-                self.medianTime = (
-                    self.sortedList[half - 1].hours + self.sortedList[half].hours) / 2.0
+                middle = np.partition(hours, [half - 1, half])
+                self.medianTime = float(middle[half - 1] + middle[half]) / 2.0
+
+    def addRollups(self, rolledUp):
+        for (day, barcode, seconds, displayName) in rolledUp.visitors:
+            if barcode not in self.visitors:
+                self.visitors[barcode] = Person(displayName)
+            hours = seconds / (60.0 * 60.0)
+            self.visitors[barcode].hours += hours
+            self.visitors[barcode].date[datetime.date.fromisoformat(day)] += hours
+        self.buildingUsage.addHourlyCounts(rolledUp.hours)
+        self.minuteOccupancy.addRollups(rolledUp.minutes)
+
+    def addVisits(self, starts, leaves, names, barcodes):
+        """Fills in visitors and buildingUsage from columns of visits"""
+        starts = np.array(starts, dtype='datetime64[us]')
+        leaves = np.array(leaves, dtype='datetime64[us]')
+        self.buildingUsage.addVisits(starts, leaves)
+        self.minuteOccupancy.addVisits(starts, leaves)
+
+        # number the visitors in the order they first show up
+        (uniqueBarcodes, firstRow, visitor) = np.unique(
+            np.array(barcodes, dtype=object), return_index=True,
+            return_inverse=True)
+        order = np.argsort(firstRow)
+        number = np.empty_like(order)
+        number[order] = np.arange(len(order))
+        visitor = number[visitor.ravel()]
+
+        hours = visitSeconds(starts, leaves) / (60.0 * 60.0)
+        personHours = np.bincount(visitor, weights=hours,
+                                  minlength=len(order))
+        people = []
+        for (num, row) in enumerate(firstRow[order].tolist()):
+            if barcodes[row] not in self.visitors:
+                self.visitors[barcodes[row]] = Person(names[row])
+            person = self.visitors[barcodes[row]]
+            person.hours += float(personHours[num])
+            people.append(person)
+
+        days = starts.astype('datetime64[D]').astype(np.int64)
+        firstDay = days.min()
+        numDays = days.max() - firstDay + 1
+        (personDays, personDay) = np.unique(
+            visitor * numDays + (days - firstDay), return_inverse=True)
+        dayHours = np.bincount(personDay.ravel(), weights=hours)
+        for (personDay, dayHour) in zip(personDays.tolist(), dayHours.tolist()):
+            day = np.datetime64(int(firstDay + personDay % numDays), 'D').item()
+            people[personDay // numDays].date[day] += dayHour
+
+    def build(self):
+        """Finishes what is otherwise left until first used, after which
+           nothing changes so it can be shared between threads.  Only the
+           minute counts are compacted, getOccupancy() works out the rest."""
+        self.buildingUsage.build()
+        self.minuteOccupancy.compact()
+        for person in self.visitors.values():
+            # a defaultdict would add any day looked up
+            person.date = dict(person.date)
+
+    def approximateSize(self):
+        """Roughly the bytes this takes up, for StatsCache"""
+        return self.buildingUsage.approximateSize() + \
+            self.minuteOccupancy.approximateSize() + \
+            sum(person.approximateSize() for person in self.visitors.values()) + \
+            sys.getsizeof(self.visitors) + sys.getsizeof(self.sortedList)
 
     def getBuildingUsage(self):
-        dataPoints = []
+        periods = []
         for day in daterange(self.beginDate, self.endDate + datetime.timedelta(days=1)):
             beginTimePeriod = datetime.datetime.combine(
                 day, datetime.datetime.min.time())
@@ -129,33 +465,20 @@ class Statistics(object):
                     hour=startHour, minute=0, second=0, microsecond=0)
                 endTimePeriod = beginTimePeriod + \
                     datetime.timedelta(seconds=60*60)
-                dataPoints.append(VisitorsAtTime(
-                    beginTimePeriod, self.buildingUsage.inRange(beginTimePeriod, endTimePeriod)))
-        return dataPoints
+                periods.append((beginTimePeriod, endTimePeriod))
+        counts = self.buildingUsage.numVisitorsDuring(periods)
+        return [VisitorsAtTime(start, count)
+                for ((start, _), count) in zip(periods, counts)]
+
+    def getOccupancy(self, minutes=60, firstHour=8, lastHour=22):
+        """The building usage in buckets of minutes between the hours given,
+           to the minute rather than the hour"""
+        return self.minuteOccupancy.histogram(minutes, firstHour, lastHour)
 
     def getBuildingUsageGraph(self):
-        dates = []
-        values = []
-        fig = plt.figure()
-        for point in self.getBuildingUsage():
-            dates.append(matplotlib.dates.date2num(point.startTime))
-            values.append(point.numVisitors)
-
-        fig, ax = plt.subplots()
-        plt.plot_date(x=dates, y=values, fmt="r-")
-        title_text = "Building usage\n" + \
-            self.beginDate.strftime("%b %e, %G")
-        if self.beginDate != self.endDate:
-            title_text += " - " + self.endDate.strftime("%b %e, %G")
-
-        plt.title(title_text, fontsize=14)
-        plt.ylabel("Number of visitors")
-        plt.grid(True)
-        ax.xaxis.set_tick_params(rotation=30, labelsize=5)
-        figData = BytesIO()
-        fig.set_size_inches(8, 6)
-        fig.savefig(figData, format='png', dpi=100)
-        return figData.getvalue()
+        from graphRenderer import draw
+        return draw('buildingUsageGraph', self.getBuildingUsage(),
+                    self.beginDate, self.endDate)
 
 
 class Reports(object):
@@ -165,15 +488,23 @@ class Reports(object):
     def whoIsHere(self, dbConnection):
         keyholders = self.engine.accounts.getKeyholderBarcodes(dbConnection)
         listPresent = []
-        for row in dbConnection.execute('''SELECT displayName, start, visits.barcode
-           FROM visits
-           INNER JOIN members ON members.barcode = visits.barcode
-           WHERE visits.status=='In'
+        if self.engine.occupancy.enabled:
+            for occupant in self.engine.occupancy.getOccupants():
+                displayName = occupant.displayName
+                if(occupant.barcode in keyholders):
+                    displayName = displayName + "(Keyholder)"
+                listPresent.append(
+                    PersonInBuilding(displayName=displayName,
+                                     barcode=occupant.barcode, start=occupant.start))
+            return listPresent
+        for row in dbConnection.execute('''SELECT displayName, start, presence.barcode
+           FROM presence
+           INNER JOIN members ON members.barcode = presence.barcode
            UNION
-           SELECT displayName, start, visits.barcode
-           FROM visits
-           INNER JOIN guests ON guests.guest_id = visits.barcode
-           WHERE visits.status=='In' ORDER BY displayName'''):
+           SELECT displayName, start, presence.barcode
+           FROM presence
+           INNER JOIN guests ON guests.guest_id = presence.barcode
+           ORDER BY displayName'''):
             displayName = row[0]
             if(row[2] in keyholders):
                 displayName = displayName + "(Keyholder)"
@@ -195,16 +526,24 @@ class Reports(object):
 
     def guestsInBuilding(self, dbConnection):
         listPresent = []
+        if self.engine.occupancy.enabled:
+            for occupant in self.engine.occupancy.getOccupants():
+                if occupant.isGuest:
+                    listPresent.append(
+                        Guest(occupant.barcode, occupant.displayName))
+            return listPresent
         for row in dbConnection.execute('''SELECT displayName, start, guests.guest_id
-           FROM visits
-           INNER JOIN guests ON guests.guest_id = visits.barcode
-           WHERE visits.status=='In' ORDER BY displayName'''):
+           FROM presence
+           INNER JOIN guests ON guests.guest_id = presence.barcode
+           ORDER BY displayName'''):
             listPresent.append(Guest(row[2], row[0]))
         return listPresent
 
     def numberPresent(self, dbConnection):
+        if self.engine.occupancy.enabled:
+            return self.engine.occupancy.count()
         (numPeople, ) = dbConnection.execute(
-            "SELECT count(*) FROM visits WHERE status == 'In'").fetchone()
+            "SELECT count(*) FROM presence").fetchone()
         return numPeople
 
     def transactions(self, dbConnection, startDate, endDate):
@@ -232,6 +571,69 @@ class Reports(object):
 
         return sorted(listTransactions, key=lambda x: x[1], reverse=True)
 
+    def stationUpdate(self, dbConnection, changes):
+        """What the kiosks need to show changes without reloading: the new
+           transactions oldest first, the counts, keyholder and stewards"""
+        if any(change.description == RELOAD for change in changes):
+            return {'reload': True}
+        barcodes = list({change.barcode for change in changes if change.barcode})
+        names = dict(dbConnection.execute(
+            f'''SELECT barcode, displayName FROM members
+                WHERE barcode IN ({','.join('?' * len(barcodes))})
+                UNION
+                SELECT guest_id, displayName FROM guests
+                WHERE guest_id IN ({','.join('?' * len(barcodes))})''',
+            tuple(barcodes) * 2).fetchall()) if barcodes else {}
+        keyholders = self.engine.accounts.getKeyholderBarcodes(dbConnection)
+        transactions = []
+        for change in changes:
+            if change.barcode not in names:
+                continue
+            displayName = names[change.barcode]
+            if change.barcode in keyholders:
+                displayName = displayName + "(Keyholder)"
+            trans = Transaction(displayName, change.time, change.description)
+            transactions.append({'time': trans.time.strftime("%I:%M %p"),
+                                 'name': trans.name,
+                                 'description': trans.description,
+                                 'key': trans.key})
+        (_, keyholder_name) = self.engine.accounts.getActiveKeyholder(dbConnection)
+        return {'transactions': transactions,
+                'numberPresent': self.numberPresent(dbConnection),
+                'uniqueVisitorsToday': self.uniqueVisitorsToday(dbConnection),
+                'keyholder': keyholder_name,
+                'stewards': [name for (name, _) in self.engine.accounts.getPresentWithRole(
+                    dbConnection, Role.SHOP_STEWARD)]}
+
+    def iterVisits(self, dbConnection, startDate, endDate):
+        """Yields (start, leave, name, status, barcode) for the visits in
+           the range oldest first, reading them as they are needed"""
+        cursor = dbConnection.execute(
+            '''SELECT start, leave, coalesce(members.displayName, guests.displayName),
+                      visits.status, visits.barcode
+               FROM visits
+               LEFT JOIN members ON members.barcode = visits.barcode
+               LEFT JOIN guests ON guests.guest_id = visits.barcode
+               WHERE (start BETWEEN ? AND ?)
+                 AND (members.barcode IS NOT NULL OR guests.guest_id IS NOT NULL)
+               ORDER BY start''', (startDate, endDate))
+        try:
+            yield from cursor
+        finally:
+            cursor.close()
+
+    def iterTransactions(self, dbConnection, startDate, endDate):
+        """Yields the same Transactions as transactions() but a visit at a
+           time, in the order the visits started"""
+        keyholders = self.engine.accounts.getKeyholderBarcodes(dbConnection)
+        for (start, leave, displayName, status, barcode) in self.iterVisits(
+                dbConnection, startDate, endDate):
+            if barcode in keyholders:
+                displayName = displayName + "(Keyholder)"
+            yield Transaction(displayName, start, 'In')
+            if status != 'In':
+                yield Transaction(displayName, leave, status)
+
     def transactionsToday(self, dbConnection):
         now = datetime.datetime.now()
         startDate = now.replace(hour=0, minute=0, second=0, microsecond=0)
@@ -252,15 +654,93 @@ class Reports(object):
                               second=59, microsecond=999999)
         return self.uniqueVisitors(dbConnection, startDate, endDate)
 
-    def getStats(self, dbConnection, beginDateStr, endDateStr):
+    def getDateRange(self, beginDateStr, endDateStr):
         startDate = datetime.datetime(int(beginDateStr[0:4]),
                                       int(beginDateStr[5:7]), int(beginDateStr[8:10])).replace(
             hour=0, minute=0, second=0, microsecond=0)
         endDate = datetime.datetime(int(endDateStr[0:4]),
                                     int(endDateStr[5:7]), int(endDateStr[8:10])).replace(
             hour=23, minute=59, second=59, microsecond=999999)
+        return (startDate, endDate)
 
-        return Statistics(dbConnection, startDate, endDate)
+    def getStats(self, dbConnection, beginDateStr, endDateStr):
+        """Statistics for the range, shared through the stats cache with
+           anything else that asked for the same data lately"""
+        return self.getStatsFor(dbConnection, self.getDataVersion(
+            dbConnection, beginDateStr, endDateStr))
+
+    def getStatsFor(self, dbConnection, key):
+        """getStats() given getDataVersion() for the range"""
+        (beginDate, endDate, version) = key
+        stats = self.engine.statsCache.get((beginDate, endDate), version)
+        if stats is None:
+            stats = Statistics(dbConnection,
+                               datetime.datetime.combine(beginDate, datetime.time()),
+                               datetime.datetime.combine(endDate, datetime.time.max),
+                               self.engine.rollups)
+            stats.build()
+            self.engine.statsCache.put((beginDate, endDate), version, stats,
+                                       stats.approximateSize())
+        return stats
+
+    def getDataVersion(self, dbConnection, beginDateStr, endDateStr):
+        """A key for the range that changes whenever its Statistics would"""
+        (startDate, endDate) = self.getDateRange(beginDateStr, endDateStr)
+        return (startDate.date(), endDate.date(),
+                self.engine.rollups.dataVersion(dbConnection, startDate, endDate))
+
+    def getBuildingUsageGraph(self, dbConnection, beginDateStr, endDateStr):
+        """PNG of the building usage, from the graph cache when the visits
+           in the range haven't changed since it was drawn"""
+        key = self.getDataVersion(dbConnection, beginDateStr, endDateStr)
+        graph = self.engine.graphCache.get(key)
+        if graph is None:
+            stats = self.getStatsFor(dbConnection, key)
+            graph = self.engine.graphRenderer.render(
+                'buildingUsageGraph', stats.getBuildingUsage(),
+                stats.beginDate, stats.endDate)
+            self.engine.graphCache.put(key, graph)
+        return graph
+
+    def getUsageData(self, dbConnection, beginDateStr, endDateStr, bucket='hour'):
+        """The building usage, by hour or each day's busiest hour, and the
+           visitors and hours each day, as columns for drawing charts"""
+        if bucket not in USAGE_BUCKETS:
+            raise ValueError(f'Unknown bucket: {bucket}')
+        stats = self.getStats(dbConnection, beginDateStr, endDateStr)
+        times = []
+        visitors = []
+        for point in stats.getBuildingUsage():
+            if bucket == 'hour':
+                times.append(point.startTime.isoformat(timespec='minutes'))
+                visitors.append(point.numVisitors)
+            elif times and times[-1] == point.startTime.date().isoformat():
+                visitors[-1] = max(visitors[-1], point.numVisitors)
+            else:
+                times.append(point.startTime.date().isoformat())
+                visitors.append(point.numVisitors)
+
+        dailyVisitors = defaultdict(int)
+        dailyHours = defaultdict(float)
+        for person in stats.visitors.values():
+            for (day, hours) in person.date.items():
+                dailyVisitors[day] += 1
+                dailyHours[day] += hours
+        days = sorted(dailyVisitors)
+        return {'startDate': stats.beginDate.isoformat(),
+                'endDate': stats.endDate.isoformat(),
+                'bucket': bucket,
+                'usage': {'time': times, 'visitors': visitors},
+                'daily': {'date': [day.isoformat() for day in days],
+                          'visitors': [dailyVisitors[day] for day in days],
+                          'hours': [round(dailyHours[day], 2) for day in days]}}
+
+    def getTrends(self, dbConnection, firstMonthStr, lastMonthStr):
+        """MonthTotals from the month of firstMonthStr through lastMonthStr,
+           either as YYYY-MM or a date"""
+        firstMonth = datetime.date(int(firstMonthStr[0:4]), int(firstMonthStr[5:7]), 1)
+        lastMonth = datetime.date(int(lastMonthStr[0:4]), int(lastMonthStr[5:7]), 1)
+        return self.engine.rollups.trends(dbConnection, firstMonth, lastMonth)
 
     def getEarliestDate(self, dbConnection):
         data = dbConnection.execute(
@@ -268,12 +748,13 @@ class Reports(object):
         return data[0]
 
     def getForgottenDates(self, dbConnection):
-        dates = []
-        for row in dbConnection.execute("SELECT start FROM visits WHERE status=='Forgot'"):
-            day = row[0].date()
-            if day not in dates:
-                dates.append(day)
-        return dates
+        """ForgottenDay for each day with visits still marked Forgot, oldest
+           first"""
+        return [ForgottenDay(datetime.date.fromisoformat(day), count)
+                for (day, count) in dbConnection.execute(
+                    '''SELECT date(start), count(*) FROM visits
+                       WHERE status = 'Forgot'
+                       GROUP BY date(start) ORDER BY date(start)''')]
 
     def getData(self, dbConnection, dateStr):
         data = []
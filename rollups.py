@@ -0,0 +1,449 @@
+import datetime
+from collections import namedtuple
+
+import numpy as np
+
+from reports import (MINUTES_PER_DAY, MinuteOccupancy, knownVisits,
+                     packMinuteCounts, periodsClause, visitMinutes, visitSeconds)
+
+HOUR = 60 * 60 * 1000000  # in microseconds, like the datetime64[us] arrays
+# The hours getBuildingUsage cares about, 8am-10pm
+FIRST_HOUR = 8
+LAST_HOUR = 21
+
+RolledUp = namedtuple('RolledUp', ['visitors', 'hours', 'minutes'])
+MonthTotals = namedtuple('MonthTotals', ['month', 'visits', 'visitors', 'members', 'guests',
+                                         'memberHours', 'guestHours', 'peak'])
+
+
+def asDay(value):
+    return datetime.date.fromisoformat(value) if isinstance(value, str) else value
+
+
+def firstOfMonth(day):
+    return day.replace(day=1)
+
+
+def nextMonth(month):
+    return (month + datetime.timedelta(days=32)).replace(day=1)
+
+
+def minuteCountsByDay(dayNums, offsets):
+    """{day number: packMinuteCounts()} of the offsets on each day"""
+    order = np.lexsort((offsets, dayNums))
+    dayNums = dayNums[order]
+    offsets = offsets[order]
+    new = np.ones(len(order), dtype=bool)
+    new[1:] = (dayNums[1:] != dayNums[:-1]) | (offsets[1:] != offsets[:-1])
+    firsts = np.flatnonzero(new)
+    counts = np.diff(np.append(firsts, len(order)))
+    (dayNums, offsets) = (dayNums[firsts], offsets[firsts])
+    dayFirsts = np.flatnonzero(np.append(True, dayNums[1:] != dayNums[:-1]))
+    return {int(dayNums[first]): packMinuteCounts(offsets[first:last], counts[first:last])
+            for (first, last) in zip(dayFirsts.tolist(),
+                                     np.append(dayFirsts[1:], len(dayNums)).tolist())}
+
+
+class Rollups(object):
+    """
+    Totals of the visits that started on each day before today, so reports
+    don't re-read every visit in a range.
+
+    For each day there are the seconds each visitor spent (added up the same
+    way Statistics does), how many of the day's visits overlap each hour of
+    getBuildingUsage, the minutes they started and left in for
+    MinuteOccupancy and a version that goes up whenever the day is redone.
+    The config value rollup_through is the last day rolled up.  Triggers on
+    visits note days up to there that change and update() redoes them, as
+    well as rolling up any days that have finished since.
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+
+    def migrate(self, dbConnection, db_schema_version):
+        if db_schema_version < 19:
+            dbConnection.execute('''CREATE TABLE rollup_days
+                                 (day TEXT PRIMARY KEY,
+                                  visits INTEGER,
+                                  visitors INTEGER,
+                                  version INTEGER DEFAULT 1)''')
+            dbConnection.execute('''CREATE TABLE rollup_visitors
+                                 (day TEXT,
+                                  barcode TEXT,
+                                  seconds INTEGER,
+                                  visits INTEGER,
+                                  PRIMARY KEY (day, barcode))''')
+            # visits are counted on the day they started, even when the
+            # hour is on a later day
+            dbConnection.execute('''CREATE TABLE rollup_hours
+                                 (day TEXT,
+                                  hour TIMESTAMP,
+                                  visitors INTEGER,
+                                  PRIMARY KEY (day, hour))''')
+            dbConnection.execute(
+                'CREATE TABLE rollup_dirty (day TEXT PRIMARY KEY)')
+            self.createVisitsTriggers(dbConnection)
+        if db_schema_version < 20:
+            # the visits starting and leaving each minute, for MinuteOccupancy
+            dbConnection.execute('''CREATE TABLE rollup_minutes
+                                 (day TEXT PRIMARY KEY,
+                                  starts BLOB,
+                                  leaves BLOB)''')
+        if db_schema_version < 22:
+            # totals for each month that has finished, for trends()
+            dbConnection.execute('''CREATE TABLE rollup_months
+                                 (month TEXT PRIMARY KEY,
+                                  visits INTEGER,
+                                  visitors INTEGER,
+                                  members INTEGER,
+                                  guests INTEGER,
+                                  member_seconds INTEGER,
+                                  guest_seconds INTEGER,
+                                  peak INTEGER)''')
+        if 19 <= db_schema_version < 23:
+            # rebuilding visits for schema 23 dropped its triggers
+            self.createVisitsTriggers(dbConnection)
+        if db_schema_version < 24:
+            # only the visits of members and guests are rolled up, so days
+            # with visits by a barcode that becomes or stops being one of
+            # them have to be redone
+            for (table, column) in (('members', 'barcode'), ('guests', 'guest_id')):
+                for (event, row) in (('INSERT', 'NEW'), ('DELETE', 'OLD'),
+                                     ('UPDATE', 'OLD'), ('UPDATE', 'NEW')):
+                    when = f'UPDATE OF {column}' if event == 'UPDATE' else event
+                    dbConnection.execute(f'''CREATE TRIGGER
+                        {table}_rollup_{event.lower()}_{row.lower()}
+                        AFTER {when} ON {table}
+                        BEGIN
+                            INSERT OR IGNORE INTO rollup_dirty(day)
+                            SELECT DISTINCT date(start) FROM visits
+                            WHERE barcode = {row}.{column} AND date(start) <=
+                                (SELECT value FROM config WHERE key = 'rollup_through');
+                        END''')
+            self.backfill(dbConnection)
+
+    def createVisitsTriggers(self, dbConnection):
+        # days already rolled up that change are redone by update()
+        dbConnection.execute('''CREATE TRIGGER visits_rollup_insert
+            AFTER INSERT ON visits
+            BEGIN
+                INSERT OR IGNORE INTO rollup_dirty(day)
+                SELECT date(NEW.start) WHERE date(NEW.start) <=
+                    (SELECT value FROM config WHERE key = 'rollup_through');
+            END''')
+        dbConnection.execute('''CREATE TRIGGER visits_rollup_update
+            AFTER UPDATE OF start, leave, barcode ON visits
+            BEGIN
+                INSERT OR IGNORE INTO rollup_dirty(day)
+                SELECT date(OLD.start) WHERE date(OLD.start) <=
+                    (SELECT value FROM config WHERE key = 'rollup_through');
+                INSERT OR IGNORE INTO rollup_dirty(day)
+                SELECT date(NEW.start) WHERE date(NEW.start) <=
+                    (SELECT value FROM config WHERE key = 'rollup_through');
+            END''')
+        dbConnection.execute('''CREATE TRIGGER visits_rollup_delete
+            AFTER DELETE ON visits
+            BEGIN
+                INSERT OR IGNORE INTO rollup_dirty(day)
+                SELECT date(OLD.start) WHERE date(OLD.start) <=
+                    (SELECT value FROM config WHERE key = 'rollup_through');
+            END''')
+
+    def rolledThrough(self, dbConnection):
+        """The last day in the rollups, None if there are none yet"""
+        through = self.engine.config.get(dbConnection, 'rollup_through')
+        return through and datetime.date.fromisoformat(through)
+
+    def backfill(self, dbConnection):
+        """Redoes the rollups for every day before today"""
+        dbConnection.execute('DELETE FROM rollup_visitors')
+        dbConnection.execute('DELETE FROM rollup_hours')
+        dbConnection.execute('DELETE FROM rollup_minutes')
+        dbConnection.execute('DELETE FROM rollup_months')
+        dbConnection.execute('DELETE FROM rollup_dirty')
+        (first, ) = dbConnection.execute(
+            'SELECT date(min(start)) FROM visits').fetchone()
+        yesterday = datetime.date.today() - datetime.timedelta(days=1)
+        self.engine.config.update(dbConnection, 'rollup_through',
+                                  yesterday.isoformat())
+        if first is not None and asDay(first) <= yesterday:
+            self.rollUp(dbConnection, asDay(first), yesterday)
+            self.rollUpMonths(dbConnection, asDay(first), yesterday)
+
+    def update(self, dbConnection):
+        """Redoes the days that changed and adds any that have finished"""
+        through = self.rolledThrough(dbConnection)
+        if through is None:
+            return
+        days = sorted(asDay(row[0]) for row in dbConnection.execute(
+            'SELECT day FROM rollup_dirty'))
+        if days:
+            dbConnection.execute('DELETE FROM rollup_dirty')
+        # redo each run of consecutive days together
+        runStart = None
+        for (num, day) in enumerate(days):
+            if runStart is None:
+                runStart = day
+            if num + 1 == len(days) or days[num + 1] != day + datetime.timedelta(days=1):
+                self.rollUp(dbConnection, runStart, day)
+                runStart = None
+        months = {firstOfMonth(day) for day in days}
+        yesterday = datetime.date.today() - datetime.timedelta(days=1)
+        if through < yesterday:
+            self.engine.config.update(dbConnection, 'rollup_through',
+                                      yesterday.isoformat())
+            self.rollUp(dbConnection,
+                        through + datetime.timedelta(days=1), yesterday)
+            month = firstOfMonth(through + datetime.timedelta(days=1))
+            while month <= yesterday:
+                months.add(month)
+                month = nextMonth(month)
+        for month in sorted(months):
+            self.rollUpMonths(dbConnection, month, month)
+
+    def rollUp(self, dbConnection, firstDay, lastDay):
+        """Replaces the rollups for firstDay through lastDay"""
+        dayParams = (firstDay.isoformat(), lastDay.isoformat())
+        dbConnection.execute(
+            'DELETE FROM rollup_visitors WHERE day BETWEEN ? AND ?', dayParams)
+        dbConnection.execute(
+            'DELETE FROM rollup_hours WHERE day BETWEEN ? AND ?', dayParams)
+        dbConnection.execute(
+            'DELETE FROM rollup_minutes WHERE day BETWEEN ? AND ?', dayParams)
+        # the same visits Statistics reads, so the totals match
+        (inPeriods, params) = periodsClause(
+            [(datetime.datetime.combine(firstDay, datetime.time()),
+              datetime.datetime.combine(lastDay, datetime.time.max))])
+        rows = dbConnection.execute(knownVisits(inPeriods), params * 2).fetchall()
+
+        dayTotals = {}
+        if rows:
+            (starts, leaves, _, barcodes) = zip(*rows)
+            starts = np.array(starts, dtype='datetime64[us]')
+            leaves = np.array(leaves, dtype='datetime64[us]')
+            days = starts.astype('datetime64[D]')
+            self.rollUpVisitors(dbConnection, days, starts, leaves, barcodes,
+                                dayTotals)
+            self.rollUpHours(dbConnection, days, starts, leaves)
+            self.rollUpMinutes(dbConnection, days, starts, leaves)
+
+        dbConnection.executemany(
+            '''INSERT INTO rollup_days(day, visits, visitors) VALUES (?, ?, ?)
+               ON CONFLICT(day) DO UPDATE SET visits = excluded.visits,
+                    visitors = excluded.visitors, version = version + 1''',
+            [(day.isoformat(), *dayTotals.get(day.isoformat(), (0, 0)))
+             for day in (firstDay + datetime.timedelta(days=num)
+                         for num in range((lastDay - firstDay).days + 1))])
+
+    def rollUpVisitors(self, dbConnection, days, starts, leaves, barcodes,
+                       dayTotals):
+        (uniqueBarcodes, visitor) = np.unique(
+            np.array(barcodes, dtype=object), return_inverse=True)
+        visitor = visitor.ravel()
+        dayNums = days.astype(np.int64)
+        firstDay = dayNums.min()
+        (keys, key) = np.unique((dayNums - firstDay) * len(uniqueBarcodes) + visitor,
+                                return_inverse=True)
+        key = key.ravel()
+        seconds = np.bincount(key, weights=visitSeconds(starts, leaves))
+        visits = np.bincount(key)
+        rows = []
+        for (num, dayVisitor) in enumerate(keys.tolist()):
+            day = str(np.datetime64(int(firstDay + dayVisitor // len(uniqueBarcodes)), 'D'))
+            rows.append((day, uniqueBarcodes[dayVisitor % len(uniqueBarcodes)],
+                         int(seconds[num]), int(visits[num])))
+            (numVisits, numVisitors) = dayTotals.get(day, (0, 0))
+            dayTotals[day] = (numVisits + int(visits[num]), numVisitors + 1)
+        dbConnection.executemany(
+            'INSERT INTO rollup_visitors VALUES (?, ?, ?, ?)', rows)
+
+    def rollUpHours(self, dbConnection, days, starts, leaves):
+        """Counts the visits overlapping each hour, ends included, the same
+           as BuildingUsage"""
+        starts = starts.astype(np.int64)
+        leaves = leaves.astype(np.int64)
+        dayNums = days.astype(np.int64)
+        normal = leaves >= starts
+        # the hours from the one ending at the start to the one starting at
+        # the leave, numbered from 1970
+        first = -((HOUR - starts[normal]) // HOUR)
+        last = leaves[normal] // HOUR
+        lengths = last - first + 1
+        ends = np.cumsum(lengths)
+        hours = np.repeat(first, lengths) + \
+            (np.arange(ends[-1] if len(ends) else 0) - np.repeat(ends - lengths, lengths))
+        hourDays = np.repeat(dayNums[normal], lengths)
+
+        # a visit leaving before it starts is only in the hours around each end
+        oddDays = []
+        oddHours = []
+        for (num, start, leave) in zip(np.flatnonzero(~normal).tolist(),
+                                       starts[~normal].tolist(),
+                                       leaves[~normal].tolist()):
+            visitHours = set()
+            for time in (start, leave):
+                visitHours.update(range(-((HOUR - time) // HOUR), time // HOUR + 1))
+            oddHours += visitHours
+            oddDays += [int(dayNums[num])] * len(visitHours)
+        if oddHours:
+            hours = np.concatenate((hours, np.array(oddHours, dtype=np.int64)))
+            hourDays = np.concatenate((hourDays, np.array(oddDays, dtype=np.int64)))
+
+        wanted = (hours % 24 >= FIRST_HOUR) & (hours % 24 <= LAST_HOUR)
+        hours = hours[wanted]
+        hourDays = hourDays[wanted]
+        if not len(hours):
+            return
+        firstHour = hours.min()
+        span = hours.max() - firstHour + 1
+        (keys, counts) = np.unique((hourDays - dayNums.min()) * span + (hours - firstHour),
+                                   return_counts=True)
+        dbConnection.executemany(
+            'INSERT INTO rollup_hours VALUES (?, ?, ?)',
+            [(str(np.datetime64(int(dayNums.min() + key // span), 'D')),
+              np.datetime64(int(firstHour + key % span), 'h').item(), int(count))
+             for (key, count) in zip(keys.tolist(), counts.tolist())])
+
+    def rollUpMinutes(self, dbConnection, days, starts, leaves):
+        """Packs the minutes visits started and left in, counted from the
+           start of the day they started"""
+        (startMinutes, leaveMinutes) = visitMinutes(starts, leaves)
+        dayNums = days.astype(np.int64)
+        dayMinutes = dayNums * MINUTES_PER_DAY
+        packed = [minuteCountsByDay(dayNums, minutes - dayMinutes)
+                  for minutes in (startMinutes, leaveMinutes)]
+        dbConnection.executemany(
+            'INSERT INTO rollup_minutes VALUES (?, ?, ?)',
+            [(str(np.datetime64(day, 'D')), packed[0][day], packed[1][day])
+             for day in packed[0]])
+
+    def rollUpMonths(self, dbConnection, firstDay, lastDay):
+        """Replaces the totals of the months with days from firstDay through
+           lastDay that have finished"""
+        through = self.rolledThrough(dbConnection)
+        month = firstOfMonth(firstDay)
+        while month <= lastDay and nextMonth(month) - datetime.timedelta(days=1) <= through:
+            totals = self.monthTotals(dbConnection, month)
+            dbConnection.execute(
+                'INSERT OR REPLACE INTO rollup_months VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (month.isoformat(), totals.visits, totals.visitors, totals.members,
+                 totals.guests, round(totals.memberHours * 3600),
+                 round(totals.guestHours * 3600), totals.peak))
+            month = nextMonth(month)
+
+    def monthTotals(self, dbConnection, month):
+        """MonthTotals of the visits that started in month, from visits"""
+        end = nextMonth(month)
+        rows = dbConnection.execute(
+            '''SELECT start || '', leave || '', visits.barcode,
+                      members.barcode IS NOT NULL
+               FROM visits
+               LEFT JOIN members ON members.barcode = visits.barcode
+               LEFT JOIN guests ON guests.guest_id = visits.barcode
+               WHERE start >= ? AND start < ?
+                 AND (members.barcode IS NOT NULL OR guests.guest_id IS NOT NULL)''',
+            (month.isoformat(), end.isoformat())).fetchall()
+        if not rows:
+            return MonthTotals(month, 0, 0, 0, 0, 0.0, 0.0, 0)
+        (starts, leaves, barcodes, isMember) = zip(*rows)
+        starts = np.array(starts, dtype='datetime64[us]')
+        leaves = np.array(leaves, dtype='datetime64[us]')
+        isMember = np.array(isMember, dtype=bool)
+        seconds = visitSeconds(starts, leaves)
+        members = {barcode for (barcode, member) in zip(barcodes, isMember) if member}
+        occupancy = MinuteOccupancy(month, end - datetime.timedelta(days=1))
+        occupancy.addVisits(starts, leaves)
+        return MonthTotals(month, visits=len(rows), visitors=len(set(barcodes)),
+                           members=len(members),
+                           guests=len(set(barcodes)) - len(members),
+                           memberHours=int(seconds[isMember].sum()) / 3600.0,
+                           guestHours=int(seconds[~isMember].sum()) / 3600.0,
+                           peak=occupancy.mostAtOnce())
+
+    def trends(self, dbConnection, firstMonth, lastMonth):
+        """MonthTotals for each month from firstMonth through lastMonth,
+           stored ones for months that have finished and the rest from
+           visits"""
+        lastDay = nextMonth(lastMonth) - datetime.timedelta(days=1)
+        changed = {firstOfMonth(day)
+                   for day in self.changedDays(dbConnection, firstMonth, lastDay)}
+        stored = {}
+        for row in dbConnection.execute(
+                'SELECT * FROM rollup_months WHERE month BETWEEN ? AND ?',
+                (firstMonth.isoformat(), lastMonth.isoformat())):
+            month = asDay(row[0])
+            stored[month] = MonthTotals(month, *row[1:5], memberHours=row[5] / 3600.0,
+                                        guestHours=row[6] / 3600.0, peak=row[7])
+        totals = []
+        month = firstMonth
+        while month <= lastMonth:
+            if month in stored and month not in changed:
+                totals.append(stored[month])
+            else:
+                totals.append(self.monthTotals(dbConnection, month))
+            month = nextMonth(month)
+        return totals
+
+    def splitRange(self, dbConnection, beginDate, endDate):
+        """The last day to read from the rollups, None if none, and the
+           (begin, end) periods to read from visits instead: days since
+           then and ones that changed but haven't been redone yet"""
+        rolledThrough = min(self.rolledThrough(dbConnection) or datetime.date.min,
+                            endDate.date())
+        if rolledThrough < beginDate.date():
+            return (None, [(beginDate, endDate)])
+        periods = [(datetime.datetime.combine(day, datetime.time()),
+                    datetime.datetime.combine(day, datetime.time.max))
+                   for day in self.changedDays(dbConnection, beginDate.date(),
+                                               rolledThrough)]
+        periods.append((datetime.datetime.combine(
+            rolledThrough + datetime.timedelta(days=1), datetime.time()), endDate))
+        return (rolledThrough, periods)
+
+    def dataVersion(self, dbConnection, beginDate, endDate):
+        """A value that changes whenever the visits Statistics would read
+           for the range change"""
+        (rolledThrough, periods) = self.splitRange(dbConnection, beginDate, endDate)
+        version = (rolledThrough, )
+        if rolledThrough:
+            version += dbConnection.execute(
+                'SELECT count(*), total(version) FROM rollup_days WHERE day BETWEEN ? AND ?',
+                (beginDate.date().isoformat(), rolledThrough.isoformat())).fetchone()
+        (inPeriods, params) = periodsClause(periods)
+        return version + tuple(periods) + dbConnection.execute(
+            f'''SELECT count(*), total(rowid), total(julianday(start)),
+                      total(julianday(leave))
+               FROM visits WHERE {inPeriods}''', params).fetchone()
+
+    def changedDays(self, dbConnection, firstDay, lastDay):
+        """Days in the range waiting for update() to redo them"""
+        return [asDay(row[0]) for row in dbConnection.execute(
+            'SELECT day FROM rollup_dirty WHERE day BETWEEN ? AND ? ORDER BY day',
+            (firstDay.isoformat(), lastDay.isoformat()))]
+
+    def read(self, dbConnection, firstDay, lastDay):
+        """Visitors as (day, barcode, seconds, displayName) and the visitors
+           in each hour as (hour, number) for the days given, leaving out
+           changedDays()"""
+        dayParams = (firstDay.isoformat(), lastDay.isoformat())
+        visitors = dbConnection.execute(
+            '''SELECT day, rollup_visitors.barcode, seconds,
+                      coalesce(members.displayName, guests.displayName)
+               FROM rollup_visitors
+               LEFT JOIN members ON members.barcode = rollup_visitors.barcode
+               LEFT JOIN guests ON guests.guest_id = rollup_visitors.barcode
+               WHERE (day BETWEEN ? AND ?)
+                 AND day NOT IN (SELECT day FROM rollup_dirty)
+                 AND (members.barcode IS NOT NULL OR guests.guest_id IS NOT NULL)
+               ORDER BY day, rollup_visitors.barcode''', dayParams).fetchall()
+        hours = dbConnection.execute(
+            '''SELECT hour, sum(visitors) FROM rollup_hours
+               WHERE day BETWEEN ? AND ?
+                 AND day NOT IN (SELECT day FROM rollup_dirty)
+               GROUP BY hour''', dayParams).fetchall()
+        minutes = dbConnection.execute(
+            '''SELECT day, starts, leaves FROM rollup_minutes
+               WHERE day BETWEEN ? AND ?
+                 AND day NOT IN (SELECT day FROM rollup_dirty)''', dayParams).fetchall()
+        return RolledUp(visitors=visitors, hours=hours, minutes=minutes)
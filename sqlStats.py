@@ -0,0 +1,194 @@
+import heapq
+import re
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+import cherrypy
+
+from connectionPool import PooledConnection
+
+# How many of the slowest statements are kept per request and per page
+NUM_SLOWEST = 5
+
+Statement = namedtuple('Statement', ['elapsed', 'sql', 'shape'])
+
+local = threading.local()
+
+
+def paramShape(params):
+    """Describes parameters by type so values don't end up in the stats"""
+    if isinstance(params, dict):
+        return '{' + ', '.join(f'{key}: {type(value).__name__}'
+                               for (key, value) in params.items()) + '}'
+    return '(' + ', '.join(type(value).__name__ for value in params) + ')'
+
+
+def cleanSQL(sql):
+    return re.sub(r'\s+', ' ', sql).strip()
+
+
+class RequestStats(object):
+    def __init__(self, numSlowest=NUM_SLOWEST):
+        self.numSlowest = numSlowest
+        self.numQueries = 0
+        self.totalTime = 0.0
+        self.statements = []
+
+    def add(self, statement):
+        self.numQueries += 1
+        self.statements.append(statement)
+
+    def addTime(self, elapsed):
+        self.totalTime += elapsed
+
+    def slowest(self):
+        return heapq.nlargest(self.numSlowest, self.statements)
+
+
+class TimedCursor(sqlite3.Cursor):
+    """Times each statement, including fetching its rows, for the current
+       request's RequestStats"""
+
+    def timed(self, method, sql, params, shape):
+        stats = getattr(local, 'stats', None)
+        if stats is None:
+            return method(sql, params)
+        start = time.perf_counter()
+        try:
+            return method(sql, params)
+        finally:
+            self.statement = [time.perf_counter() - start, sql, shape]
+            stats.add(self.statement)
+            stats.addTime(self.statement[0])
+
+    def execute(self, sql, params=()):
+        return self.timed(super().execute, sql, params, paramShape(params))
+
+    def executemany(self, sql, seq_of_params):
+        seq_of_params = list(seq_of_params)
+        shape = f'[{len(seq_of_params)} x ' + \
+            (paramShape(seq_of_params[0]) if seq_of_params else '()') + ']'
+        return self.timed(super().executemany, sql, seq_of_params, shape)
+
+    def fetching(self, method, *args):
+        stats = getattr(local, 'stats', None)
+        statement = getattr(self, 'statement', None)
+        if stats is None or statement is None:
+            return method(*args)
+        start = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            elapsed = time.perf_counter() - start
+            statement[0] += elapsed
+            stats.addTime(elapsed)
+
+    def fetchone(self):
+        return self.fetching(super().fetchone)
+
+    def fetchmany(self, *args):
+        return self.fetching(super().fetchmany, *args)
+
+    def fetchall(self):
+        return self.fetching(super().fetchall)
+
+    def __next__(self):
+        return self.fetching(super().__next__)
+
+
+class InstrumentedConnection(PooledConnection):
+    """Connection factory that hands out TimedCursors"""
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    # the sqlite3 shortcuts don't go through cursor(), so redo them here
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        return self.cursor().executemany(sql, seq_of_params)
+
+
+class PageStats(object):
+    def __init__(self, path):
+        self.path = path
+        self.numRequests = 0
+        self.numQueries = 0
+        self.maxQueries = 0
+        self.totalTime = 0.0
+        self.slowest = []
+
+    def add(self, stats, numSlowest):
+        self.numRequests += 1
+        self.numQueries += stats.numQueries
+        self.maxQueries = max(self.maxQueries, stats.numQueries)
+        self.totalTime += stats.totalTime
+        self.slowest = heapq.nlargest(
+            numSlowest, self.slowest + [Statement(elapsed, cleanSQL(sql), shape)
+                                        for (elapsed, sql, shape) in stats.slowest()])
+
+    def avgQueries(self):
+        return self.numQueries / self.numRequests
+
+    def avgTime(self):
+        return self.totalTime / self.numRequests
+
+
+class SQLStatsTool(cherrypy.Tool):
+    """
+    Collects the SQL run by each request on instrumented connections.
+
+    tools.sqlstats.on turns it on for a path, tools.sqlstats.headers adds
+    X-SQL-* response headers and tools.sqlstats.slowest is how many
+    statements are kept.  Totals per page are kept for the admin page.
+    """
+
+    def __init__(self):
+        super().__init__('on_start_resource', self.start, priority=10)
+        self.lock = threading.Lock()
+        self.pages = {}
+
+    def _setup(self):
+        super()._setup()
+        conf = self._merged_args()
+        cherrypy.serving.request.hooks.attach(
+            'before_finalize', self.finish, priority=90, **conf)
+        cherrypy.serving.request.hooks.attach('on_end_request', self.end)
+
+    def start(self, slowest=NUM_SLOWEST, **kwargs):
+        local.stats = RequestStats(slowest)
+
+    def finish(self, headers=False, slowest=NUM_SLOWEST, **kwargs):
+        stats = getattr(local, 'stats', None)
+        if stats is None:  # pragma: no cover
+            return
+        path = cherrypy.serving.request.path_info
+        with self.lock:
+            if path not in self.pages:
+                self.pages[path] = PageStats(path)
+            self.pages[path].add(stats, slowest)
+        if headers:
+            responseHeaders = cherrypy.serving.response.headers
+            responseHeaders['X-SQL-Queries'] = str(stats.numQueries)
+            responseHeaders['X-SQL-Time'] = f'{stats.totalTime * 1000:.2f}ms'
+            for (num, statement) in enumerate(stats.slowest()):
+                responseHeaders[f'X-SQL-Slowest-{num + 1}'] = \
+                    f'{statement[0] * 1000:.2f}ms {statement[2]} {cleanSQL(statement[1])[:200]}'
+
+    def end(self):
+        local.stats = None
+
+    def getPages(self):
+        with self.lock:
+            return sorted(self.pages.values(),
+                          key=lambda page: page.totalTime, reverse=True)
+
+    def reset(self):
+        with self.lock:
+            self.pages = {}
+
+
+cherrypy.tools.sqlstats = SQLStatsTool()
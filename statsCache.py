@@ -0,0 +1,59 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class StatsCache(object):
+    """
+    Statistics recently built for a date range, so a report page and the
+    graph on it share one.  An entry is only used while the data version it
+    was built from is current, and for at most ttl seconds as the version
+    doesn't cover names changing.  At most size are kept, taking up at most
+    maxBytes between them, the least recently used going first.  A size of
+    0 turns the cache off.
+
+    Requests share what is cached, so only put() Statistics that have been
+    built and won't change.
+    """
+
+    def __init__(self, size=8, ttl=60, maxBytes=None):
+        self.size = size
+        self.ttl = ttl
+        self.maxBytes = maxBytes
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # key -> (version, built, stats, size)
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, version):
+        """The Statistics for key built from version, None if there isn't one"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and (entry[0] != version or
+                                      time.monotonic() - entry[1] > self.ttl):
+                self.remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def put(self, key, version, stats, size=0):
+        """Caches stats, which take up roughly size bytes"""
+        if not self.size or (self.maxBytes is not None and size > self.maxBytes):
+            return
+        with self.lock:
+            if key in self.entries:
+                self.remove(key)
+            self.entries[key] = (version, time.monotonic(), stats, size)
+            self.bytes += size
+            while len(self.entries) > self.size or \
+                    (self.maxBytes is not None and self.bytes > self.maxBytes):
+                self.remove(next(iter(self.entries)))
+
+    def remove(self, key):
+        """Drops the entry for key (lock held)"""
+        self.bytes -= self.entries.pop(key)[3]
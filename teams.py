@@ -90,19 +90,21 @@ class Teams(object):
                 "ALTER TABLE new_team_members RENAME to team_members")
             dbConnection.execute('''DROP TABLE teams''')
             dbConnection.execute('''ALTER TABLE new_teams RENAME TO teams''')
+        if db_schema_version < 17:
+            dbConnection.execute(
+                'CREATE INDEX team_members_barcode ON team_members(barcode)')
 
     def injectData(self, dbConnection, data):
-        for datum in data:
-            dbConnection.execute("INSERT INTO teams VALUES (?,?,?,?,?,?)",
-                                 (datum["team_id"], datum["program_name"],
-                                  datum["program_number"], datum["team_name"],
-                                  datum["start_date"], datum["active"]))
-            if "members" in datum:
-                team_id = datum["team_id"]
-                for datum in datum["members"]:
-                    dbConnection.execute(
-                        "INSERT INTO team_members VALUES (?,?,?)",
-                        (team_id, datum["barcode"], datum["type"]))
+        data = list(data)
+        dbConnection.executemany("INSERT INTO teams VALUES (?,?,?,?,?,?)",
+                                 ((datum["team_id"], datum["program_name"],
+                                   datum["program_number"], datum["team_name"],
+                                   datum["start_date"], datum["active"])
+                                  for datum in data))
+        dbConnection.executemany("INSERT INTO team_members VALUES (?,?,?)",
+                                 ((datum["team_id"], member["barcode"], member["type"])
+                                  for datum in data
+                                  for member in datum.get("members", [])))
 
     def createTeam(self, dbConnection, program_name, program_number, team_name,
                    seasonStart):
@@ -8,14 +8,21 @@ from checkMeIn import CheckMeIn
 
 
 class CPTest(helper.CPWebCase):
-    @staticmethod
-    def setup_server():
+    # config added for the tests of just one class
+    extraConfig = {}
+
+    @classmethod
+    def setup_server(cls):
         testConfig = {
             'global': {
                 'database.path': 'testData/',
-                'database.name': 'test.db'
+                'database.name': 'test.db',
+                # global config outlives the class that set it
+                'database.instrument': False
             }
         }
+        for (section, settings) in cls.extraConfig.items():
+            testConfig.setdefault(section, {}).update(settings)
 
         cherrypy.config.update(testConfig)
         cmi = CheckMeIn()
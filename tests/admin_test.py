@@ -2,11 +2,31 @@ import CPtest
 
 
 class AdminTest(CPtest.CPTest):
+    extraConfig = {
+        'global': {'database.instrument': True},
+        '/': {'tools.sqlstats.on': True, 'tools.sqlstats.headers': True}
+    }
+
     def test_admin(self):
         with self.patch_session():
             self.getPage("/admin/")
             self.assertStatus('200 OK')
 
+    def test_database(self):
+        with self.patch_session():
+            self.getPage("/admin/database")
+            self.assertStatus('200 OK')
+
+    def test_sqlStats(self):
+        with self.patch_session():
+            self.getPage("/admin/database")
+            self.assertHeader('X-SQL-Queries')
+            self.getPage("/admin/sqlStats")
+            self.assertStatus('200 OK')
+            self.assertInBody('/admin/database')
+            self.getPage("/admin/sqlStats?reset=1")
+            self.assertStatus('303 See Other')
+
     def test_oops(self):
         with self.patch_session():
             self.getPage("/admin/oops")
@@ -0,0 +1,115 @@
+import threading
+
+import cherrypy
+
+from cherrypy_SSE import HEARTBEAT, Broadcaster, formatEvent
+
+
+def withoutId(frame):
+    return frame.split('\n', 1)[1] if frame.startswith('id: ') else frame
+
+
+def test_format_event():
+    assert formatEvent('update', '{"a": 1}') == 'event: update\ndata: {"a": 1}\n\n'
+    assert formatEvent('update', 'x', 7) == 'id: 7\nevent: update\ndata: x\n\n'
+    assert formatEvent('update', 'one\ntwo') == \
+        'event: update\ndata: one\ndata: two\n\n'
+
+
+def test_every_subscriber_gets_every_message():
+    broadcaster = Broadcaster('test-fanout', event='update')
+    first = broadcaster.subscribe()
+    second = broadcaster.subscribe()
+    for num in range(10):
+        cherrypy.engine.publish('test-fanout', str(num))
+    for subscriber in (first, second):
+        assert [withoutId(subscriber.get(0)) for _ in range(10)] == \
+            [formatEvent('update', str(num)) for num in range(10)]
+        assert subscriber.get(0) is None
+    stats = broadcaster.stats()
+    assert (stats.subscribers, stats.published, stats.dropped, stats.queued) == \
+        (2, 10, 0, 0)
+    broadcaster.close()
+
+
+def test_slow_subscriber_is_told_to_start_over():
+    broadcaster = Broadcaster('test-overflow', event='update', queueSize=3,
+                              overflowData='reload')
+    slow = broadcaster.subscribe()
+    for num in range(5):
+        broadcaster.publish(str(num))
+    stats = broadcaster.stats()
+    assert (stats.dropped, stats.queued) == (4, 2)
+    assert stats.lag >= 0
+    assert slow.get(0) == formatEvent('update', 'reload')
+    assert withoutId(slow.get(0)) == formatEvent('update', '4')
+    broadcaster.unsubscribe(slow)
+    assert broadcaster.stats().subscribers == 0
+    assert broadcaster.stats().dropped == 4
+    broadcaster.close()
+
+
+def test_slow_subscriber_drops_oldest():
+    broadcaster = Broadcaster('test-drop', queueSize=3)
+    slow = broadcaster.subscribe()
+    for num in range(5):
+        broadcaster.publish(str(num))
+    assert [withoutId(slow.get(0)) for _ in range(3)] == \
+        [formatEvent('message', str(num)) for num in range(2, 5)]
+    assert broadcaster.stats().dropped == 2
+    broadcaster.close()
+
+
+def test_messages_stream_until_closed():
+    broadcaster = Broadcaster('test-stream', heartbeat=0.01)
+    subscriber = broadcaster.subscribe()
+    stream = broadcaster.messages(subscriber)
+    assert next(stream) == HEARTBEAT
+    broadcaster.publish('hello')
+    assert withoutId(next(stream)) == formatEvent('message', 'hello')
+    # as cherrypy does when the client goes away
+    stream.close()
+    assert broadcaster.stats().subscribers == 0
+
+    broadcaster.heartbeat = 10
+    stream = broadcaster.messages(broadcaster.subscribe())
+    received = []
+    thread = threading.Thread(target=lambda: received.extend(stream))
+    thread.start()
+    broadcaster.publish('last')
+    broadcaster.close()
+    thread.join(5)
+    assert not thread.is_alive()
+    assert [withoutId(frame) for frame in received] == [formatEvent('message', 'last')]
+    assert broadcaster.stats().subscribers == 0
+
+
+def test_reconnecting_subscriber_gets_what_it_missed():
+    broadcaster = Broadcaster('test-replay', event='update', replaySize=5,
+                              overflowData='reload')
+    first = broadcaster.subscribe()
+    for num in range(3):
+        broadcaster.publish(str(num))
+    frames = [first.get(0) for _ in range(3)]
+    ids = [int(frame.split('\n')[0][len('id: '):]) for frame in frames]
+    assert ids == [ids[0], ids[0] + 1, ids[0] + 2]
+    assert frames[1] == formatEvent('update', '1', ids[1])
+    assert broadcaster.lastId == ids[2]
+
+    # saw the first, then lost its connection
+    broadcaster.unsubscribe(first)
+    again = broadcaster.subscribe(str(ids[0]))
+    assert [again.get(0) for _ in range(2)] == frames[1:]
+    assert again.get(0) is None
+    upToDate = broadcaster.subscribe(str(ids[2]))
+    assert upToDate.get(0) is None
+    assert broadcaster.subscribe('').get(0) is None
+
+    for num in range(3, 10):
+        broadcaster.publish(str(num))
+    # the ones it missed are no longer kept, before a restart, or bogus
+    for lastEventId in (ids[2], broadcaster.lastId + 1, 'bogus'):
+        subscriber = broadcaster.subscribe(str(lastEventId))
+        assert subscriber.get(0) == formatEvent('update', 'reload')
+        assert subscriber.get(0) is None
+    broadcaster.close()
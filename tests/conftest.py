@@ -13,6 +13,7 @@ def my_own_session_run_at_beginning(request):
             'database.name': 'test.db'
         }
     }
+    os.makedirs(testConfig['global']['database.path'], exist_ok=True)
     try:
         # Make sure we are starting with a clean database
         os.remove(testConfig['global']['database.path'] +
@@ -0,0 +1,549 @@
+import datetime
+import json
+import sqlite3
+import threading
+
+import pytest
+
+from engine import Engine
+import sampleData
+import sqlStats
+import utils
+
+
+@pytest.fixture
+def engine(tmp_path):
+    theEngine = Engine(str(tmp_path) + '/', 'engine.db', None)
+    yield theEngine
+    theEngine.close()
+
+
+@pytest.fixture
+def loadedEngine(engine):
+    engine.injectData(sampleData.testData())
+    return engine
+
+
+def presenceMatchesVisits(dbConnection):
+    inVisits = dbConnection.execute(
+        "SELECT rowid, barcode, start FROM visits WHERE status = 'In' ORDER BY rowid").fetchall()
+    inPresence = dbConnection.execute(
+        "SELECT visit_id, barcode, start FROM presence ORDER BY visit_id").fetchall()
+    return inVisits == inPresence
+
+
+def test_pool_reuses_connection_per_thread(engine):
+    assert engine.dbConnect() is engine.dbConnect()
+
+    connections = []
+    thread = threading.Thread(
+        target=lambda: connections.append(engine.dbConnect()))
+    thread.start()
+    thread.join()
+    assert connections[0] is not engine.dbConnect()
+
+
+def test_pool_context_manager_commits_and_rolls_back(engine):
+    with engine.dbConnect() as dbConnection:
+        dbConnection.execute("INSERT INTO config VALUES ('committed', '1')")
+    with pytest.raises(ZeroDivisionError):
+        with engine.dbConnect() as dbConnection:
+            dbConnection.execute(
+                "INSERT INTO config VALUES ('rolledBack', '1')")
+            1 / 0
+    with engine.dbConnect() as dbConnection:
+        assert engine.config.get(dbConnection, 'committed') == '1'
+        assert engine.config.get(dbConnection, 'rolledBack') is None
+
+
+def test_pool_nested_blocks_commit_once(engine):
+    with engine.dbConnect() as outer:
+        outer.execute("INSERT INTO config VALUES ('outer', '1')")
+        with engine.dbConnect() as inner:
+            assert inner is outer
+            inner.execute("INSERT INTO config VALUES ('inner', '1')")
+        # leaving the inner block didn't commit the outer one's work
+        assert outer.in_transaction
+        with pytest.raises(ZeroDivisionError):
+            with engine.dbConnect() as inner:
+                inner.execute("INSERT INTO config VALUES ('undone', '1')")
+                1 / 0
+        assert outer.in_transaction
+    with engine.dbConnect() as dbConnection:
+        assert engine.config.get(dbConnection, 'outer') == '1'
+        assert engine.config.get(dbConnection, 'inner') == '1'
+        assert engine.config.get(dbConnection, 'undone') is None
+
+    with pytest.raises(ZeroDivisionError):
+        with engine.dbConnect() as outer:
+            with engine.dbConnect() as inner:
+                inner.execute("INSERT INTO config VALUES ('rolledBack', '1')")
+            1 / 0
+    with engine.dbConnect() as dbConnection:
+        assert engine.config.get(dbConnection, 'rolledBack') is None
+
+
+def test_pool_close_leaves_busy_connections(engine):
+    idle = engine.dbConnect()
+    inUse = threading.Event()
+    closed = threading.Event()
+    results = []
+
+    def busy():
+        with engine.dbConnect() as dbConnection:
+            inUse.set()
+            closed.wait()
+            dbConnection.execute("INSERT INTO config VALUES ('busy', '1')")
+            results.append(dbConnection)
+    thread = threading.Thread(target=busy)
+    thread.start()
+    inUse.wait()
+    engine.pool.close()
+    closed.set()
+    thread.join()
+    with pytest.raises(sqlite3.ProgrammingError):
+        idle.execute('SELECT 1')
+    # closed once it committed
+    with pytest.raises(sqlite3.ProgrammingError):
+        results[0].execute('SELECT 1')
+    with engine.dbConnect() as dbConnection:
+        assert engine.config.get(dbConnection, 'busy') == '1'
+
+
+def test_pool_close_keeps_connection_of_open_block(engine):
+    with engine.dbConnect() as outer:
+        outer.execute("INSERT INTO config VALUES ('outer', '1')")
+        engine.pool.close()
+        with engine.dbConnect() as inner:
+            assert inner is outer
+            inner.execute("INSERT INTO config VALUES ('inner', '1')")
+        assert outer.in_transaction
+    with pytest.raises(sqlite3.ProgrammingError):
+        outer.execute('SELECT 1')
+    with engine.dbConnect() as dbConnection:
+        assert dbConnection is not outer
+        assert engine.config.get(dbConnection, 'outer') == '1'
+        assert engine.config.get(dbConnection, 'inner') == '1'
+
+
+def test_pool_reopens_closed_connection(engine):
+    first = engine.dbConnect()
+    first.close()
+    engine.pool.healthCheckInterval = 0
+    second = engine.dbConnect()
+    assert second is not first
+    assert second.execute('SELECT 1').fetchone() == (1, )
+
+    engine.close()
+    assert engine.dbConnect() is not second
+
+
+def test_pool_overflow_is_not_kept(engine):
+    engine.pool.size = 1
+    engine.dbConnect()
+    connections = []
+
+    def connectTwice():
+        connections.append(engine.dbConnect())
+        connections.append(engine.dbConnect())
+    thread = threading.Thread(target=connectTwice)
+    thread.start()
+    thread.join()
+    assert connections[0] is not connections[1]
+    assert engine.pool.numConnections() == 1
+
+
+def test_pragmas_applied(tmp_path):
+    pragmas = {'journal_mode': 'WAL', 'synchronous': 'NORMAL',
+               'cache_size': -4000, 'busy_timeout': 2000}
+    theEngine = Engine(str(tmp_path) + '/', 'pragmas.db', None,
+                       pragmas=pragmas)
+    with theEngine.dbConnect() as dbConnection:
+        settings = {name: (configured, value) for (name, configured, value)
+                    in theEngine.getDatabaseSettings(dbConnection)}
+    assert settings['journal_mode'] == ('WAL', 'wal')
+    assert settings['synchronous'] == ('NORMAL', 1)
+    assert settings['busy_timeout'] == (2000, 2000)
+    with theEngine.customReports.readOnlyConnect() as readOnly:
+        assert readOnly.execute('PRAGMA cache_size').fetchone()[0] == -4000
+    theEngine.close()
+
+
+def test_bad_pragma_value(tmp_path):
+    with pytest.raises(ValueError):
+        Engine(str(tmp_path) + '/', 'bad.db', None,
+               pragmas={'journal_mode': 'WAL; DROP TABLE visits'})
+
+
+def queryPlan(dbConnection, sql, params=()):
+    return ' '.join(row[-1] for row in dbConnection.execute(
+        'EXPLAIN QUERY PLAN ' + sql, params))
+
+
+@pytest.mark.parametrize('sql, params, index', [
+    ("SELECT * FROM visits WHERE (barcode==?) and (status=='In')",
+     ('100091', ), 'USING INDEX visits_barcode_'),
+    ("SELECT count(*) FROM visits WHERE status == 'In'", (),
+     'visits_barcode_in'),
+    ("SELECT start FROM visits ORDER BY start ASC LIMIT 1", (),
+     'visits_start'),
+    ("SELECT COUNT(DISTINCT barcode) FROM visits WHERE (start BETWEEN ? AND ?)",
+     ('2021-01-01', '2021-01-02'), 'visits_start'),
+    ("SELECT visits.status from visits where visits.barcode=? ORDER by visits.start DESC",
+     ('100091', ), 'visits_barcode_start'),
+    ("SELECT user_id, tool_id, date, level FROM certifications WHERE user_id = ?",
+     ('100091', ), 'certifications_user_id'),
+    ("SELECT team_id FROM team_members WHERE barcode = ?",
+     ('100091', ), 'team_members_barcode'),
+    ("SELECT name, mac, barcode FROM devices WHERE barcode = ? ORDER BY name",
+     ('100091', ), 'devices_barcode'),
+    ("SELECT date, barcode from logEvents WHERE what = ? ORDER BY date DESC LIMIT 1",
+     ('Bulk Add', ), 'logEvents_what_date'),
+    ("SELECT * FROM unlocks WHERE time > ?", ('2021-01-01', ),
+     'unlocks_time'),
+])
+def test_hot_queries_use_indexes(engine, sql, params, index):
+    with engine.dbConnect() as dbConnection:
+        assert index in queryPlan(dbConnection, sql, params)
+
+
+def test_presence_follows_visits(loadedEngine):
+    visits = loadedEngine.visits
+    with loadedEngine.dbConnect() as dbConnection:
+        assert loadedEngine.reports.numberPresent(dbConnection) == 3
+        assert presenceMatchesVisits(dbConnection)
+        assert visits.scannedMember(dbConnection, '100090') == ''
+        assert visits.inBuilding(dbConnection, '100090')
+        visits.scannedMember(dbConnection, '100091')
+        assert not visits.inBuilding(dbConnection, '100091')
+        visits.leaveGuest(dbConnection, '202107310001')
+        assert presenceMatchesVisits(dbConnection)
+        assert [person.barcode for person in
+                loadedEngine.reports.whoIsHere(dbConnection)] == ['100032', '100090']
+
+        visits.emptyBuilding(dbConnection, '100032')
+        assert loadedEngine.reports.numberPresent(dbConnection) == 0
+        visits.oopsForgot(dbConnection)
+        assert loadedEngine.reports.numberPresent(dbConnection) == 1
+        assert presenceMatchesVisits(dbConnection)
+
+        (rowid, ) = dbConnection.execute(
+            "SELECT visit_id FROM presence").fetchone()
+        visits.fix(dbConnection, f"{rowid}!2021-07-31 1:00PM!2021-07-31 2:00PM")
+        assert loadedEngine.reports.numberPresent(dbConnection) == 0
+        assert presenceMatchesVisits(dbConnection)
+
+
+def test_presence_survives_vacuum(loadedEngine):
+    visits = loadedEngine.visits
+    with loadedEngine.dbConnect() as dbConnection:
+        (visitId, ) = dbConnection.execute(
+            "SELECT visit_id FROM visits WHERE barcode = '100091' AND status = 'In'").fetchone()
+        # leave a gap before the visits still in the building
+        dbConnection.execute("DELETE FROM visits WHERE status != 'In'")
+        dbConnection.execute("DELETE FROM visits WHERE barcode = '100032'")
+    dbConnection = loadedEngine.dbConnect()
+    dbConnection.execute('VACUUM')
+    with loadedEngine.dbConnect() as dbConnection:
+        assert dbConnection.execute(
+            "SELECT visit_id FROM visits WHERE barcode = '100091'").fetchone() == (visitId, )
+        assert presenceMatchesVisits(dbConnection)
+        visits.scannedMember(dbConnection, '100091')
+        assert not visits.inBuilding(dbConnection, '100091')
+        assert presenceMatchesVisits(dbConnection)
+
+
+def test_migration_keeps_visit_ids(loadedEngine):
+    with loadedEngine.dbConnect() as dbConnection:
+        # back to how schema 22 was
+        for (name, ) in dbConnection.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name != 'visits'"
+                " AND name LIKE '%_rollup_%'").fetchall():
+            dbConnection.execute(f'DROP TRIGGER {name}')
+        before = dbConnection.execute(
+            "SELECT rowid, start, leave, barcode, status FROM visits ORDER BY rowid").fetchall()
+        loadedEngine.migrate(dbConnection, 22)
+        assert dbConnection.execute(
+            "SELECT visit_id, start, leave, barcode, status FROM visits ORDER BY visit_id"
+        ).fetchall() == before
+        assert presenceMatchesVisits(dbConnection)
+        loadedEngine.visits.scannedMember(dbConnection, '100091')
+        assert presenceMatchesVisits(dbConnection)
+        # the rollups still see changes to visits
+        dbConnection.execute("DELETE FROM visits WHERE start < date('now')")
+        assert dbConnection.execute('SELECT count(*) FROM rollup_dirty').fetchone()[0]
+
+
+def test_occupancy_cache_writes_through(loadedEngine):
+    occupancy = loadedEngine.occupancy
+    visits = loadedEngine.visits
+    with loadedEngine.dbConnect() as dbConnection:
+        assert occupancy.count() == 3
+        visits.scannedMember(dbConnection, '100090')
+        visits.leaveGuest(dbConnection, '202107310001')
+        assert occupancy.isPresent('100090')
+        assert not occupancy.isPresent('202107310001')
+        assert occupancy.verify(dbConnection)
+        visits.emptyBuilding(dbConnection, '')
+        assert occupancy.count() == 0
+        visits.oopsForgot(dbConnection)
+        assert occupancy.verify(dbConnection)
+
+        # a change behind its back is found and fixed by verify
+        dbConnection.execute("UPDATE visits SET status = 'Out'")
+        assert occupancy.count() == 3
+        assert not occupancy.verify(dbConnection)
+        assert occupancy.count() == 0
+
+
+def test_occupancy_cache_disabled(tmp_path):
+    theEngine = Engine(str(tmp_path) + '/', 'nocache.db', None,
+                       occupancyCache=False)
+    theEngine.injectData(sampleData.testData())
+    with theEngine.dbConnect() as dbConnection:
+        assert theEngine.occupancy.count() == 0
+        assert theEngine.reports.numberPresent(dbConnection) == 3
+        assert theEngine.visits.inBuilding(dbConnection, '100091')
+        assert [guest.guest_id for guest in
+                theEngine.reports.guestsInBuilding(dbConnection)] == ['202107310001']
+    theEngine.close()
+
+
+def test_write_queue(tmp_path):
+    theEngine = Engine(str(tmp_path) + '/', 'queue.db', None,
+                       writeQueue=True)
+    theEngine.injectData(sampleData.testData())
+
+    def scanAll(barcodes):
+        for barcode in barcodes:
+            theEngine.write(theEngine.visits.scannedMember, barcode)
+    threads = [threading.Thread(target=scanAll, args=(['100090', '100093'], ))
+               for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    def failingWrite(dbConnection):
+        dbConnection.execute("INSERT INTO config VALUES ('lost', '1')")
+        raise RuntimeError("failed")
+    with pytest.raises(RuntimeError):
+        theEngine.write(failingWrite)
+    assert theEngine.write(theEngine.visits.scannedMember, 'bogus') == \
+        'Invalid barcode: bogus'
+
+    with theEngine.dbConnect() as dbConnection:
+        # scanned an odd number of times, so both are in
+        assert theEngine.visits.inBuilding(dbConnection, '100090')
+        assert theEngine.visits.inBuilding(dbConnection, '100093')
+        assert theEngine.occupancy.verify(dbConnection)
+        assert theEngine.config.get(dbConnection, 'lost') is None
+    theEngine.close()
+
+
+@pytest.mark.parametrize('writeQueue', [False, True])
+def test_keyholder_changes_are_one_write(tmp_path, writeQueue):
+    messages = []
+    theEngine = Engine(str(tmp_path) + '/', 'keyholder.db', messages.append,
+                       writeQueue=writeQueue)
+    theEngine.injectData(sampleData.testData())
+    accounts = theEngine.accounts
+
+    theEngine.write(theEngine.closeBuilding, '100091')
+    messages.clear()
+    assert theEngine.write(theEngine.scanMember, '100091') == ''
+    assert len(messages) == 1
+    with theEngine.dbConnect() as dbConnection:
+        assert accounts.getActiveKeyholder(dbConnection)[0] == '100091'
+        assert theEngine.visits.inBuilding(dbConnection, '100091')
+
+    theEngine.write(theEngine.visits.scannedMember, '100090')
+    messages.clear()
+    theEngine.write(theEngine.checkOutKeyholder, '100091')
+    assert len(messages) == 1
+    with theEngine.dbConnect() as dbConnection:
+        assert accounts.getActiveKeyholder(dbConnection)[0] == ''
+        assert not theEngine.visits.inBuilding(dbConnection, '100091')
+        assert theEngine.visits.inBuilding(dbConnection, '100090')
+
+    def failingWrite(dbConnection):
+        theEngine.makeKeyholder(dbConnection, '100091')
+        raise RuntimeError("failed")
+    with pytest.raises(RuntimeError):
+        theEngine.write(failingWrite)
+    with theEngine.dbConnect() as dbConnection:
+        assert accounts.getActiveKeyholder(dbConnection)[0] == ''
+        assert not theEngine.visits.inBuilding(dbConnection, '100091')
+    assert theEngine.write(theEngine.makeKeyholder, '100091')
+    with theEngine.dbConnect() as dbConnection:
+        assert accounts.getActiveKeyholder(dbConnection)[0] == '100091'
+        assert theEngine.visits.inBuilding(dbConnection, '100091')
+    theEngine.close()
+
+
+def test_bulk_update(loadedEngine):
+    result = loadedEngine.write(loadedEngine.bulkUpdate,
+                                ['100090', '100093', '100091'],
+                                ['100032', '100091'])
+    assert result.checkedIn == ['100090', '100093']
+    assert result.checkedOut == ['100032']
+    assert result.leavingKeyholder == '100091'
+    with loadedEngine.dbConnect() as dbConnection:
+        assert loadedEngine.accounts.getActiveKeyholder(
+            dbConnection)[0] == '100091'
+        assert loadedEngine.visits.presentAmong(
+            dbConnection, ['100090', '100093', '100091', '100032']) == \
+            {'100090', '100093', '100091'}
+        assert loadedEngine.occupancy.verify(dbConnection)
+
+
+def test_instrumented_connection(tmp_path):
+    theEngine = Engine(str(tmp_path) + '/', 'instrumented.db', None,
+                       instrument=True)
+    theEngine.injectData(sampleData.testData())
+    sqlStats.local.stats = stats = sqlStats.RequestStats(numSlowest=2)
+    try:
+        with theEngine.dbConnect() as dbConnection:
+            theEngine.visits.inBuilding(dbConnection, '100091')
+            dbConnection.executemany("INSERT INTO config VALUES (?, ?)",
+                                     [('a', 1), ('b', 2)])
+            rows = list(dbConnection.execute(
+                "SELECT * FROM members WHERE barcode = :barcode",
+                {'barcode': '100091'}))
+    finally:
+        sqlStats.local.stats = None
+    assert len(rows) == 1
+    assert stats.numQueries >= 2
+    assert stats.totalTime > 0
+    shapes = [statement[2] for statement in stats.statements]
+    assert '[2 x (str, int)]' in shapes
+    assert '{barcode: str}' in shapes
+    assert len(stats.slowest()) == 2
+    theEngine.close()
+
+
+def test_iter_transactions_match_transactions(loadedEngine):
+    start = datetime.datetime(2018, 1, 1)
+    end = datetime.datetime(2030, 1, 1)
+    with loadedEngine.dbConnect() as dbConnection:
+        streamed = list(loadedEngine.reports.iterTransactions(dbConnection, start, end))
+        assert streamed
+        assert sorted(streamed, key=lambda x: x[1], reverse=True) == \
+            loadedEngine.reports.transactions(dbConnection, start, end)
+
+
+def test_forgotten_dates(loadedEngine):
+    with loadedEngine.dbConnect() as dbConnection:
+        assert loadedEngine.reports.getForgottenDates(dbConnection) == []
+        dbConnection.executemany(
+            "INSERT INTO visits(start, leave, barcode, status) VALUES (?, ?, '100091', 'Forgot')",
+            [(datetime.datetime(2021, 7, day, hour), datetime.datetime(2021, 7, day, 23))
+             for (day, hour) in ((3, 10), (1, 9), (3, 12), (3, 14))])
+        assert loadedEngine.reports.getForgottenDates(dbConnection) == \
+            [(datetime.date(2021, 7, 1), 1), (datetime.date(2021, 7, 3), 3)]
+        (plan, ) = [row[3] for row in dbConnection.execute(
+            '''EXPLAIN QUERY PLAN SELECT date(start), count(*) FROM visits
+               WHERE status = 'Forgot' GROUP BY date(start) ORDER BY date(start)''')]
+        assert 'visits_forgot_day' in plan
+
+
+@pytest.mark.parametrize('writeQueue', [False, True])
+def test_writes_announce_changes(tmp_path, writeQueue):
+    messages = []
+    theEngine = Engine(str(tmp_path) + '/', 'announce.db', messages.append,
+                       writeQueue=writeQueue)
+    theEngine.injectData(sampleData.testData())
+    assert messages == []
+
+    theEngine.write(theEngine.visits.scannedMember, '100090')
+    update = json.loads(messages.pop())
+    assert [(trans['name'], trans['description'])
+            for trans in update['transactions']] == [('Daughter N', 'In')]
+    assert update['numberPresent'] == 4
+    with theEngine.dbConnect() as dbConnection:
+        assert update['uniqueVisitorsToday'] == \
+            theEngine.reports.uniqueVisitorsToday(dbConnection)
+        assert update['keyholder'] == \
+            theEngine.accounts.getActiveKeyholder(dbConnection)[1]
+
+    # already in, so nothing changed and nothing is announced
+    theEngine.write(theEngine.visits.checkInMembers, ['100090'])
+    assert messages == []
+    theEngine.write(theEngine.bulkUpdate, ['100093'], ['100090'])
+    update = json.loads(messages.pop())
+    assert [trans['description'] for trans in update['transactions']] == ['In', 'Out']
+    assert update['numberPresent'] == 4
+    keys = [trans['key'] for trans in update['transactions']]
+    assert len(set(keys)) == 2
+
+    def failingWrite(dbConnection):
+        theEngine.visits.scannedMember(dbConnection, '100090')
+        raise RuntimeError("failed")
+    with pytest.raises(RuntimeError):
+        theEngine.write(failingWrite)
+    assert messages == []
+
+    theEngine.write(theEngine.visits.emptyBuilding, '')
+    assert json.loads(messages.pop()) == {'reload': True}
+    theEngine.close()
+
+
+def test_no_listeners_skips_station_update(tmp_path):
+    messages = []
+    theEngine = Engine(str(tmp_path) + '/', 'unheard.db', messages.append,
+                       hasListeners=lambda: False)
+    theEngine.injectData(sampleData.testData())
+    theEngine.reports.stationUpdate = None  # would fail if called
+    theEngine.write(theEngine.visits.scannedMember, '100090')
+    assert [json.loads(message) for message in messages] == [{'reload': True}]
+    theEngine.close()
+
+
+@pytest.mark.parametrize('writeQueue', [False, True])
+def test_rolled_back_write_leaves_occupancy(tmp_path, writeQueue):
+    theEngine = Engine(str(tmp_path) + '/', 'rollback.db', None,
+                       writeQueue=writeQueue)
+    theEngine.injectData(sampleData.testData())
+    before = theEngine.occupancy.count()
+
+    def failingScan(dbConnection):
+        theEngine.visits.scannedMember(dbConnection, '100090')
+        raise RuntimeError("failed")
+    with pytest.raises(RuntimeError):
+        theEngine.write(failingScan)
+    assert theEngine.occupancy.count() == before
+    with theEngine.dbConnect() as dbConnection:
+        assert theEngine.occupancy.verify(dbConnection)
+
+    theEngine.write(theEngine.visits.scannedMember, '100090')
+    assert theEngine.occupancy.count() == before + 1
+    theEngine.write(theEngine.visits.emptyBuilding, '')
+    assert theEngine.occupancy.count() == 0
+    theEngine.close()
+
+
+def test_forgot_password_emails_outside_the_writer(tmp_path, monkeypatch):
+    theEngine = Engine(str(tmp_path) + '/', 'forgot.db', None, writeQueue=True)
+    theEngine.injectData(sampleData.testData())
+    sentFrom = []
+    monkeypatch.setattr(utils, 'sendEmail',
+                        lambda *args: sentFrom.append(threading.current_thread().name))
+    assert theEngine.forgotPassword('admin') == 'fake@email.com'
+    assert theEngine.forgotPassword('fake@email.com').startswith('No email sent')
+    assert theEngine.forgotPassword('nobody').startswith('No email sent')
+    assert sentFrom == [threading.current_thread().name]
+    with theEngine.dbConnect() as dbConnection:
+        (numLogged, ) = dbConnection.execute(
+            "SELECT count(*) FROM logEvents WHERE what = 'Forgot password request'").fetchone()
+    assert numLogged == 3
+    theEngine.close()
+
+
+def test_grace_period_and_its_log_entry_commit_together(loadedEngine, monkeypatch):
+    def failingLog(dbConnection, what, barcode):
+        raise RuntimeError("failed")
+    monkeypatch.setattr(loadedEngine.logEvents, 'addEvent', failingLog)
+    with pytest.raises(RuntimeError):
+        loadedEngine.write(loadedEngine.setGracePeriod, '42', '100091')
+    with loadedEngine.dbConnect() as dbConnection:
+        assert loadedEngine.config.get(dbConnection, 'grace_period') != '42'
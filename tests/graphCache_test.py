@@ -0,0 +1,31 @@
+from graphCache import GraphCache
+
+
+def test_least_recently_used_dropped():
+    cache = GraphCache(2)
+    cache.put('a', b'A')
+    cache.put('b', b'B')
+    assert cache.get('a') == b'A'
+    cache.put('c', b'C')
+    assert cache.get('b') is None
+    assert cache.get('a') == b'A'
+    assert cache.get('c') == b'C'
+    assert (cache.hits, cache.misses) == (3, 1)
+
+
+def test_kept_on_disk(tmp_path):
+    cache = GraphCache(2, str(tmp_path))
+    for key in ('a', 'b', 'c'):
+        cache.put(key, key.encode())
+    assert len(list(tmp_path.glob('*.png'))) == 2
+
+    restarted = GraphCache(2, str(tmp_path))
+    assert restarted.get('c') == b'c'
+    assert restarted.get('a') is None
+
+
+def test_size_zero_is_off(tmp_path):
+    cache = GraphCache(0, str(tmp_path))
+    cache.put('a', b'A')
+    assert cache.get('a') is None
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,27 @@
+import datetime
+
+from graphRenderer import GraphRenderer
+
+DAY = datetime.date(2021, 7, 1)
+POINTS = [(datetime.datetime(2021, 7, 1, hour), hour % 5) for hour in range(8, 22)]
+
+
+def test_render_in_pool():
+    renderer = GraphRenderer(1)
+    try:
+        graph = renderer.render('buildingUsageGraph', POINTS, DAY, DAY)
+        assert graph.startswith(b'\x89PNG')
+        assert renderer.executor is not None
+    finally:
+        renderer.close()
+
+
+def test_render_here_without_leaking_figures():
+    import matplotlib.pyplot as plt
+    renderer = GraphRenderer(0)
+    before = plt.get_fignums()
+    for _ in range(3):
+        assert renderer.render('buildingUsageGraph', POINTS, DAY,
+                               DAY + datetime.timedelta(days=1)).startswith(b'\x89PNG')
+    assert renderer.executor is None
+    assert plt.get_fignums() == before
@@ -26,6 +26,7 @@ class MiscTest(CPtest.CPTest):
         with self.patch_session():
             self.getPage("/metrics")
             self.assertStatus('200 OK')
+            self.assertInBody('update_subscribers 0')
 
     def test_unlock(self):
         with self.patch_session():
@@ -1,3 +1,8 @@
+import csv
+import datetime
+import io
+import json
+
 import CPtest
 
 
@@ -63,6 +68,75 @@ class ReportsTest(CPtest.CPTest):
                 "/reports/graph?startDate=2019-12-01&endDate=2022-12-30")
         self.assertStatus('200 OK')
 
+    def test_usageJSON(self):
+        url = "/reports/usage.json?startDate=2019-12-01&endDate=2022-12-30"
+        with self.patch_session():
+            self.getPage(url + "&bucket=day",
+                         headers=[('Accept-Encoding', 'gzip')])
+        self.assertStatus('200 OK')
+        self.assertHeader('Content-Type', 'application/json')
+        self.assertHeader('Content-Encoding', 'gzip')
+        with self.patch_session():
+            self.getPage(url)
+        self.assertStatus('200 OK')
+        data = json.loads(self.body)
+        assert data['bucket'] == 'hour'
+        assert len(data['usage']['time']) == len(data['usage']['visitors'])
+        assert len(data['daily']['date']) == len(data['daily']['visitors'])
+        etag = [value for (name, value) in self.headers if name.lower() == 'etag'][0]
+
+        with self.patch_session():
+            self.getPage(url, headers=[('If-None-Match', etag)])
+        self.assertStatus(304)
+        with self.patch_session():
+            self.getPage(url + "&bucket=year")
+        self.assertStatus(400)
+
+    def test_occupancyJSON(self):
+        with self.patch_session():
+            self.getPage("/reports/occupancy.json?" + self.lastMonth() +
+                         "&minutes=15&firstHour=0&lastHour=24")
+        self.assertStatus('200 OK')
+        data = json.loads(self.body)
+        assert len(data['usage']['time']) == 31 * 24 * 4
+        assert data['usage']['time'][0].endswith('T00:00')
+        assert any(data['usage']['visitors'])
+        with self.patch_session():
+            self.getPage("/reports/occupancy.json?" + self.lastMonth() + "&minutes=7")
+        self.assertStatus(400)
+        with self.patch_session():
+            self.getPage("/reports/occupancy.json?" + self.lastMonth() + "&firstHour=9&lastHour=9")
+        self.assertStatus(400)
+
+    def test_trends(self):
+        with self.patch_session():
+            self.getPage("/reports/trends?startMonth=2021-01&endMonth=" +
+                         datetime.date.today().isoformat()[:7])
+        self.assertStatus('200 OK')
+        self.assertInBody(datetime.date.today().strftime('%b %Y'))
+
+    def lastMonth(self):
+        today = datetime.date.today()
+        return f"startDate={today - datetime.timedelta(days=30)}&endDate={today}"
+
+    def test_visitsCSV(self):
+        with self.patch_session():
+            self.getPage("/reports/visits.csv?" + self.lastMonth())
+        self.assertStatus('200 OK')
+        assert dict(self.headers)['Content-Type'].startswith('text/csv')
+        rows = list(csv.reader(io.StringIO(self.body.decode('utf-8'))))
+        assert rows[0] == ['start', 'leave', 'name', 'status', 'barcode']
+        assert len(rows) > 1
+        assert [row[0] for row in rows[1:]] == sorted(row[0] for row in rows[1:])
+
+    def test_transactionsCSV(self):
+        with self.patch_session():
+            self.getPage("/reports/transactions.csv?" + self.lastMonth())
+        self.assertStatus('200 OK')
+        rows = list(csv.reader(io.StringIO(self.body.decode('utf-8'))))
+        assert rows[0] == ['name', 'time', 'description']
+        assert 'In' in [row[2] for row in rows[1:]]
+
     def test_tracing(self):
         with self.patch_session():
             self.getPage("/reports/tracing?barcode=100091&numDays=14")
@@ -0,0 +1,175 @@
+import datetime
+
+import pytest
+
+from engine import Engine
+from reports import Statistics
+import syntheticData
+
+END = datetime.datetime.combine(datetime.date.today(), datetime.time(18, 30))
+BEGIN = (END - datetime.timedelta(days=40)).date()
+
+
+@pytest.fixture
+def theEngine(tmp_path):
+    theEngine = Engine(str(tmp_path) + '/', 'rollups.db', None)
+    theEngine.injectData(syntheticData.syntheticData(
+        members=50, guests=40, teams=1, certifications=0, keyholders=2,
+        visits=2000, years=0.2, end=END))
+    yield theEngine
+    theEngine.close()
+
+
+def assertSameStats(dbConnection, theEngine):
+    stats = theEngine.reports.getStats(dbConnection, BEGIN.isoformat(),
+                                       END.date().isoformat())
+    raw = Statistics(dbConnection, datetime.datetime.combine(BEGIN, datetime.time()),
+                     datetime.datetime.combine(END.date(), datetime.time.max))
+    assert sorted(stats.visitors) == sorted(raw.visitors)
+    for (barcode, person) in raw.visitors.items():
+        assert stats.visitors[barcode].name == person.name
+        assert stats.visitors[barcode].hours == pytest.approx(person.hours)
+        assert stats.visitors[barcode].date.keys() == person.date.keys()
+    assert stats.totalHours == pytest.approx(raw.totalHours)
+    assert [point.numVisitors for point in stats.getBuildingUsage()] == \
+        [point.numVisitors for point in raw.getBuildingUsage()]
+    assert stats.getOccupancy(15, 0, 24) == raw.getOccupancy(15, 0, 24)
+
+
+def test_rollups_match_visits(theEngine):
+    with theEngine.dbConnect() as dbConnection:
+        assert theEngine.rollups.rolledThrough(dbConnection) == \
+            END.date() - datetime.timedelta(days=1)
+        assertSameStats(dbConnection, theEngine)
+
+
+def test_changed_days_are_redone(theEngine):
+    day = END.date() - datetime.timedelta(days=3)
+    with theEngine.dbConnect() as dbConnection:
+        (version, ) = dbConnection.execute(
+            'SELECT version FROM rollup_days WHERE day = ?', (day.isoformat(), )).fetchone()
+        dbConnection.execute(
+            "INSERT INTO visits(start, leave, barcode, status) VALUES (?, ?, '100001', 'Out')",
+            (datetime.datetime.combine(day, datetime.time(10)),
+             datetime.datetime.combine(day, datetime.time(15))))
+        assert theEngine.rollups.changedDays(dbConnection, BEGIN, END.date()) == [day]
+        # read from visits until the day is redone
+        assertSameStats(dbConnection, theEngine)
+        theEngine.rollups.update(dbConnection)
+        assert theEngine.rollups.changedDays(dbConnection, BEGIN, END.date()) == []
+        assert dbConnection.execute(
+            'SELECT version FROM rollup_days WHERE day = ?',
+            (day.isoformat(), )).fetchone()[0] == version + 1
+        assertSameStats(dbConnection, theEngine)
+
+
+def test_only_known_visits_once_are_rolled_up(theEngine):
+    day = END.date() - datetime.timedelta(days=3)
+    with theEngine.dbConnect() as dbConnection:
+        # a barcode that is neither a member nor a guest, and a duplicate
+        dbConnection.execute(
+            "INSERT INTO visits(start, leave, barcode, status) VALUES (?, ?, 'unknown', 'Out')",
+            (datetime.datetime.combine(day, datetime.time(11)),
+             datetime.datetime.combine(day, datetime.time(13, 30))))
+        dbConnection.execute(
+            '''INSERT INTO visits(start, leave, barcode, status)
+               SELECT start, leave, barcode, status FROM visits
+               WHERE date(start) = ? AND barcode IN (SELECT barcode FROM members)
+               LIMIT 1''', (day.isoformat(), ))
+        theEngine.rollups.update(dbConnection)
+        assert theEngine.rollups.changedDays(dbConnection, BEGIN, END.date()) == []
+        assertSameStats(dbConnection, theEngine)
+
+        # becoming a member brings their visits in
+        theEngine.members.injectData(dbConnection, [
+            {"barcode": "unknown", "displayName": "Un K", "firstName": "Un",
+             "lastName": "Known", "email": "unknown@example.com",
+             "membershipExpires": END}])
+        assert theEngine.rollups.changedDays(dbConnection, BEGIN, END.date()) == [day]
+        assertSameStats(dbConnection, theEngine)
+        theEngine.rollups.update(dbConnection)
+        stats = theEngine.reports.getStats(dbConnection, BEGIN.isoformat(),
+                                           END.date().isoformat())
+        assert 'unknown' in stats.visitors
+        assertSameStats(dbConnection, theEngine)
+
+
+def test_backfill(theEngine):
+    with theEngine.dbConnect() as dbConnection:
+        dbConnection.execute('DELETE FROM rollup_hours')
+        theEngine.rollups.backfill(dbConnection)
+        assertSameStats(dbConnection, theEngine)
+
+
+def test_graph_cache_follows_data_version(theEngine):
+    beginDate = BEGIN.isoformat()
+    past = (END.date() - datetime.timedelta(days=2)).isoformat()
+    today = END.date().isoformat()
+    with theEngine.dbConnect() as dbConnection:
+        graph = theEngine.reports.getBuildingUsageGraph(dbConnection, beginDate, past)
+        assert graph.startswith(b'\x89PNG')
+        assert theEngine.reports.getBuildingUsageGraph(dbConnection, beginDate, past) is graph
+        theEngine.reports.getBuildingUsageGraph(dbConnection, beginDate, today)
+        assert (theEngine.graphCache.hits, theEngine.graphCache.misses) == (1, 2)
+
+        # a visit today only changes ranges including today
+        dbConnection.execute(
+            "INSERT INTO visits(start, leave, barcode, status) VALUES (?, ?, '100001', 'In')",
+            (END, END))
+        theEngine.reports.getBuildingUsageGraph(dbConnection, beginDate, past)
+        theEngine.reports.getBuildingUsageGraph(dbConnection, beginDate, today)
+        assert (theEngine.graphCache.hits, theEngine.graphCache.misses) == (2, 3)
+
+        # as does fixing a visit on a day already rolled up
+        dbConnection.execute(
+            "UPDATE visits SET leave = datetime(leave, '+1 minute') WHERE date(start) = ?",
+            (past, ))
+        theEngine.reports.getBuildingUsageGraph(dbConnection, beginDate, past)
+        theEngine.rollups.update(dbConnection)
+        theEngine.reports.getBuildingUsageGraph(dbConnection, beginDate, past)
+        assert (theEngine.graphCache.hits, theEngine.graphCache.misses) == (2, 5)
+
+
+def test_stats_shared_until_visits_change(theEngine):
+    beginDate = BEGIN.isoformat()
+    today = END.date().isoformat()
+    with theEngine.dbConnect() as dbConnection:
+        stats = theEngine.reports.getStats(dbConnection, beginDate, today)
+        theEngine.reports.getBuildingUsageGraph(dbConnection, beginDate, today)
+        assert theEngine.reports.getStats(dbConnection, beginDate, today) is stats
+        assert theEngine.statsCache.misses == 1
+
+        dbConnection.execute(
+            "INSERT INTO visits(start, leave, barcode, status) VALUES (?, ?, '100001', 'In')",
+            (END, END))
+        assert theEngine.reports.getStats(dbConnection, beginDate, today) is not stats
+
+
+def test_trends_match_visits(theEngine):
+    firstMonth = BEGIN.replace(day=1)
+    thisMonth = END.date().replace(day=1)
+    with theEngine.dbConnect() as dbConnection:
+        (stored, ) = dbConnection.execute('SELECT count(*) FROM rollup_months').fetchone()
+        assert stored >= 1
+        trends = theEngine.reports.getTrends(dbConnection, firstMonth.isoformat(),
+                                             thisMonth.isoformat())
+        assert [month.month for month in trends][0] == firstMonth
+        assert trends[-1].month == thisMonth
+        for month in trends:
+            assert month == pytest.approx(theEngine.rollups.monthTotals(dbConnection, month.month))
+        assert sum(month.visits for month in trends) == dbConnection.execute(
+            '''SELECT count(*) FROM visits WHERE start >= ?
+               AND barcode IN (SELECT barcode FROM members UNION SELECT guest_id FROM guests)''',
+            (firstMonth, )).fetchone()[0]
+
+        # a change to a finished month shows up before and after it's redone
+        dbConnection.execute(
+            "INSERT INTO visits(start, leave, barcode, status) VALUES (?, ?, '100001', 'Out')",
+            (datetime.datetime.combine(firstMonth, datetime.time(10)),
+             datetime.datetime.combine(firstMonth, datetime.time(12))))
+        (before, ) = theEngine.reports.getTrends(dbConnection, firstMonth.isoformat(),
+                                                 firstMonth.isoformat())
+        assert before.visits == trends[0].visits + 1
+        theEngine.rollups.update(dbConnection)
+        assert dbConnection.execute('SELECT visits FROM rollup_months WHERE month = ?',
+                                    (firstMonth.isoformat(), )).fetchone()[0] == before.visits
@@ -6,6 +6,8 @@ class StationTest(CPtest.CPTest):
         with self.patch_session():
             self.getPage("/station/")
             self.assertStatus('200 OK')
+            self.assertInBody("new EventSource('/updateSSE?lastEventId=")
+            self.assertInBody('data-key="')
 
     def test_scanned_success(self):
         with self.patch_session():
@@ -34,8 +36,11 @@ class StationTest(CPtest.CPTest):
 
     def test_bulkUpdate(self):
         with self.patch_session():
+            self.getPage("/admin/emptyBuilding")
             self.getPage(
                 "/station/bulkUpdate?inBarcodes=100090+100091&outBarcodes=")
+            self.assertStatus('200 OK')
+            self.assertBody('Bulk Update success: 2 in, 0 out')
 
     def test_bulkUpdateAllOut(self):
         with self.patch_session():
@@ -43,8 +48,11 @@ class StationTest(CPtest.CPTest):
             self.getPage("/station/makeKeyholder?barcode=100091")
             self.getPage(
                 "/station/bulkUpdate?inBarcodes=100090+100091&outBarcodes=")
+            self.assertBody('Bulk Update success: 1 in, 0 out')
+            # the keyholder leaving is counted, having closed the building
             self.getPage(
                 "/station/bulkUpdate?inBarcodes=&outBarcodes=100090+100091")
+            self.assertBody('Bulk Update success: 0 in, 2 out')
 
     def test_scanned_bogus(self):
         with self.patch_session():
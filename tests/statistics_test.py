@@ -0,0 +1,191 @@
+import datetime
+import random
+import threading
+
+import pytest
+
+from engine import Engine
+from reports import BuildingUsage, MinuteOccupancy, Person, Statistics, Visit
+import numpy as np
+import syntheticData
+
+END = datetime.datetime(2021, 7, 31, 18, 30)
+
+
+def bruteForceCount(visits, start, end):
+    return sum(1 for visit in visits if visit.inRange(start, end))
+
+
+def test_building_usage_matches_brute_force():
+    rand = random.Random(0)
+    hour = datetime.timedelta(hours=1)
+    day = datetime.datetime(2021, 7, 1)
+    visits = []
+    usage = BuildingUsage()
+    for _ in range(500):
+        # whole hours so visits often start or leave right on a boundary
+        start = day + rand.randrange(0, 48) * hour / 2
+        leave = start + rand.randrange(-2, 10) * hour / 2
+        visits.append(Visit(start, leave))
+        usage.addVisit(start, leave)
+    periods = [(day + num * hour, day + (num + 1) * hour)
+               for num in range(30)]
+    assert usage.numVisitorsDuring(periods) == \
+        [bruteForceCount(visits, start, end) for (start, end) in periods]
+    assert usage.inRange(day + 10 * hour, day + 10 * hour) == \
+        bruteForceCount(visits, day + 10 * hour, day + 10 * hour)
+
+
+def test_statistics_building_usage(tmp_path):
+    theEngine = Engine(str(tmp_path) + '/', 'statistics.db', None)
+    theEngine.injectData(syntheticData.syntheticData(
+        members=50, guests=40, teams=1, certifications=0, keyholders=2,
+        visits=3000, years=0.25, end=END))
+    with theEngine.dbConnect() as dbConnection:
+        dbConnection.execute(
+            "INSERT INTO visits(start, leave, barcode, status) VALUES (?, ?, '100001', 'Out')",
+            (END - datetime.timedelta(hours=2), END - datetime.timedelta(hours=5)))
+        stats = theEngine.reports.getStats(dbConnection, '2021-07-01',
+                                           '2021-07-31')
+        visits = [Visit(row[0], row[1]) for row in dbConnection.execute(
+            '''SELECT start, leave FROM visits
+               WHERE start BETWEEN ? AND ?
+               AND barcode IN (SELECT barcode FROM members
+                               UNION SELECT guest_id FROM guests)''',
+            (datetime.datetime(2021, 7, 1), datetime.datetime(2021, 7, 31, 23, 59, 59)))]
+    points = stats.getBuildingUsage()
+    assert len(points) == 31 * 14
+    assert any(point.numVisitors for point in points)
+    assert [point.numVisitors for point in points] == \
+        [bruteForceCount(visits, point.startTime,
+                         point.startTime + datetime.timedelta(hours=1))
+         for point in points]
+    theEngine.close()
+
+
+def test_statistics_match_per_visit_totals(tmp_path):
+    theEngine = Engine(str(tmp_path) + '/', 'totals.db', None)
+    theEngine.injectData(syntheticData.syntheticData(
+        members=50, guests=40, teams=1, certifications=0, keyholders=2,
+        visits=3000, years=0.25, end=END))
+    with theEngine.dbConnect() as dbConnection:
+        # over a day long and leaving before starting, timedelta.seconds
+        # drops the days and wraps the negative
+        dbConnection.executemany(
+            "INSERT INTO visits(start, leave, barcode, status) VALUES (?, ?, '100001', 'Out')",
+            [(END - datetime.timedelta(hours=30), END - datetime.timedelta(hours=1)),
+             (END - datetime.timedelta(hours=2, microseconds=5), END - datetime.timedelta(hours=5))])
+        # without the rollups, which add up hours a day at a time
+        stats = Statistics(dbConnection, datetime.datetime(2021, 7, 1),
+                           datetime.datetime(2021, 7, 31, 23, 59, 59, 999999))
+        expected = {}
+        for (start, leave, name, barcode) in dbConnection.execute(
+                '''SELECT start, leave, displayName, visits.barcode FROM visits
+                   INNER JOIN members ON members.barcode = visits.barcode
+                   WHERE (start BETWEEN ? AND ?)
+                   UNION
+                   SELECT start, leave, displayName, visits.barcode FROM visits
+                   INNER JOIN guests ON guests.guest_id = visits.barcode
+                   WHERE (start BETWEEN ? AND ?)''',
+                (datetime.datetime(2021, 7, 1), datetime.datetime(2021, 7, 31, 23, 59, 59, 999999)) * 2):
+            if barcode in expected:
+                expected[barcode].addVisit(start, leave)
+            else:
+                expected[barcode] = Person(name, start, leave)
+    assert list(stats.visitors) == list(expected)
+    for (barcode, person) in expected.items():
+        assert stats.visitors[barcode].name == person.name
+        assert stats.visitors[barcode].hours == person.hours
+        assert stats.visitors[barcode].date == person.date
+    hours = sorted(person.hours for person in expected.values())
+    assert stats.totalHours == sum(person.hours for person in expected.values())
+    assert stats.medianTime == (hours[len(hours) // 2] if len(hours) % 2 else
+                                (hours[len(hours) // 2 - 1] + hours[len(hours) // 2]) / 2.0)
+    assert [person.hours for person in stats.sortedList] == sorted(hours, reverse=True)
+    theEngine.close()
+
+
+def test_minute_occupancy_matches_brute_force():
+    rand = random.Random(1)
+    day = datetime.datetime(2021, 7, 1)
+    visits = []
+    for _ in range(300):
+        start = day + datetime.timedelta(minutes=rand.randrange(0, 3 * 24 * 60),
+                                         seconds=rand.randrange(60))
+        visits.append((start, start + datetime.timedelta(minutes=rand.randrange(-30, 600))))
+    occupancy = MinuteOccupancy(day.date(), day.date() + datetime.timedelta(days=2))
+    occupancy.addVisits(np.array([start for (start, _) in visits], dtype='datetime64[us]'),
+                        np.array([leave for (_, leave) in visits], dtype='datetime64[us]'))
+
+    def minutesIn(start, leave):
+        (start, leave) = (start.replace(second=0, microsecond=0),
+                          leave.replace(second=0, microsecond=0))
+        if leave < start:
+            return {start}
+        return {start + datetime.timedelta(minutes=num)
+                for num in range(int((leave - start).total_seconds()) // 60 + 1)}
+    inVisits = [minutesIn(start, leave) for (start, leave) in visits]
+
+    for minutes in (5, 15, 60):
+        for point in occupancy.histogram(minutes, 7, 23):
+            bucket = {point.startTime + datetime.timedelta(minutes=num) for num in range(minutes)}
+            assert point.numVisitors == sum(1 for visit in inVisits if visit & bucket)
+            assert point.average == pytest.approx(
+                sum(len(visit & bucket) for visit in inVisits) / minutes)
+    assert len(occupancy.histogram(45, 8, 22)) == 3 * 19
+
+
+def test_minute_occupancy_batches_and_empty():
+    day = datetime.date(2021, 7, 1)
+    starts = np.array([datetime.datetime(2021, 7, 1, 9) + datetime.timedelta(hours=num)
+                       for num in range(30)], dtype='datetime64[us]')
+    leaves = starts + np.timedelta64(90, 'm')
+    together = MinuteOccupancy(day, day + datetime.timedelta(days=2))
+    together.addVisits(starts, leaves)
+    inBatches = MinuteOccupancy(day, day + datetime.timedelta(days=2))
+    for num in range(0, 30, 7):
+        inBatches.addVisits(starts[num:num + 7], leaves[num:num + 7])
+    assert inBatches.histogram(15) == together.histogram(15)
+    assert inBatches.mostAtOnce() == 2
+
+    empty = MinuteOccupancy(day, day)
+    assert [point.numVisitors for point in empty.histogram(60)] == [0] * 14
+    assert empty.mostAtOnce() == 0
+
+
+def test_shared_usage_and_occupancy_build_once():
+    rand = random.Random(2)
+    day = datetime.datetime(2021, 7, 1)
+    starts = np.array([day + datetime.timedelta(minutes=rand.randrange(0, 2 * 24 * 60))
+                       for _ in range(2000)], dtype='datetime64[us]')
+    leaves = starts + np.array([rand.randrange(-30, 600) for _ in range(2000)],
+                               dtype='timedelta64[m]')
+    periods = [(day + num * datetime.timedelta(hours=1),
+                day + (num + 1) * datetime.timedelta(hours=1)) for num in range(48)]
+
+    def filled():
+        usage = BuildingUsage()
+        usage.addVisits(starts, leaves)
+        occupancy = MinuteOccupancy(day.date(), day.date() + datetime.timedelta(days=1))
+        occupancy.addVisits(starts, leaves)
+        return (usage, occupancy)
+    (usage, occupancy) = filled()
+    expected = (usage.numVisitorsDuring(periods), occupancy.histogram(15, 0, 24))
+
+    for _ in range(5):
+        (usage, occupancy) = filled()
+        ready = threading.Barrier(4)
+        results = []
+
+        def read():
+            ready.wait()
+            results.append((usage.numVisitorsDuring(periods),
+                            occupancy.histogram(15, 0, 24)))
+        threads = [threading.Thread(target=read) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert results == [expected] * 4
+        # built once, so the counts weren't added again
+        assert len(occupancy.counts) == 1
@@ -0,0 +1,98 @@
+import datetime
+import threading
+from unittest.mock import patch
+
+from engine import Engine
+from statsCache import StatsCache
+import syntheticData
+
+
+def test_version_and_age_checked():
+    cache = StatsCache(2, ttl=60)
+    with patch('time.monotonic', return_value=100):
+        cache.put('range', 1, 'stats')
+        assert cache.get('range', 1) == 'stats'
+        assert cache.get('range', 2) is None
+        # the entry built from the old version is gone
+        assert cache.get('range', 1) is None
+        cache.put('range', 2, 'newer')
+    with patch('time.monotonic', return_value=150):
+        assert cache.get('range', 2) == 'newer'
+    with patch('time.monotonic', return_value=161):
+        assert cache.get('range', 2) is None
+    assert (cache.hits, cache.misses) == (2, 3)
+
+
+def test_least_recently_used_dropped():
+    cache = StatsCache(2)
+    cache.put('a', 1, 'A')
+    cache.put('b', 1, 'B')
+    assert cache.get('a', 1) == 'A'
+    cache.put('c', 1, 'C')
+    assert cache.get('b', 1) is None
+    assert cache.get('a', 1) == 'A'
+    assert cache.get('c', 1) == 'C'
+
+
+def test_bytes_bounded():
+    cache = StatsCache(8, maxBytes=100)
+    cache.put('a', 1, 'A', 40)
+    cache.put('b', 1, 'B', 40)
+    assert cache.get('a', 1) == 'A'
+    cache.put('c', 1, 'C', 40)
+    assert cache.get('b', 1) is None
+    assert cache.bytes == 80
+    # replacing an entry doesn't count it twice
+    cache.put('c', 1, 'C', 50)
+    assert cache.bytes == 90
+    # too big to keep at all
+    cache.put('d', 1, 'D', 101)
+    assert cache.get('d', 1) is None
+    assert cache.get('a', 2) is None
+    assert (sorted(cache.entries), cache.bytes) == (['c'], 50)
+
+
+def test_size_zero_is_off():
+    cache = StatsCache(0)
+    cache.put('a', 1, 'A')
+    assert cache.get('a', 1) is None
+
+
+def test_cached_statistics_shared_by_concurrent_readers(tmp_path):
+    end = datetime.datetime.combine(datetime.date.today(), datetime.time(18, 30))
+    theEngine = Engine(str(tmp_path) + '/', 'shared.db', None)
+    theEngine.injectData(syntheticData.syntheticData(
+        members=50, guests=40, teams=1, certifications=0, keyholders=2,
+        visits=2000, years=0.1, end=end))
+    (begin, last) = ((end - datetime.timedelta(days=20)).date().isoformat(),
+                     end.date().isoformat())
+
+    def read(dbConnection):
+        return (theEngine.reports.getUsageData(dbConnection, begin, last),
+                [point.numVisitors for point in theEngine.reports.getStats(
+                    dbConnection, begin, last).getOccupancy(15)])
+    with theEngine.dbConnect() as dbConnection:
+        expected = read(dbConnection)
+        theEngine.statsCache = StatsCache()
+        stats = theEngine.reports.getStats(dbConnection, begin, last)
+    # built before it was cached, keeping only the minute counts
+    assert stats.buildingUsage.isSorted
+    assert len(stats.minuteOccupancy.counts) == 1
+    assert not stats.minuteOccupancy.rollups
+    assert theEngine.statsCache.bytes == stats.approximateSize()
+
+    ready = threading.Barrier(4)
+    results = []
+
+    def readShared():
+        with theEngine.dbConnect() as dbConnection:
+            ready.wait()
+            results.append(read(dbConnection))
+    threads = [threading.Thread(target=readShared) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == [expected] * 4
+    assert theEngine.statsCache.hits >= 8
+    theEngine.close()
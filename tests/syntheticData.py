@@ -0,0 +1,309 @@
+"""
+Builds large, realistic looking data sets in the same format as sampleData
+(see injectingData.md) for load testing and benchmarks.
+
+The same seed and end time always give the same data.  Visits are returned
+as a generator so a few million of them don't have to sit in memory, and
+their times are already in the text form sqlite3 stores datetimes in.
+
+    python tests/syntheticData.py --visits 1000000 --years 3 data/big.db
+"""
+import argparse
+import bisect
+import datetime
+import math
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+FIRST_NAMES = ['Alex', 'Sam', 'Jordan', 'Taylor', 'Morgan', 'Casey', 'Riley',
+               'Jamie', 'Avery', 'Quinn', 'Drew', 'Parker', 'Reese', 'Rowan',
+               'Skyler', 'Dana', 'Emerson', 'Finley', 'Hayden', 'Kendall']
+LAST_NAMES = ['Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia',
+              'Miller', 'Davis', 'Martinez', 'Lopez', 'Wilson', 'Anderson',
+              'Thomas', 'Moore', 'Jackson', 'Martin', 'Lee', 'Thompson',
+              'White', 'Harris', 'Clark', 'Lewis', 'Walker', 'Young']
+WHERE_FOUND = ['invited', 'web search', 'newsletter', 'walked by', 'event',
+               'friend', '']
+PROGRAMS = ['FLL', 'FTC', 'FRC', 'TFI']
+
+FIRST_MEMBER_BARCODE = 100000
+NUM_TOOLS = 19
+CERTIFICATION_LEVELS = [1, 10, 20, 30, 40]
+CERTIFICATION_WEIGHTS = [30, 50, 10, 6, 4]
+
+# Share of a day's visits by guests, that forget to check out and that
+# happen on a weekend day
+GUEST_SHARE = 0.12
+FORGOT_SHARE = 0.03
+WEEKEND_FACTOR = 1.6
+
+OPENING_HOUR = 9
+CLOSING_HOUR = 23
+
+
+def randomFor(seed, area):
+    # Each area gets its own generator so changing one size doesn't shift
+    # the others
+    return random.Random(f'{seed}:{area}')
+
+
+def personName(rand):
+    first = rand.choice(FIRST_NAMES)
+    last = rand.choice(LAST_NAMES)
+    return (first, last, f'{first} {last[0]}')
+
+
+def makeMembers(seed, numMembers, end):
+    rand = randomFor(seed, 'members')
+    members = []
+    for num in range(numMembers):
+        (first, last, displayName) = personName(rand)
+        members.append({
+            "barcode": str(FIRST_MEMBER_BARCODE + num),
+            "displayName": displayName,
+            "firstName": first,
+            "lastName": last,
+            "email": f'{first}.{last}{num}@example.com'.lower(),
+            # most current, some lapsed
+            "membershipExpires": end + datetime.timedelta(days=rand.randint(-365, 365))
+        })
+    return members
+
+
+def makeGuests(seed, numGuests, begin, numDays):
+    """Guest ids follow Guests.add, YYYYMMDD and a count within the day"""
+    rand = randomFor(seed, 'guests')
+    days = sorted(rand.randrange(numDays) for _ in range(numGuests))
+    guests = []
+    numToday = 0
+    for (num, day) in enumerate(days):
+        numToday = numToday + 1 if num and days[num - 1] == day else 1
+        (first, last, displayName) = personName(rand)
+        date = begin + datetime.timedelta(days=day)
+        guests.append({
+            "guest_id": date.strftime("%Y%m%d") + '{0:04d}'.format(numToday),
+            "displayName": displayName,
+            "email": f'{first}.{last}.{num}@example.net'.lower(),
+            "firstName": first,
+            "lastName": last,
+            "whereFound": rand.choice(WHERE_FOUND),
+            "status": 1,
+            "newsletter": int(rand.random() < 0.3)
+        })
+    return guests
+
+
+def makeTeams(seed, numTeams, members, end):
+    rand = randomFor(seed, 'teams')
+    teams = []
+    for team_id in range(1, numTeams + 1):
+        season = end.year - rand.randrange(4)
+        students = rand.sample(members, min(len(members), rand.randint(4, 10)))
+        coaches = rand.sample(members, min(len(members), 2))
+        teamMembers = {member["barcode"]: 0 for member in students}
+        teamMembers.update({coach["barcode"]: 2 for coach in coaches})
+        teams.append({
+            "team_id": team_id,
+            "program_name": rand.choice(PROGRAMS),
+            "program_number": team_id,
+            "team_name": f'{rand.choice(LAST_NAMES)} Robotics {team_id}',
+            "start_date": datetime.datetime(season, 9, 1),
+            "active": int(season == end.year),
+            "members": [{"barcode": barcode, "type": memberType}
+                        for (barcode, memberType) in teamMembers.items()]
+        })
+    return teams
+
+
+def makeCertifications(seed, numCertifications, members, keyholders, begin, numDays):
+    rand = randomFor(seed, 'certifications')
+    certifications = []
+    for _ in range(numCertifications):
+        certifications.append({
+            "barcode": rand.choice(members)["barcode"],
+            "tool_id": rand.randint(1, NUM_TOOLS),
+            "level": rand.choices(CERTIFICATION_LEVELS, CERTIFICATION_WEIGHTS)[0],
+            "date": begin + datetime.timedelta(days=rand.randrange(numDays),
+                                               hours=rand.randint(OPENING_HOUR, CLOSING_HOUR - 1)),
+            "certifier": rand.choice(keyholders)
+        })
+    return certifications
+
+
+def timesAsText(day, seconds):
+    """Times as the text sqlite3 stores for a datetime, so the many visits
+       skip the datetime adapter which would take most of the load time"""
+    times = np.datetime64(day, 's') + seconds.astype('timedelta64[s]')
+    return [text.replace('T', ' ')
+            for text in np.datetime_as_string(times, unit='s').tolist()]
+
+
+def makeDay(rng, day, numVisits, memberWeights, barcodes, guestIds, keyholder, end):
+    """Visits and the unlock for one day, with keyholder opening and closing.
+       Weekday visits peak in the evening, weekend ones around midday."""
+    if day.weekday() >= 5:
+        hours = rng.normal(13.5, 2.5, numVisits)
+    else:
+        hours = rng.normal(18.5, 1.5, numVisits)
+    starts = np.sort((np.clip(hours, OPENING_HOUR, CLOSING_HOUR - 0.5)
+                      * 3600).astype(np.int64))
+    leaves = np.minimum(starts + rng.lognormal(8.6, 0.6, numVisits).astype(np.int64),
+                        int((CLOSING_HOUR + 0.5) * 3600))
+    people = barcodes[np.searchsorted(memberWeights,
+                                      rng.random(numVisits) * memberWeights[-1])]
+    if len(guestIds):
+        isGuest = rng.random(numVisits) < GUEST_SHARE
+        people[isGuest] = guestIds[rng.integers(
+            0, len(guestIds), np.count_nonzero(isGuest))]
+    opening = starts[0] - rng.integers(60, 20 * 60)
+    closing = leaves.max() + rng.integers(60, 15 * 60)
+    # emptyBuilding checks out the ones that forgot when the keyholder leaves
+    forgot = rng.random(numVisits) < FORGOT_SHARE
+    leaves[forgot] = closing
+    statuses = np.where(forgot, 'Forgot', 'Out')
+
+    starts = np.concatenate(([opening], starts))
+    leaves = np.concatenate(([closing], leaves))
+    people = np.concatenate(([keyholder], people))
+    statuses = np.concatenate((['Out'], statuses))
+    visits = [list(visit) for visit in zip(
+        timesAsText(day, starts), timesAsText(day, leaves),
+        people.tolist(), statuses.tolist())]
+    endText = str(end)
+    if visits[0][1] > endText:
+        # today, whoever hasn't left yet is still in, but only once
+        visits = [visit for visit in visits if visit[0] <= endText]
+        present = set()
+        for visit in visits:
+            if visit[1] > endText:
+                visit[1] = visit[0]
+                visit[3] = 'Out' if visit[2] in present else 'In'
+                present.add(visit[2])
+    if not visits:
+        return ([], None)
+    unlock = {"time": datetime.datetime.fromisoformat(visits[0][0]),
+              "location": "TFI", "barcode": keyholder}
+    return (visits, unlock)
+
+
+def makeVisits(seed, numVisits, begin, numDays, members, guests, keyholders,
+               end, unlocks):
+    """Generator of visits, appending the daily unlocks to `unlocks`"""
+    rand = randomFor(seed, 'visits')
+    # numpy for the bulk of the numbers, it is a lot faster per visit
+    rng = np.random.default_rng(rand.getrandbits(64))
+    barcodes = np.array([member["barcode"] for member in members], dtype=object)
+    # a few regulars make most of the visits
+    memberWeights = np.cumsum(rng.pareto(1.2, len(barcodes)) + 1)
+    guestDays = [guest["guest_id"][:8] for guest in guests]
+    guestIds = np.array([guest["guest_id"] for guest in guests], dtype=object)
+    numWeekendDays = sum(1 for day in range(numDays)
+                         if (begin + datetime.timedelta(days=day)).weekday() >= 5)
+    perDay = numVisits / (numDays - numWeekendDays +
+                          numWeekendDays * WEEKEND_FACTOR)
+    keyholder = rand.choice(keyholders)
+    for num in range(numDays):
+        day = begin + datetime.timedelta(days=num)
+        if day > end:
+            return
+        mean = perDay * (WEEKEND_FACTOR if day.weekday() >= 5 else 1)
+        numToday = max(2, int(rand.gauss(mean, math.sqrt(mean)) + 0.5))
+        # guests visit in the month after they signed up
+        firstGuest = bisect.bisect_left(
+            guestDays, (day - datetime.timedelta(days=30)).strftime("%Y%m%d"))
+        lastGuest = bisect.bisect_right(guestDays, day.strftime("%Y%m%d"))
+        if rand.random() < 0.2:
+            # keyholders rotate every few days
+            keyholder = rand.choice(keyholders)
+        (visits, unlock) = makeDay(rng, day, numToday - 1, memberWeights,
+                                   barcodes, guestIds[firstGuest:lastGuest],
+                                   keyholder, end)
+        if unlock:
+            unlocks.append(unlock)
+        for (start, leave, barcode, status) in visits:
+            if status == 'In':
+                yield {"start": start, "barcode": barcode, "status": status}
+            else:
+                yield {"start": start, "leave": leave, "barcode": barcode,
+                       "status": status}
+
+
+def syntheticData(seed=0, members=500, guests=2000, teams=20,
+                  certifications=2000, keyholders=4, visits=100000, years=3,
+                  end=None):
+    """
+    Data for Engine.injectData covering `years` up to `end` (default now).
+
+    Visits are spread over the days with weekday evening and weekend midday
+    peaks, with some guests and some forgotten check outs.  Keyholders take
+    turns opening, which makes an unlock, and staying to close.  Unlocks are
+    filled in as the visits are generated, so inject visits first.
+    """
+    if end is None:
+        end = datetime.datetime.now().replace(microsecond=0)
+    begin = (end - datetime.timedelta(days=int(365 * years))).replace(
+        hour=0, minute=0, second=0, microsecond=0)
+    numDays = (end - begin).days + 1
+
+    memberList = makeMembers(seed, max(members, keyholders), end)
+    keyholderList = [member["barcode"] for member in memberList[:keyholders]]
+    guestList = makeGuests(seed, guests, begin, numDays)
+    unlocks = []
+    return {
+        "visits": makeVisits(seed, visits, begin, numDays, memberList,
+                             guestList, keyholderList, end, unlocks),
+        "members": memberList,
+        "guests": guestList,
+        "teams": makeTeams(seed, teams, memberList, end),
+        "certifications": makeCertifications(seed, certifications, memberList,
+                                              keyholderList, begin, numDays),
+        "accounts": [{"user": "admin", "password": "password",
+                      "barcode": keyholderList[0], "role": 0xFF}] +
+                    [{"user": f"keyholder{num}", "password": "password",
+                      "barcode": barcode, "role": 0x10}
+                     for (num, barcode) in enumerate(keyholderList[1:], 1)],
+        "unlocks": unlocks,
+        "config": [{"key": "grace_period", "value": "15"}]
+    }
+
+
+def buildDatabase(path, **sizes):
+    """Creates a new database file at path filled with syntheticData"""
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+    from engine import Engine
+
+    if os.path.exists(path):
+        raise FileExistsError(path)
+    (dbPath, dbName) = os.path.split(os.path.abspath(path))
+    # the database is thrown away if the build fails, so skip the syncing
+    theEngine = Engine(dbPath + '/', dbName, None,
+                       pragmas={'synchronous': 'OFF', 'cache_size': -256000})
+    theEngine.injectData(syntheticData(**sizes))
+    theEngine.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Build a CheckMeIn database full of synthetic data')
+    parser.add_argument('database', help='database file to create')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--members', type=int, default=500)
+    parser.add_argument('--guests', type=int, default=2000)
+    parser.add_argument('--teams', type=int, default=20)
+    parser.add_argument('--certifications', type=int, default=2000)
+    parser.add_argument('--keyholders', type=int, default=4)
+    parser.add_argument('--visits', type=int, default=100000)
+    parser.add_argument('--years', type=float, default=3)
+    args = vars(parser.parse_args())
+    path = args.pop('database')
+    began = time.perf_counter()
+    buildDatabase(path, **args)
+    print(f'Built {path} in {time.perf_counter() - began:.1f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,40 @@
+import datetime
+
+from engine import Engine
+import syntheticData
+
+END = datetime.datetime(2021, 7, 31, 18, 30)
+SIZES = {'members': 50, 'guests': 40, 'teams': 3, 'certifications': 30,
+         'keyholders': 2, 'visits': 3000, 'years': 0.5, 'end': END}
+
+
+def test_same_seed_same_data():
+    first = syntheticData.syntheticData(seed=1, **SIZES)
+    second = syntheticData.syntheticData(seed=1, **SIZES)
+    other = syntheticData.syntheticData(seed=2, **SIZES)
+    visits = list(first["visits"])
+    assert visits == list(second["visits"])
+    assert visits != list(other["visits"])
+    assert first["unlocks"] == second["unlocks"]
+    assert first["members"] == second["members"]
+
+
+def test_inject_synthetic_data(tmp_path):
+    theEngine = Engine(str(tmp_path) + '/', 'synthetic.db', None)
+    theEngine.injectData(syntheticData.syntheticData(**SIZES))
+    with theEngine.dbConnect() as dbConnection:
+        statuses = dict(dbConnection.execute(
+            "SELECT status, count(*) FROM visits GROUP BY status").fetchall())
+        assert 2500 < sum(statuses.values()) < 3500
+        assert statuses['Forgot'] > 0
+        assert statuses['In'] == theEngine.reports.numberPresent(dbConnection)
+        (last, ) = dbConnection.execute(
+            "SELECT max(start) FROM visits").fetchone()
+        assert last <= str(END)
+        # one unlock for each day the building was opened
+        (numDays, ) = dbConnection.execute(
+            "SELECT count(DISTINCT date(start)) FROM visits").fetchone()
+        (numUnlocks, ) = dbConnection.execute(
+            "SELECT count(*) FROM unlocks").fetchone()
+        assert numUnlocks == numDays
+    theEngine.close()
@@ -11,12 +11,15 @@ class Unlocks(object):
                                  (time TIMESTAMP,
                                   location TEXT,
                                   barcode TEXT)''')
+        if db_schema_version < 17:
+            dbConnection.execute(
+                'CREATE INDEX unlocks_time ON unlocks(time)')
 
     def injectData(self, dbConnection, data):
-        for datum in data:
-            dbConnection.execute(
-                '''INSERT INTO unlocks(time, location, barcode) VALUES(?,?,?)''',
-                (datum["time"], datum["location"], datum["barcode"]))
+        dbConnection.executemany(
+            '''INSERT INTO unlocks(time, location, barcode) VALUES(?,?,?)''',
+            ((datum["time"], datum["location"], datum["barcode"])
+             for datum in data))
 
     def addEntry(self, dbConnection, location, barcode):
         dbConnection.execute(
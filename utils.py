@@ -1,4 +1,6 @@
 from email.mime.text import MIMEText
+import csv
+import io
 import email.utils
 import smtplib
 
@@ -21,3 +23,17 @@ def sendEmail(toName, toEmail, subject, message, ccName="", ccEmail=""):
         server.quit()
     except IOError:
         print('Email would have been:', msg)
+
+
+def csvChunks(header, rows, rowsPerChunk=1000):
+    """Yields rows as CSV in UTF-8 a chunk at a time, for streaming"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    for (num, row) in enumerate(rows, 1):
+        writer.writerow(row)
+        if num % rowsPerChunk == 0:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
@@ -4,49 +4,157 @@ import os
 from dateutil import parser
 from members import Members
 from guests import Guests
-from reports import Reports
+from reports import RELOAD, Reports
 from teams import Teams
 from customReports import CustomReports
 from certifications import Certifications
 
 
 class Visits(object):
+    def __init__(self, engine):
+        self.engine = engine
+
     def migrate(self, dbConnection, db_schema_version):
         if db_schema_version == 0:
             dbConnection.execute('''CREATE TABLE visits
                      (start timestamp, leave timestamp, barcode text, status text)'''
                                  )
+        if db_schema_version < 17:
+            self.createIndexes(dbConnection)
+            # so the planner knows how few visits are 'In'
+            dbConnection.execute('ANALYZE visits')
+        if db_schema_version < 18:
+            # Who is in the building, kept in step with visits by triggers so
+            # finding them doesn't depend on how much history there is
+            dbConnection.execute('''CREATE TABLE presence
+                                 (visit_id INTEGER PRIMARY KEY,
+                                  barcode TEXT,
+                                  start TIMESTAMP)''')
+            dbConnection.execute(
+                'CREATE INDEX presence_barcode ON presence(barcode)')
+            self.createPresenceTriggers(dbConnection)
+            dbConnection.execute('''INSERT INTO presence(visit_id, barcode, start)
+                SELECT rowid, barcode, start FROM visits WHERE status = 'In' ''')
+        if db_schema_version < 21:
+            self.createForgotIndex(dbConnection)
+        if db_schema_version < 23:
+            # presence refers to visits by rowid, which VACUUM may renumber
+            # unless it is an INTEGER PRIMARY KEY, so give visits one
+            dbConnection.execute('''CREATE TABLE visits_keyed
+                     (start timestamp, leave timestamp, barcode text, status text,
+                      visit_id INTEGER PRIMARY KEY)''')
+            dbConnection.execute('''INSERT INTO visits_keyed(visit_id, start, leave, barcode, status)
+                SELECT rowid, start, leave, barcode, status FROM visits''')
+            dbConnection.execute('DROP TABLE visits')
+            dbConnection.execute('ALTER TABLE visits_keyed RENAME TO visits')
+            self.createIndexes(dbConnection)
+            self.createForgotIndex(dbConnection)
+            self.createPresenceTriggers(dbConnection)
+            dbConnection.execute('ANALYZE visits')
+
+    def createIndexes(self, dbConnection):
+        dbConnection.execute('''CREATE INDEX visits_barcode_in ON visits(barcode)
+                                WHERE status = 'In' ''')
+        dbConnection.execute(
+            'CREATE INDEX visits_start ON visits(start)')
+        dbConnection.execute(
+            'CREATE INDEX visits_barcode_start ON visits(barcode, start)')
+
+    def createForgotIndex(self, dbConnection):
+        # the days with forgotten check outs, counted from the index alone
+        dbConnection.execute('''CREATE INDEX visits_forgot_day ON visits(date(start))
+                                WHERE status = 'Forgot' ''')
+
+    def createPresenceTriggers(self, dbConnection):
+        dbConnection.execute('''CREATE TRIGGER visits_presence_insert
+            AFTER INSERT ON visits WHEN NEW.status = 'In'
+            BEGIN
+                INSERT OR REPLACE INTO presence(visit_id, barcode, start)
+                VALUES (NEW.rowid, NEW.barcode, NEW.start);
+            END''')
+        dbConnection.execute('''CREATE TRIGGER visits_presence_update
+            AFTER UPDATE OF start, barcode, status ON visits
+            BEGIN
+                DELETE FROM presence WHERE visit_id = OLD.rowid;
+                INSERT INTO presence(visit_id, barcode, start)
+                SELECT NEW.rowid, NEW.barcode, NEW.start
+                WHERE NEW.status = 'In';
+            END''')
+        dbConnection.execute('''CREATE TRIGGER visits_presence_delete
+            AFTER DELETE ON visits
+            BEGIN
+                DELETE FROM presence WHERE visit_id = OLD.rowid;
+            END''')
 
     def injectData(self, dbConnection, data):
-        for datum in data:
-            if "leave" in datum:
-                dbConnection.execute("INSERT INTO visits VALUES (?,?,?,?)",
-                                     (datum["start"], datum["leave"],
-                                      datum["barcode"], datum["status"]))
-            else:
-                dbConnection.execute("INSERT INTO visits VALUES (?,?,?,?)",
-                                     (datum["start"], datum["start"],
-                                      datum["barcode"], datum["status"]))
+        dbConnection.executemany(
+            "INSERT INTO visits(start, leave, barcode, status) VALUES (?,?,?,?)",
+            ((datum["start"], datum.get("leave", datum["start"]),
+              datum["barcode"], datum["status"])
+             for datum in data))
 
     def inBuilding(self, dbConnection, barcode):
+        if self.engine.occupancy.enabled:
+            return self.engine.occupancy.isPresent(barcode)
         data = dbConnection.execute(
-            "SELECT * FROM visits WHERE (barcode==?) and (status=='In')",
+            "SELECT * FROM presence WHERE (barcode==?)",
             (barcode, )).fetchone()
         return data != None
 
     def enterGuest(self, dbConnection, guest_id):
         now = datetime.datetime.now()
-        dbConnection.execute('''
+        if dbConnection.execute('''
             INSERT INTO visits(start, leave, barcode, status) 
             SELECT ?, ?, ?, 'In'
-            WHERE NOT EXISTS (SELECT 1 FROM visits WHERE (barcode == ?) AND (status == 'In'))''',
-                             (now, now, guest_id, guest_id))
+            WHERE NOT EXISTS (SELECT 1 FROM presence WHERE (barcode == ?))''',
+                                (now, now, guest_id, guest_id)).rowcount:
+            self.engine.changed(guest_id, now, 'In')
+        self.engine.presenceChanged(dbConnection, [guest_id])
 
     def leaveGuest(self, dbConnection, guest_id):
         now = datetime.datetime.now()
-        dbConnection.execute(
+        if dbConnection.execute(
             "UPDATE visits SET leave = ?, status = 'Out' WHERE (barcode==?) AND (status=='In')",
-            (now, guest_id))
+                (now, guest_id)).rowcount:
+            self.engine.changed(guest_id, now, 'Out')
+        self.engine.presenceChanged(dbConnection, [guest_id])
+        self.engine.rollups.update(dbConnection)
+
+    def checkInMembers(self, dbConnection, barcodes):
+        now = datetime.datetime.now()
+        present = self.presentAmong(dbConnection, barcodes)
+        arriving = [barcode for barcode in dict.fromkeys(barcodes)
+                    if barcode not in present]
+        dbConnection.executemany('''
+            INSERT INTO visits(start, leave, barcode, status)
+            SELECT ?, ?, ?, 'In'
+            WHERE NOT EXISTS (SELECT 1 FROM presence WHERE (barcode == ?))''',
+                                 [(now, now, barcode, barcode) for barcode in arriving])
+        for barcode in arriving:
+            self.engine.changed(barcode, now, 'In')
+        self.engine.presenceChanged(dbConnection, arriving)
+
+    def checkOutMembers(self, dbConnection, barcodes):
+        now = datetime.datetime.now()
+        present = self.presentAmong(dbConnection, barcodes)
+        leaving = [barcode for barcode in dict.fromkeys(barcodes)
+                   if barcode in present]
+        dbConnection.execute(
+            f"""UPDATE visits SET leave = ?, status = 'Out'
+                WHERE (status=='In') AND barcode IN ({','.join('?' * len(leaving))})""",
+            (now, *leaving))
+        for barcode in leaving:
+            self.engine.changed(barcode, now, 'Out')
+        self.engine.presenceChanged(dbConnection, leaving)
+        self.engine.rollups.update(dbConnection)
+
+    def presentAmong(self, dbConnection, barcodes):
+        present = set()
+        for row in dbConnection.execute(
+                f"SELECT barcode FROM presence WHERE barcode IN ({','.join('?' * len(barcodes))})",
+                tuple(barcodes)):
+            present.add(row[0])
+        return present
 
     def checkInMember(self, dbConnection, barcode):
         # For now members and guests are the same
@@ -66,15 +174,20 @@ class Visits(object):
         if data is None:
             return 'Invalid barcode: ' + barcode
         data = dbConnection.execute(
-            "SELECT * FROM visits WHERE (barcode==?) and (status=='In')",
+            "SELECT * FROM presence WHERE (barcode==?)",
             (barcode, )).fetchone()
         if data is None:
-            dbConnection.execute("INSERT INTO visits VALUES (?,?,?,'In')",
-                                 (now, now, barcode))
+            dbConnection.execute(
+                "INSERT INTO visits(start, leave, barcode, status) VALUES (?,?,?,'In')",
+                (now, now, barcode))
+            self.engine.changed(barcode, now, 'In')
         else:
             dbConnection.execute(
                 "UPDATE visits SET leave = ?, status = 'Out' WHERE " +
                 "(barcode==?) AND (status=='In')", (now, barcode))
+            self.engine.changed(barcode, now, 'Out')
+            self.engine.rollups.update(dbConnection)
+        self.engine.presenceChanged(dbConnection, [barcode])
         return ''
 
     def emptyBuilding(self, dbConnection, keyholder_barcode):
@@ -86,6 +199,9 @@ class Visits(object):
             dbConnection.execute(
                 "UPDATE visits SET status = 'Out' WHERE barcode==? AND leave==?",
                 (keyholder_barcode, now))
+        self.engine.presenceChanged(dbConnection)
+        self.engine.changed(description=RELOAD)
+        self.engine.rollups.update(dbConnection)
 
     def oopsForgot(self, dbConnection):
         now = datetime.datetime.now()
@@ -93,13 +209,20 @@ class Visits(object):
         dbConnection.execute(
             "UPDATE visits SET status = 'In' WHERE status=='Forgot' AND leave > ?",
             (startDate, ))
+        self.engine.presenceChanged(dbConnection)
+        self.engine.changed(description=RELOAD)
+        self.engine.rollups.update(dbConnection)
 
     def getMembersInBuilding(self, dbConnection):
         listPresent = []
-        for row in dbConnection.execute('''SELECT displayName, visits.barcode
-            FROM visits
-            INNER JOIN members ON members.barcode = visits.barcode
-            WHERE visits.status=='In'
+        if self.engine.occupancy.enabled:
+            for occupant in self.engine.occupancy.getOccupants():
+                if not occupant.isGuest:
+                    listPresent.append([occupant.displayName, occupant.barcode])
+            return listPresent
+        for row in dbConnection.execute('''SELECT displayName, presence.barcode
+            FROM presence
+            INNER JOIN members ON members.barcode = presence.barcode
             ORDER BY displayName'''):
             listPresent.append([row[0], row[1]])
         return listPresent
@@ -122,3 +245,6 @@ class Visits(object):
                     '''UPDATE visits SET start = ?, leave = ?, status = 'Out'
                         WHERE (visits.rowid==?)''',
                     (newStart, newLeave, rowID))
+        self.engine.presenceChanged(dbConnection)
+        self.engine.changed(description=RELOAD)
+        self.engine.rollups.update(dbConnection)
@@ -20,9 +20,7 @@ class WebAdminStation(WebBase):
         self.checkPermissions()
 
         with self.dbConnect() as dbConnection:
-            forgotDates = []
-            for date in self.engine.reports.getForgottenDates(dbConnection):
-                forgotDates.append(date.isoformat())
+            forgotDates = self.engine.reports.getForgottenDates(dbConnection)
             teamList = self.engine.teams.getActiveTeamList(dbConnection)
             lastBulkUpdateName = None
             (lastBulkUpdateDate, barcode) = self.engine.logEvents.getLastEvent(dbConnection,
@@ -40,28 +38,42 @@ class WebAdminStation(WebBase):
                              username=Cookie('username').get(''))
 
     @cherrypy.expose
-    def emptyBuilding(self):
+    def database(self):
+        self.checkPermissions()
         with self.dbConnect() as dbConnection:
-            self.engine.visits.emptyBuilding(dbConnection, "")
-            self.engine.accounts.removeKeyholder(dbConnection)
+            settings = self.engine.getDatabaseSettings(dbConnection)
+        return self.template('database.mako', settings=settings,
+                             poolSize=self.engine.pool.size,
+                             numConnections=self.engine.pool.numConnections(),
+                             occupancy=self.engine.occupancy)
+
+    @cherrypy.expose
+    def sqlStats(self, reset=False):
+        self.checkPermissions()
+        if reset:
+            cherrypy.tools.sqlstats.reset()
+            raise cherrypy.HTTPRedirect("/admin/sqlStats")
+        return self.template('sqlStats.mako',
+                             instrumented=self.engine.instrumented,
+                             pages=cherrypy.tools.sqlstats.getPages())
+
+    @cherrypy.expose
+    def emptyBuilding(self):
+        self.engine.write(self.engine.closeBuilding, "")
         return "Building Empty"
 
     @cherrypy.expose
     def setGracePeriod(self, grace):
         self.checkPermissions()
-        with self.dbConnect() as dbConnection:
-            self.engine.config.update(dbConnection, "grace_period", grace)
-            self.engine.logEvents.addEvent(
-                dbConnection, "Grace changed", self.getBarcode("/admin"))
+        self.engine.write(self.engine.setGracePeriod, grace,
+                          self.getBarcode("/admin"))
         return self.index()
 
     @cherrypy.expose
     def bulkAddMembers(self, csvfile):
         self.checkPermissions()
-        with self.dbConnect() as dbConnection:
-            error = self.engine.members.bulkAdd(dbConnection, csvfile)
-            self.engine.logEvents.addEvent(
-                dbConnection, "Bulk Add", self.getBarcode("/admin"))
+        error = self.engine.write(self.engine.bulkAddMembers, csvfile,
+                                  self.getBarcode("/admin"))
 
         return self.index(error)
 
@@ -75,23 +87,19 @@ class WebAdminStation(WebBase):
     @cherrypy.expose
     def oops(self):
         super().checkPermissions(Role.KEYHOLDER, "/")
-        with self.dbConnect() as dbConnection:
-            self.engine.visits.oopsForgot(dbConnection)
+        self.engine.write(self.engine.visits.oopsForgot)
         return self.index('Oops is fixed. :-)')
 
     @cherrypy.expose
     def updatePresent(self, checked_out):
         super().checkPermissions(Role.KEYHOLDER, "/")
-        with self.dbConnect() as dbConnection:
-            
-            self.engine.visits.oopsForgot(dbConnection)
+        self.engine.write(self.engine.visits.oopsForgot)
         return self.index('Oops is fixed. :-)')
 
     @cherrypy.expose
     def fixed(self, output):
         self.checkPermissions()
-        with self.dbConnect() as dbConnection:
-            self.engine.visits.fix(dbConnection, output)
+        self.engine.write(self.engine.visits.fix, output)
         return self.index()
 
     @cherrypy.expose
@@ -150,24 +158,19 @@ class WebAdminStation(WebBase):
         if user == "":
             error = "Username must not be blank"
             return self.users(error)
-        with self.dbConnect() as dbConnection:
-            chars = 'ABCDEFGHJKMNPQRSTUVWXYZ23456789'
-            tempPassword = ''.join(random.SystemRandom().choice(chars)
-                                   for _ in range(12))
-            role = Role()
-            role.setAdmin(admin)
-            role.setKeyholder(keyholder)
-            role.setShopCertifier(certifier)
-            role.setCoach(coach)
-            role.setShopSteward(steward)
-            try:
-                self.engine.accounts.addUser(
-                    dbConnection, user, tempPassword, barcode, role)
-                email = self.engine.accounts.forgotPassword(dbConnection, user)
-                self.engine.logEvents.addEvent(dbConnection,
-                                               "Forgot password request", f"{email} for {user}")
-            except sqlite3.IntegrityError:
-                error = "Username already in use"
+        chars = 'ABCDEFGHJKMNPQRSTUVWXYZ23456789'
+        tempPassword = ''.join(random.SystemRandom().choice(chars)
+                               for _ in range(12))
+        role = Role()
+        role.setAdmin(admin)
+        role.setKeyholder(keyholder)
+        role.setShopCertifier(certifier)
+        role.setCoach(coach)
+        role.setShopSteward(steward)
+        try:
+            self.engine.addUser(user, tempPassword, barcode, role)
+        except sqlite3.IntegrityError:
+            error = "Username already in use"
         return self.users(error)
 
     @cherrypy.expose
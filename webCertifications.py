@@ -33,10 +33,9 @@ class WebCertifications(WebBase):
         certifier_id = self.getBarcode("/certifications/certify")
         # We don't check here for valid tool since someone is forging HTML to put an invalid one
         # and we'll catch it with the email out...\
+        self.engine.write(self.engine.certifications.addNewCertification,
+                          member_id, tool_id, level, certifier_id)
         with self.dbConnect() as dbConnection:
-            self.engine.certifications.addNewCertification(dbConnection,
-                                                           member_id, tool_id, level, certifier_id)
-        with self.dbConnect() as dbConnection:  # separate out committing from getting
             memberName = self.engine.members.getName(
                 dbConnection, member_id)[1]
             certifierName = self.engine.members.getName(
@@ -22,15 +22,13 @@ class WebGuestStation(WebBase):
             return self.showGuestPage('First name limited to 32 characters')
 
         displayName = first + ' ' + last[0] + '.'
-        with self.dbConnect() as dbConnection:
-            if reason != '':
-                guest_id = self.engine.guests.add(dbConnection,
-                                                  displayName, first, last, email, reason, newsletter)
-            else:
-                guest_id = self.engine.guests.add(dbConnection,
-                                                  displayName, first, last, email, 'Other: ' + other_reason, newsletter)
-            self.engine.visits.enterGuest(dbConnection, guest_id)
-            return self.showGuestPage('Welcome ' + displayName + '  We are glad you are here!')
+        if reason != '':
+            self.engine.write(self.engine.addGuest,
+                              displayName, first, last, email, reason, newsletter)
+        else:
+            self.engine.write(self.engine.addGuest,
+                              displayName, first, last, email, 'Other: ' + other_reason, newsletter)
+        return self.showGuestPage('Welcome ' + displayName + '  We are glad you are here!')
 
     @cherrypy.expose
     def index(self):
@@ -38,8 +36,8 @@ class WebGuestStation(WebBase):
 
     @cherrypy.expose
     def leaveGuest(self, guest_id, comments=""):
+        self.engine.write(self.engine.visits.leaveGuest, guest_id)
         with self.dbConnect() as dbConnection:
-            self.engine.visits.leaveGuest(dbConnection, guest_id)
             (error, name) = self.engine.guests.getName(dbConnection, guest_id)
         if error:
             return self.showGuestPage(error)
@@ -53,8 +51,8 @@ class WebGuestStation(WebBase):
 
     @cherrypy.expose
     def returnGuest(self, guest_id):
+        self.engine.write(self.engine.visits.enterGuest, guest_id)
         with self.dbConnect() as dbConnection:
-            self.engine.visits.enterGuest(dbConnection, guest_id)
             (error, name) = self.engine.guests.getName(dbConnection, guest_id)
             if error:
                 return self.showGuestPage(error)
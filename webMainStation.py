@@ -6,9 +6,16 @@ KEYHOLDER_BARCODE = '999901'
 
 
 class WebMainStation(WebBase):
+    def __init__(self, lookup, engine, broadcaster=None):
+        super().__init__(lookup, engine)
+        self.broadcaster = broadcaster
+
     # STATION
     @cherrypy.expose
     def index(self, error=''):
+        # before reading, so updates made meanwhile are sent rather than
+        # missed, the page skips rows it already has
+        lastEventId = self.broadcaster.lastId if self.broadcaster else ''
         with self.dbConnect() as dbConnection:
             (_, keyholder_name) = self.engine.accounts.getActiveKeyholder(dbConnection)
 
@@ -20,6 +27,7 @@ class WebMainStation(WebBase):
                                  uniqueVisitorsToday=self.engine.reports.uniqueVisitorsToday(
                                      dbConnection),
                                  keyholder_name=keyholder_name,
+                                 lastEventId=lastEventId,
                                  stewards=self.engine.accounts.getPresentWithRole(
                                      dbConnection, Role.SHOP_STEWARD),
                                  error=error)
@@ -41,10 +49,7 @@ class WebMainStation(WebBase):
                     else:
                         return self.template('keyholder.mako', whoIsHere=whoIsHere)
                 else:
-                    error = self.engine.visits.scannedMember(dbConnection, bc)
-                    if not current_keyholder_bc:
-                        self.engine.accounts.setActiveKeyholder(
-                            dbConnection, bc)
+                    error = self.engine.write(self.engine.scanMember, bc)
                     if error:
                         cherrypy.log(error)
         raise cherrypy.HTTPRedirect("/station")
@@ -52,8 +57,7 @@ class WebMainStation(WebBase):
     @cherrypy.expose
     def checkin(self, barcode, called=False):
         inBarcodeList = barcode.split()
-        with self.dbConnect() as dbConnection:
-            self.engine.checkin(dbConnection, inBarcodeList)
+        self.engine.write(self.engine.checkin, inBarcodeList)
         if not called:
             raise cherrypy.HTTPRedirect(f"/links?barcode={inBarcodeList[0]}")
 
@@ -63,32 +67,31 @@ class WebMainStation(WebBase):
         with self.dbConnect() as dbConnection:
             (current_keyholder_bc, _) = self.engine.accounts.getActiveKeyholder(
                 dbConnection)
-            leaving_keyholder_bc = self.engine.checkout(
-                dbConnection, current_keyholder_bc, outBarcodeList)
+        leaving_keyholder_bc = self.engine.write(
+            self.engine.checkout, current_keyholder_bc, outBarcodeList)
 
-        with self.dbConnect() as dbConnection:
-            if leaving_keyholder_bc:
-                self.engine.visits.emptyBuilding(
-                    dbConnection, leaving_keyholder_bc)
-                self.engine.accounts.removeKeyholder(dbConnection)
+        if leaving_keyholder_bc:
+            self.engine.write(self.engine.closeBuilding, leaving_keyholder_bc)
         if not called:
             raise cherrypy.HTTPRedirect(f"/links?barcode={outBarcodeList[0]}")
 
     @cherrypy.expose
     def bulkUpdate(self, inBarcodes="", outBarcodes=""):
-        self.checkin(inBarcodes, called=True)
-        self.checkout(outBarcodes, called=True)
-        return "Bulk Update success"
+        result = self.engine.write(
+            self.engine.bulkUpdate, inBarcodes.split(), outBarcodes.split())
+        numOut = len(result.checkedOut)
+        if result.leavingKeyholder:
+            self.engine.write(self.engine.closeBuilding,
+                              result.leavingKeyholder)
+            numOut += 1
+        return f"Bulk Update success: {len(result.checkedIn)} in, {numOut} out"
 
     @cherrypy.expose
     def makeKeyholder(self, barcode):
         error = ''
         bc = barcode.strip()
+        result = self.engine.write(self.engine.makeKeyholder, barcode)
         with self.dbConnect() as dbConnection:
-            self.engine.visits.checkInMember(
-                dbConnection, barcode)  # make sure checked in
-            result = self.engine.accounts.setActiveKeyholder(
-                dbConnection, barcode)
             whoIsHere = self.engine.reports.whoIsHere(dbConnection)
 
             if result == False:
@@ -102,11 +105,9 @@ class WebMainStation(WebBase):
         with self.dbConnect() as dbConnection:
             (current_keyholder_bc, _) = self.engine.accounts.getActiveKeyholder(
                 dbConnection)
-            if (bc == KEYHOLDER_BARCODE) or (bc == current_keyholder_bc):
-                self.engine.visits.emptyBuilding(
-                    dbConnection, current_keyholder_bc)
-                self.engine.accounts.removeKeyholder(dbConnection)
-            else:
-                return self.makeKeyholder(barcode)
+        if (bc == KEYHOLDER_BARCODE) or (bc == current_keyholder_bc):
+            self.engine.write(self.engine.closeBuilding, current_keyholder_bc)
+        else:
+            return self.makeKeyholder(barcode)
 
         raise cherrypy.HTTPRedirect("/station")
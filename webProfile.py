@@ -42,12 +42,7 @@ class WebProfile(WebBase):
 
     @cherrypy.expose
     def forgotPassword(self, user):
-        with self.dbConnect() as dbConnection:
-            email = self.engine.accounts.forgotPassword(
-                dbConnection, user)
-            self.engine.logEvents.addEvent(
-                dbConnection,
-                "Forgot password request", f"{email} for {user}")
+        self.engine.forgotPassword(user)
         return "You have been e-mailed a way to reset your password.  It will only be good for 24 hours."
 
     @cherrypy.expose
@@ -1,10 +1,14 @@
 import datetime
+import hashlib
+import json
 import sqlite3
 import cherrypy
 
 from webBase import WebBase
 from accounts import Role
 from tracing import Tracing
+from reports import OCCUPANCY_MINUTES, USAGE_BUCKETS
+from utils import csvChunks
 
 
 class WebReports(WebBase):
@@ -49,15 +53,109 @@ class WebReports(WebBase):
     @cherrypy.expose
     def standard(self, startDate, endDate):
         self.checkPermissions()
-        return self.template('report.mako', stats=self.engine.reports.getStats(self.dbConnect(), startDate, endDate))
+        with self.dbConnect() as dbConnection:
+            stats = self.engine.reports.getStats(dbConnection, startDate, endDate)
+        return self.template('report.mako', stats=stats)
+
+    @cherrypy.expose
+    def trends(self, startMonth, endMonth):
+        self.checkPermissions()
+        with self.dbConnect() as dbConnection:
+            months = self.engine.reports.getTrends(dbConnection, startMonth, endMonth)
+        years = {}
+        for month in months:
+            (visits, memberHours, guestHours, peak) = years.get(month.month.year, (0, 0.0, 0.0, 0))
+            years[month.month.year] = (visits + month.visits, memberHours + month.memberHours,
+                                       guestHours + month.guestHours, max(peak, month.peak))
+        return self.template('trends.mako', months=months, years=years)
 
     @cherrypy.expose
     def graph(self, startDate, endDate):
         self.checkPermissions()
         cherrypy.response.headers['Content-Type'] = "image/png"
-        stats = self.engine.reports.getStats(
-            self.dbConnect(), startDate, endDate)
-        return stats.getBuildingUsageGraph()
+        with self.dbConnect() as dbConnection:
+            return self.engine.reports.getBuildingUsageGraph(
+                dbConnection, startDate, endDate)
+
+    def checkETag(self, dbConnection, startDate, endDate, *options):
+        """Sets an ETag from the data version of the range and answers a
+           matching If-None-Match with a 304 before any work is done"""
+        version = self.engine.reports.getDataVersion(
+            dbConnection, startDate, endDate)
+        cherrypy.response.headers['ETag'] = '"' + hashlib.sha1(
+            repr((version, options)).encode('utf-8')).hexdigest() + '"'
+        cherrypy.lib.cptools.validate_etags()
+
+    @cherrypy.expose
+    def usage_json(self, startDate, endDate, bucket='hour'):
+        self.checkPermissions()
+        if bucket not in USAGE_BUCKETS:
+            raise cherrypy.HTTPError(400, f'bucket must be one of {", ".join(USAGE_BUCKETS)}')
+        with self.dbConnect() as dbConnection:
+            self.checkETag(dbConnection, startDate, endDate, bucket)
+            data = self.engine.reports.getUsageData(
+                dbConnection, startDate, endDate, bucket)
+        cherrypy.response.headers['Content-Type'] = 'application/json'
+        cherrypy.response.headers['Cache-Control'] = 'private, no-cache'
+        return json.dumps(data, separators=(',', ':')).encode('utf-8')
+    usage_json._cp_config = {'tools.gzip.on': True,
+                             'tools.gzip.mime_types': ['application/json']}
+
+    @cherrypy.expose
+    def occupancy_json(self, startDate, endDate, minutes='15', firstHour='8', lastHour='22'):
+        self.checkPermissions()
+        try:
+            (minutes, firstHour, lastHour) = (int(minutes), int(firstHour), int(lastHour))
+        except ValueError:
+            raise cherrypy.HTTPError(400, 'minutes and hours must be numbers')
+        if minutes not in OCCUPANCY_MINUTES or not 0 <= firstHour < lastHour <= 24:
+            raise cherrypy.HTTPError(
+                400, f'minutes must be one of {OCCUPANCY_MINUTES} and hours within the day')
+        with self.dbConnect() as dbConnection:
+            self.checkETag(dbConnection, startDate, endDate, minutes, firstHour, lastHour)
+            stats = self.engine.reports.getStats(dbConnection, startDate, endDate)
+        times = []
+        visitors = []
+        average = []
+        for point in stats.getOccupancy(minutes, firstHour, lastHour):
+            times.append(point.startTime.isoformat(timespec='minutes'))
+            visitors.append(point.numVisitors)
+            average.append(round(point.average, 2))
+        cherrypy.response.headers['Content-Type'] = 'application/json'
+        cherrypy.response.headers['Cache-Control'] = 'private, no-cache'
+        return json.dumps({'startDate': stats.beginDate.isoformat(),
+                           'endDate': stats.endDate.isoformat(),
+                           'minutes': minutes,
+                           'usage': {'time': times, 'visitors': visitors,
+                                     'average': average}},
+                          separators=(',', ':')).encode('utf-8')
+    occupancy_json._cp_config = {'tools.gzip.on': True,
+                                 'tools.gzip.mime_types': ['application/json']}
+
+    def streamCSV(self, name, startDate, endDate, header, rows):
+        cherrypy.response.headers['Content-Type'] = 'text/csv; charset=utf-8'
+        cherrypy.response.headers['Content-Disposition'] = \
+            f'attachment; filename="{name}-{startDate}-{endDate}.csv"'
+        return csvChunks(header, rows)
+
+    @cherrypy.expose
+    def visits_csv(self, startDate, endDate):
+        self.checkPermissions()
+        (start, end) = self.engine.reports.getDateRange(startDate, endDate)
+        return self.streamCSV(
+            'visits', startDate, endDate,
+            ['start', 'leave', 'name', 'status', 'barcode'],
+            self.engine.reports.iterVisits(self.dbConnect(), start, end))
+    visits_csv._cp_config = {'response.stream': True}
+
+    @cherrypy.expose
+    def transactions_csv(self, startDate, endDate):
+        self.checkPermissions()
+        (start, end) = self.engine.reports.getDateRange(startDate, endDate)
+        return self.streamCSV(
+            'transactions', startDate, endDate, ['name', 'time', 'description'],
+            self.engine.reports.iterTransactions(self.dbConnect(), start, end))
+    transactions_csv._cp_config = {'response.stream': True}
 
     @cherrypy.expose
     def saveCustom(self, sql, report_name):
@@ -135,17 +135,15 @@ class WebTeams(WebBase):
             else:
                 checkOut.append(param)
 
-        with self.dbConnect() as dbConnection:
-            leaving_keyholder_bc = self.engine.bulkUpdate(
-                dbConnection, checkIn, checkOut)
+        leaving_keyholder_bc = self.engine.write(
+            self.engine.bulkUpdate, checkIn, checkOut).leavingKeyholder
 
-        with self.dbConnect() as dbConnection:
-            if leaving_keyholder_bc:
+        if leaving_keyholder_bc:
+            with self.dbConnect() as dbConnection:
                 whoIsHere = self.engine.reports.whoIsHere(dbConnection)
-                if len(whoIsHere) > 1:
-                    return self.template('keyholderCheckout.mako', barcode=leaving_keyholder_bc, whoIsHere=whoIsHere)
-                self.engine.accounts.removeKeyholder(dbConnection)
-                error = self.engine.visits.checkOutMember(
-                    dbConnection, leaving_keyholder_bc)
+            if len(whoIsHere) > 1:
+                return self.template('keyholderCheckout.mako', barcode=leaving_keyholder_bc, whoIsHere=whoIsHere)
+            error = self.engine.write(
+                self.engine.checkOutKeyholder, leaving_keyholder_bc)
 
         raise cherrypy.HTTPRedirect("/teams?team_id="+team_id)
@@ -0,0 +1,109 @@
+import queue
+import threading
+from concurrent.futures import Future
+
+# Most writes that are committed together
+MAX_BATCH = 50
+
+
+class WriteQueue(object):
+    """
+    Serializes database writes onto one thread so request threads don't fight
+    over SQLite's write lock.
+
+    Each write is a function called as func(dbConnection, *args).  Writes
+    that are waiting when the writer gets to them are committed together,
+    each inside its own savepoint so one failing doesn't undo the others.
+    Callers wait on a Future for the result.
+    """
+
+    def __init__(self, openConnection, maxBatch=MAX_BATCH):
+        self.openConnection = openConnection
+        self.maxBatch = maxBatch
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.thread = None
+        self.connection = None
+
+    def start(self):
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(
+                    target=self.run, name='Database writer', daemon=True)
+                self.thread.start()
+
+    def stop(self):
+        with self.lock:
+            thread = self.thread
+            self.thread = None
+        if thread is not None and thread.is_alive():
+            self.queue.put(None)
+            thread.join()
+
+    def submit(self, func, *args):
+        future = Future()
+        if threading.current_thread() is self.thread:
+            # a write made from inside another write joins its transaction
+            future.set_result(func(self.connection, *args))
+            return future
+        self.start()
+        self.queue.put((future, func, args))
+        return future
+
+    def write(self, func, *args):
+        return self.submit(func, *args).result()
+
+    def nextBatch(self):
+        batch = [self.queue.get()]
+        while batch[-1] is not None and len(batch) < self.maxBatch:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def run(self):
+        self.connection = self.openConnection()
+        # transactions are managed here rather than by the sqlite3 module
+        self.connection.isolation_level = None
+        try:
+            while True:
+                batch = self.nextBatch()
+                stopping = batch[-1] is None
+                if stopping:
+                    batch.pop()
+                if batch:
+                    self.commitBatch(batch)
+                if stopping:
+                    return
+        finally:
+            self.connection.close()
+            self.connection = None
+
+    def commitBatch(self, batch):
+        results = []
+        try:
+            self.connection.execute('BEGIN IMMEDIATE')
+            for (future, func, args) in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                self.connection.execute('SAVEPOINT queued_write')
+                try:
+                    results.append((future, func(self.connection, *args), None))
+                except Exception as e:
+                    self.connection.execute('ROLLBACK TO queued_write')
+                    results.append((future, None, e))
+                self.connection.execute('RELEASE queued_write')
+            self.connection.execute('COMMIT')
+        except Exception as e:
+            if self.connection.in_transaction:
+                self.connection.execute('ROLLBACK')
+            for (future, func, args) in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (future, result, exception) in results:
+            if exception is None:
+                future.set_result(result)
+            else:
+                future.set_exception(exception)